@@ -0,0 +1,59 @@
+"""Regenerate the WAV fixtures used by the voice tests
+
+    python fixtures/generate.py
+
+hello.wav holds two tone bursts standing in for spoken phrases, separated
+by low-level noise; silence.wav is noise only. The files under commands/
+are short clips whose transcripts sit next to them for the sidecar
+recognizer.
+"""
+import wave
+from pathlib import Path
+
+import numpy as np
+
+SAMPLE_RATE = 8000
+HERE = Path(__file__).parent
+
+# (seconds, tone Hz or None for noise)
+HELLO = [(0.5, None), (0.5, 440), (1.2, None), (0.4, 660), (1.0, None)]
+COMMANDS = {
+    'open_calculator': "open calculator",
+    'run_backup': "run backup",
+    'what_time': "what time is it",
+}
+
+
+def render(parts, seed=7):
+    rng = np.random.default_rng(seed)
+    chunks = []
+    for seconds, frequency in parts:
+        count = int(SAMPLE_RATE * seconds)
+        noise = rng.normal(0, 40, count)
+        if frequency is None:
+            chunks.append(noise)
+        else:
+            t = np.arange(count) / SAMPLE_RATE
+            chunks.append(8000 * np.sin(2 * np.pi * frequency * t) + noise)
+    return np.clip(np.concatenate(chunks), -32768, 32767).astype('<i2')
+
+
+def write_wav(path, samples):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+
+
+def main():
+    write_wav(HERE / "hello.wav", render(HELLO))
+    write_wav(HERE / "silence.wav", render([(1.0, None)]))
+    for name, transcript in COMMANDS.items():
+        write_wav(HERE / "commands" / f"{name}.wav", render([(0.1, None)]))
+        (HERE / "commands" / f"{name}.txt").write_text(transcript + "\n", encoding='utf-8')
+
+
+if __name__ == "__main__":
+    main()
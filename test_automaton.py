@@ -0,0 +1,149 @@
+"""Aho-Corasick trigger matching against a naive substring scan"""
+import random
+import threading
+
+import pytest
+
+from tetris_core import PatternAutomaton, TriggerIndex
+
+
+def naive_matches(patterns, text):
+    found = []
+    for pattern in patterns:
+        start = text.find(pattern)
+        while start != -1:
+            found.append((start, pattern))
+            start = text.find(pattern, start + 1)
+    return sorted(found)
+
+
+def matches(automaton, text):
+    return sorted((start, pattern) for start, pattern, _ in automaton.iter_matches(text))
+
+
+def random_words(rng, count, alphabet="ab ", max_length=4):
+    return {''.join(rng.choice(alphabet) for _ in range(rng.randint(1, max_length))) for _ in range(count)}
+
+
+def test_classic_overlapping_patterns():
+    automaton = PatternAutomaton()
+    for pattern in ("he", "she", "his", "hers"):
+        automaton.add(pattern)
+    automaton.build()
+
+    assert matches(automaton, "ushers") == [(1, "she"), (2, "he"), (2, "hers")]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_compiled_matches_equal_naive_scan(seed):
+    rng = random.Random(seed)
+    patterns = random_words(rng, 30)
+    automaton = PatternAutomaton()
+    for pattern in patterns:
+        automaton.add(pattern)
+    automaton.build()
+
+    for _ in range(50):
+        text = ''.join(rng.choice("ab c") for _ in range(rng.randint(0, 30)))
+        assert matches(automaton, text) == naive_matches(patterns, text)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_pending_and_removed_patterns_match_naive_scan(seed):
+    rng = random.Random(seed)
+    automaton = PatternAutomaton(build_delay=60)  # Only explicit builds
+    compiled = random_words(rng, 20)
+    for pattern in compiled:
+        automaton.add(pattern)
+    automaton.build()
+
+    added = random_words(rng, 10) - compiled
+    for pattern in added:
+        automaton.add(pattern)
+    removed = set(rng.sample(sorted(compiled | added), 8))
+    for pattern in removed:
+        assert automaton.remove(pattern)
+    live = (compiled | added) - removed
+
+    for _ in range(50):
+        text = ''.join(rng.choice("ab c") for _ in range(rng.randint(0, 30)))
+        assert matches(automaton, text) == naive_matches(live, text)
+    automaton.build()
+    for _ in range(50):
+        text = ''.join(rng.choice("ab c") for _ in range(rng.randint(0, 30)))
+        assert matches(automaton, text) == naive_matches(live, text)
+
+
+def test_matches_stay_correct_during_rebuilds():
+    rng = random.Random(5)
+    stable = sorted(random_words(rng, 40, alphabet="abc", max_length=5))
+    churn = sorted(random_words(rng, 200, alphabet="abc", max_length=6) - set(stable))
+    automaton = PatternAutomaton(build_delay=0)
+    for pattern in stable:
+        automaton.add(pattern)
+    automaton.build()
+    texts = [''.join(rng.choice("abc ") for _ in range(40)) for _ in range(50)]
+    expected = {text: naive_matches(stable, text) for text in texts}
+    stop = threading.Event()
+    failures = []
+
+    def reader():
+        while not stop.is_set():
+            for text in texts:
+                try:
+                    found = matches(automaton, text)
+                except Exception as e:
+                    failures.append(repr(e))
+                    return
+                if [match for match in found if match[1] in expected_set] != expected[text]:
+                    failures.append(text)
+                if len(found) != len(set(found)):
+                    failures.append(f"duplicates in {text!r}")
+                if not set(found) <= set(naive_matches(stable + churn, text)):
+                    failures.append(f"phantom match in {text!r}")
+
+    expected_set = set(stable)
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    try:
+        for round_number in range(30):
+            for pattern in churn:
+                if rng.random() < 0.5:
+                    automaton.add(pattern)
+                else:
+                    automaton.remove(pattern)
+            if round_number % 3 == 0:
+                automaton.build()
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert failures == [], failures[:5]
+    automaton.build()
+    live = set(automaton.values)
+    for text in texts:
+        assert matches(automaton, text) == naive_matches(live, text)
+
+
+def test_background_build_compiles_pending_patterns():
+    automaton = PatternAutomaton(build_delay=0.01)
+    for pattern in ("lights on", "lights"):
+        automaton.add(pattern)
+    assert matches(automaton, "turn lights on") == [(5, "lights"), (5, "lights on")]
+
+    automaton.builder.join(5)
+
+    assert automaton.pending == {}
+    assert matches(automaton, "turn lights on") == [(5, "lights"), (5, "lights on")]
+
+
+def test_trigger_index_prefers_longest_trigger():
+    index = TriggerIndex(["lights", "lights on", "on"])
+
+    assert index.best_match("please turn the lights on") == "lights on"
+    assert index.best_match("lights off") == "lights"
+    index.sync(["lights", "on"])
+    assert index.best_match("please turn the lights on") == "lights"
+    assert index.best_match("nothing here") is None
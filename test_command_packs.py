@@ -0,0 +1,113 @@
+"""JSONL export/import of custom commands"""
+import json
+import sqlite3
+
+import pytest
+
+from tetris_core import SchemaMigrator, TetrisEngine
+
+
+def seed_commands(db_path, rows):
+    SchemaMigrator(db_path).migrate()
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("INSERT INTO custom_commands (trigger, response, action_type, parameters, usage_count) "
+                         "VALUES (?, ?, ?, ?, ?)", rows)
+
+
+def write_pack(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'format': 'tetris-commands', 'version': 1}) + "\n")
+        for record in records:
+            f.write((record if isinstance(record, str) else json.dumps(record)) + "\n")
+
+
+def table(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return {row[0]: row[1:] for row in conn.execute(
+            "SELECT trigger, response, action_type, parameters, usage_count FROM custom_commands")}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "tetris_memory.db")
+    seed_commands(path, [(f"cmd {i}", f"reply {i}", 'response', '', i) for i in range(50)])
+    return path
+
+
+@pytest.fixture
+def engine(db_path):
+    engine = TetrisEngine(db_path=db_path, start_sampler=False)
+    yield engine
+    engine.close()
+
+
+@pytest.mark.parametrize("suffix", ["jsonl", "jsonl.gz"])
+def test_export_then_import_round_trips(engine, db_path, tmp_path, suffix):
+    pack = str(tmp_path / f"commands.{suffix}")
+    before = table(db_path)
+
+    assert engine.export_custom_commands(pack, chunk_size=7) == 50
+
+    other_db = str(tmp_path / "other.db")
+    other = TetrisEngine(db_path=other_db, start_sampler=False)
+    try:
+        stats = other.import_custom_commands(pack, chunk_size=7)
+        assert stats['inserted'] == 50 and stats['errors'] == 0
+        # Usage counts travel in the pack but never overwrite the importer's own
+        assert {trigger: row[:3] for trigger, row in table(other_db).items()} == \
+            {trigger: row[:3] for trigger, row in before.items()}
+        assert other.check_custom_commands("please cmd 7") == "reply 7"
+    finally:
+        other.close()
+
+
+@pytest.mark.parametrize("on_conflict, expected", [("replace", "new reply"), ("skip", "reply 3")])
+def test_conflicting_definitions(engine, db_path, tmp_path, on_conflict, expected):
+    pack = str(tmp_path / "commands.jsonl")
+    write_pack(pack, [
+        {'trigger': 'cmd 3', 'response': 'new reply', 'action_type': 'response', 'parameters': ''},
+        {'trigger': 'cmd 4', 'response': 'reply 4', 'action_type': 'response', 'parameters': ''},
+        {'trigger': 'brand new', 'response': 'hi', 'action_type': 'response', 'parameters': ''},
+    ])
+
+    stats = engine.import_custom_commands(pack, on_conflict=on_conflict)
+
+    assert stats['conflicts'] == ['cmd 3']
+    assert (stats['inserted'], stats['unchanged']) == (1, 1)
+    assert stats['updated' if on_conflict == 'replace' else 'skipped'] == 1
+    assert table(db_path)['cmd 3'] == (expected, 'response', '', 3)
+    assert engine.custom_commands['cmd 3']['response'] == expected
+    assert engine.custom_commands['brand new']['response'] == 'hi'
+
+
+def test_triggers_differing_only_in_case_are_the_same_command(engine, db_path, tmp_path):
+    pack = str(tmp_path / "commands.jsonl")
+    write_pack(pack, [
+        {'trigger': 'CMD 5', 'response': 'shouted', 'action_type': 'response', 'parameters': ''},
+        {'trigger': 'Cmd 6', 'response': 'reply 6', 'action_type': 'response', 'parameters': ''},
+        {'trigger': 'New One', 'response': 'first', 'action_type': 'response', 'parameters': ''},
+        {'trigger': 'new one', 'response': 'second', 'action_type': 'response', 'parameters': ''},
+    ])
+
+    stats = engine.import_custom_commands(pack, on_conflict='replace')
+
+    rows = table(db_path)
+    assert len(rows) == len(engine.custom_commands) == 51
+    assert stats['conflicts'] == ['CMD 5']
+    assert (stats['inserted'], stats['updated'], stats['unchanged']) == (1, 1, 1)
+    # The stored spelling is kept; the last definition in the pack wins
+    assert rows['cmd 5'][0] == 'shouted' and 'CMD 5' not in rows
+    assert rows['new one'][0] == 'second'
+
+
+def test_bad_lines_are_counted_not_fatal(engine, tmp_path):
+    pack = str(tmp_path / "commands.jsonl")
+    write_pack(pack, ["{not json", {'response': 'no trigger'}, {'trigger': '  '},
+                      {'trigger': 'fine', 'response': 'ok'}])
+
+    stats = engine.import_custom_commands(pack)
+
+    assert stats['errors'] == 3 and stats['inserted'] == 1
+    assert [line for line, _ in stats['error_lines']] == [2, 3, 4]
+    with pytest.raises(ValueError):
+        engine.import_custom_commands(pack, on_conflict='merge')
@@ -0,0 +1,160 @@
+"""Calculator expression engine: whitelist, resource guards and caching"""
+import ast
+import math
+import threading
+import time
+
+import pytest
+
+from tetris_core import ExpressionEngine, ExpressionError, TetrisEngine
+
+
+@pytest.fixture
+def calculator():
+    return ExpressionEngine()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = TetrisEngine(db_path=str(tmp_path / "tetris_memory.db"), start_sampler=False)
+    yield engine
+    engine.close()
+
+
+@pytest.mark.parametrize("text", [
+    "(1).real",
+    "__import__('os')",
+    "__builtins__",
+    "lambda: 1",
+    "[x for x in range(3)]",
+    "{1: 2}",
+    "'abc' * 3",
+    "open('secret')",
+    "a = 1",
+    "1 if 1 else 2",
+])
+def test_rejects_input_outside_the_whitelist(calculator, text):
+    with pytest.raises(ExpressionError):
+        calculator.evaluate(text)
+
+
+@pytest.mark.parametrize("source", [
+    "(1).real",
+    "__import__('os')",
+    "(lambda: 1)()",
+    "[x for x in (1, 2)]",
+    "sum(x for x in (1, 2))",
+    "sqrt(*[4])",
+    "round(2.5, ndigits=1)",
+    "(1, 2)",
+    "1 < 2",
+])
+def test_ast_check_rejects_nodes_past_the_tokenizer(calculator, source):
+    # The tokenizer already refuses most of these; the AST check must too
+    with pytest.raises(ExpressionError):
+        calculator.check(ast.parse(source, mode='eval'), ())
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2 + 3 x 4", 14),
+    ("2^10", 1024),
+    ("sqrt(16) + ln(e)", 5.0),
+    ("10 ÷ 4", 2.5),
+    ("exp(0)", 1.0),
+    ("round(12345, -2)", 12300),
+])
+def test_evaluates_arithmetic(calculator, text, expected):
+    assert calculator.evaluate(text) == expected
+
+
+def test_power_guard_falls_back_to_floats(calculator):
+    start = time.perf_counter()
+    assert calculator.evaluate("2 ** 100") == 2 ** 100
+    assert calculator.evaluate("2 ** 4000") == 2 ** 4000
+    with pytest.raises(OverflowError):
+        calculator.evaluate("2 ** 5000")
+    with pytest.raises(OverflowError):
+        calculator.evaluate("9 ** 9 ** 9")
+    assert time.perf_counter() - start < 1
+
+
+@pytest.mark.parametrize("text", [
+    "factorial(100000)",
+    "comb(10 ** 6, 500000)",
+    "perm(10 ** 6)",
+    "round(7, -100000000)",
+])
+def test_combinatoric_and_rounding_guards(calculator, text):
+    start = time.perf_counter()
+    with pytest.raises(ExpressionError):
+        calculator.evaluate(text)
+    assert time.perf_counter() - start < 1
+
+
+def test_small_combinatorics_stay_exact(calculator):
+    assert calculator.evaluate("factorial(20)") == math.factorial(20)
+    assert calculator.evaluate("comb(52, 5)") == 2598960
+    assert calculator.evaluate("perm(10, 3)") == 720
+
+
+def test_division_by_zero(calculator, engine):
+    with pytest.raises(ZeroDivisionError):
+        calculator.evaluate("1 / 0")
+    assert "division by zero" in engine.advanced_calculator("calculate 1 / 0")
+
+
+@pytest.mark.parametrize("value, expected", [
+    (10 ** 3000, "1.000000e+3000"),
+    (10 ** 3000 - 1, "1.000000e+3000"),
+    (-(10 ** 3000), "-1.000000e+3000"),
+    (5 * 10 ** 3000, "5.000000e+3000"),
+    (12345, "12345"),
+])
+def test_format_integer(value, expected):
+    assert ExpressionEngine.format_integer(value) == expected
+
+
+def test_large_results_are_shown_in_scientific_notation(engine):
+    assert engine.advanced_calculator("calculate factorial(1000)").endswith("4.023873e+2567")
+
+
+def test_range_evaluation_uses_numpy(calculator):
+    numpy = pytest.importorskip("numpy")
+
+    grid, values, timings = calculator.evaluate_range("x^2 + 1", "x", "0", "10", "0.5")
+
+    assert timings['points'] == 21
+    assert numpy.allclose(grid, numpy.arange(0, 10.5, 0.5))
+    assert numpy.allclose(values, grid ** 2 + 1)
+    with pytest.raises(ExpressionError):
+        calculator.evaluate_range("factorial(x)", "x", "0", "10", "1")
+    with pytest.raises(ExpressionError):
+        calculator.evaluate_range("x", "x", "0", "10", "-1")
+
+
+def test_range_point_limit(calculator):
+    pytest.importorskip("numpy")
+    with pytest.raises(ExpressionError):
+        ExpressionEngine(max_points=1000).evaluate_range("x", "x", "0", "1", "0.0001")
+
+
+def test_compile_cache_is_shared_safely_between_threads():
+    calculator = ExpressionEngine(cache_size=8)
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(2000):
+                assert calculator.evaluate(f"{(i + offset) % 64} + 1") == (i + offset) % 64 + 1
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n * 16,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(calculator.cache) <= 8
+    assert calculator.hits + calculator.misses == 8000
@@ -0,0 +1,85 @@
+"""Trigram "did you mean" suggestions and their scan budget"""
+import pytest
+
+from tetris_core import FuzzyMatcher, trigrams
+
+
+class CountingSet(set):
+    """Posting set counting every entry a lookup iterates over"""
+    visited = 0
+
+    def __iter__(self):
+        for item in super().__iter__():
+            CountingSet.visited += 1
+            yield item
+
+
+def count_visits(matcher):
+    matcher.postings = {gram: CountingSet(posting) for gram, posting in matcher.postings.items()}
+    CountingSet.visited = 0
+
+
+def dice(a, b):
+    a, b = trigrams(a), trigrams(b)
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+@pytest.fixture
+def matcher():
+    matcher = FuzzyMatcher()
+    for phrase in ("open calculator", "open notepad", "check weather", "lock screen", "system status"):
+        matcher.add(phrase)
+    return matcher
+
+
+def test_suggests_commands_despite_typos(matcher):
+    assert matcher.suggest("open calculater")[0] == "open calculator"
+    assert matcher.suggest("wether please")[0] == "check weather"
+    assert matcher.suggest("screan lock")[0] == "lock screen"
+
+
+def test_short_words_and_unrelated_text_give_nothing(matcher):
+    assert matcher.suggest("a to me") == []
+    assert matcher.suggest("zzzzzz qqqqq") == []
+
+
+def test_results_are_ranked_by_dice_similarity(matcher):
+    query = "open notepads"
+    found = matcher.suggest(query, k=5, min_score=0)
+
+    scores = [dice(query, phrase) for phrase in found]
+    assert found[0] == "open notepad"
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_remove_and_sync_update_the_postings(matcher):
+    assert matcher.remove("OPEN CALCULATOR")
+    assert not matcher.remove("open calculator")
+    assert "open calculator" not in matcher.suggest("open calculater", k=5)
+
+    matcher.sync(["Lock Screen", "play music"])
+    assert set(matcher.phrases) == {"lock screen", "play music"}
+    assert all(phrase in {"lock screen", "play music"} for posting in matcher.postings.values() for phrase in posting)
+
+
+def test_lookup_visits_at_most_the_scan_budget():
+    matcher = FuzzyMatcher(scan_budget=200)
+    for i in range(5000):
+        matcher.add(f"open application {i}")
+    matcher.add("open calculator")
+    count_visits(matcher)
+
+    assert matcher.suggest("open calculater")[0] == "open calculator"
+    assert CountingSet.visited <= 200
+
+
+def test_common_trigrams_only_are_sampled_within_the_budget():
+    matcher = FuzzyMatcher(scan_budget=100)
+    for i in range(2000):
+        matcher.add(f"open {i}")
+    count_visits(matcher)
+
+    found = matcher.suggest("open", k=3, min_score=0)
+
+    assert CountingSet.visited <= 100
+    assert len(found) == 3 and all(phrase.startswith("open ") for phrase in found)
@@ -0,0 +1,51 @@
+"""Paging stored chat history back into the transcript"""
+import pytest
+
+from tetris_core import SchemaMigrator, TetrisEngine
+
+
+@pytest.fixture
+def engine(tmp_path):
+    db_path = str(tmp_path / "tetris_memory.db")
+    SchemaMigrator(db_path).migrate()
+    engine = TetrisEngine(db_path=db_path, start_sampler=False)
+    yield engine
+    engine.close()
+
+
+def page_back(engine, page_size, start=0):
+    """Walk history from the newest message the way the transcript scrolls up"""
+    pages, offset = [], start
+    while rows := engine.load_conversation_page(offset, page_size):
+        pages.append(rows)
+        offset += len(rows)
+    return pages
+
+
+def test_paging_back_visits_every_chat_message_once(engine):
+    for i in range(23):
+        engine.store_conversation(f"question {i}", "")
+        engine.store_conversation("", f"answer {i}")
+        engine.learn_from_interaction(f"question {i} please now", f"answer {i}")  # Not chat history
+
+    pages = page_back(engine, 10)
+
+    assert [len(rows) for rows in pages] == [10, 10, 10, 10, 6]
+    messages = [user_input or response for rows in reversed(pages) for user_input, response, _ in rows]
+    assert messages == [text for i in range(23) for text in (f"question {i}", f"answer {i}")]
+    assert all(stored_at for rows in pages for _, _, stored_at in rows)
+
+
+def test_offsets_count_messages_added_since_the_last_page(engine):
+    for i in range(5):
+        engine.store_conversation(f"old {i}", "")
+    visible = engine.load_conversation_page(0, 2)
+    # Two new messages arrive at the bottom while older history is still being paged in
+    engine.store_conversation("new 0", "")
+    engine.store_conversation("new 1", "")
+
+    older = engine.load_conversation_page(len(visible) + 2, 2)
+
+    assert [row[0] for row in visible] == ["old 3", "old 4"]
+    assert [row[0] for row in older] == ["old 1", "old 2"]
+    assert engine.load_conversation_page(100, 10) == []
@@ -0,0 +1,100 @@
+"""Learned pattern lookups through the in-memory n-gram index"""
+import random
+import sqlite3
+
+import pytest
+
+from tetris_core import LearnedPatternIndex, SchemaMigrator, TetrisEngine
+
+
+def naive_best_confidence(patterns, command):
+    """Highest confidence among patterns whose tokens appear consecutively in command"""
+    tokens = command.split()
+    best = None
+    for pattern, confidence in patterns.items():
+        words = pattern.split()
+        for i in range(len(tokens) - len(words) + 1):
+            if tokens[i:i + len(words)] == words:
+                best = confidence if best is None else max(best, confidence)
+                break
+    return best
+
+
+def test_patterns_match_whole_tokens_only():
+    index = LearnedPatternIndex()
+    index.add("turn on", "Turning on", 0.9)
+    index.add("light", "Light", 0.8)
+
+    assert index.best_match("please turn on the fan") == ("turn on", "Turning on", 0.9)
+    assert index.best_match("return on time") is None
+    assert index.best_match("turn online") is None
+    assert index.best_match("lights please") is None
+    assert index.best_match("the light please") == ("light", "Light", 0.8)
+
+
+def test_stored_patterns_are_normalized_and_most_confident_duplicate_wins():
+    index = LearnedPatternIndex()
+    index.add("  Open   Mail ", "first", 0.4)
+    index.add("open mail", "second", 0.6)
+    index.add("open mail", "third", 0.5)
+
+    assert len(index) == 1
+    assert index.get("open mail") == ("second", 0.6, 0.0, 0)
+    assert index.best_match("open mail now", min_confidence=0.7) is None
+
+
+def test_removal_forgets_unused_lengths():
+    index = LearnedPatternIndex()
+    index.add("check the weather", "Weather", 0.9)
+    index.add("hello", "Hi", 0.9)
+
+    assert index.remove("check the weather")
+    assert not index.remove("check the weather")
+    assert index.length_counts == {1: 1}
+    assert index.best_match("check the weather") is None
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_best_match_equals_naive_token_scan(seed):
+    rng = random.Random(seed)
+    vocabulary = ["open", "close", "the", "mail", "door", "lights", "on", "off"]
+    patterns = {}
+    index = LearnedPatternIndex()
+    for _ in range(40):
+        pattern = ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(1, 3)))
+        confidence = round(rng.random(), 3)
+        if confidence >= patterns.get(pattern, -1):
+            patterns[pattern] = confidence
+        index.add(pattern, pattern.upper(), confidence)
+
+    for _ in range(200):
+        command = ' '.join(rng.choice(vocabulary + ["opener", "x"]) for _ in range(rng.randint(0, 6)))
+        result = index.best_match(command)
+        expected = naive_best_confidence(patterns, command)
+        assert (result and result[2]) == expected, command
+        if result:
+            assert f" {result[0]} " in f" {command} " and patterns[result[0]] == result[2]
+
+
+def test_index_loads_in_batches_and_learns_through_the_engine(tmp_path):
+    db_path = str(tmp_path / "tetris_memory.db")
+    SchemaMigrator(db_path).migrate()
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("INSERT INTO learned_patterns (pattern, response_template, confidence_score) VALUES (?, ?, ?)",
+                         [(f"phrase {i}", f"reply {i}", 0.9) for i in range(25)])
+    index = LearnedPatternIndex()
+    with sqlite3.connect(db_path) as conn:
+        index.load(conn.cursor(), batch_size=7)
+    assert len(index) == 25
+
+    engine = TetrisEngine(db_path=db_path, start_sampler=False)
+    try:
+        assert engine.generate_learned_response("say phrase 12 again") == "reply 12"
+        engine.learn_from_interaction("water the plants today", "Watering")
+        engine.learn_from_interaction("water the garden", "Watering")
+        assert engine.learned_index.get("water the")[3] == 2
+        engine.persistence.flush()
+    finally:
+        engine.close()
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT usage_count FROM learned_patterns WHERE pattern = 'water the'").fetchone() == (2,)
@@ -0,0 +1,106 @@
+"""System metrics sampling and the status report built from it"""
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from tetris_core import SchemaMigrator, SystemMetricsSampler, TetrisEngine
+
+
+GB = 1024 ** 3
+
+
+class FakePsutil:
+    """Module stand-in whose I/O counters advance by a fixed amount per sample"""
+
+    def __init__(self):
+        self.samples = 0
+
+    def cpu_freq(self):
+        return SimpleNamespace(current=2400.0, max=3600.0)
+
+    def cpu_count(self, logical=True):
+        return 8 if logical else 4
+
+    def boot_time(self):
+        return time.time() - 3600
+
+    def cpu_percent(self, interval=None):
+        return 12.5
+
+    def net_io_counters(self):
+        self.samples += 1
+        return SimpleNamespace(bytes_sent=1000 * self.samples, bytes_recv=4000 * self.samples,
+                               packets_sent=self.samples, packets_recv=self.samples)
+
+    def disk_io_counters(self):
+        raise RuntimeError("no disk counters in containers")
+
+    def virtual_memory(self):
+        return SimpleNamespace(total=16 * GB, available=10 * GB, used=6 * GB, percent=37.5)
+
+    def swap_memory(self):
+        return SimpleNamespace(total=2 * GB, used=0)
+
+    def disk_usage(self, path):
+        return SimpleNamespace(total=500 * GB, free=200 * GB, used=300 * GB, percent=60.0)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    db_path = str(tmp_path / "tetris_memory.db")
+    SchemaMigrator(db_path).migrate()
+    engine = TetrisEngine(db_path=db_path, start_sampler=False)
+    yield engine
+    engine.close()
+
+
+def test_status_explains_missing_psutil(engine, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'psutil', None)  # Makes the import fail
+
+    with pytest.raises(ImportError):
+        engine.metrics_sampler.start()
+
+    assert engine.get_advanced_system_status() == "System metrics unavailable (psutil not installed)."
+
+
+def test_status_explains_a_sampler_that_never_started(engine):
+    assert engine.get_advanced_system_status() == "System metrics unavailable (sampler not started)."
+
+
+def test_status_reports_the_latest_snapshot(engine, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'psutil', FakePsutil())
+    engine.metrics_sampler.interval = 60
+    engine.metrics_sampler.start()
+
+    status = engine.get_advanced_system_status()
+
+    assert engine.metrics_sampler.unavailable_reason() is None
+    assert "Usage: 12.5%" in status
+    assert "Cores: 8 (4 physical)" in status
+    assert "Total RAM: 16 GB" in status
+
+
+def test_rates_come_from_counter_deltas(monkeypatch):
+    fake = FakePsutil()
+    monkeypatch.setitem(sys.modules, 'psutil', fake)
+    sampler = SystemMetricsSampler(interval=60, history=3)
+    sampler.start()
+    try:
+        first = sampler.latest()
+        assert first['net_send_rate'] == 0.0
+        sampler.previous['time'] -= 2  # Pretend the first sample is two seconds old
+
+        second = sampler.sample()
+
+        assert second['net_send_rate'] == pytest.approx(500, rel=0.01)
+        assert second['net_recv_rate'] == pytest.approx(2000, rel=0.01)
+        assert second['disk_read_bytes'] == 0
+        for _ in range(5):
+            sampler.sample()
+        assert len(sampler.recent()) == 3
+        assert sampler.latest()['cpu_count'] == 8
+        assert sampler.overhead_percent() >= 0
+    finally:
+        sampler.stop()
@@ -0,0 +1,139 @@
+"""Write-behind persistence and the engine's shared read connection"""
+import sqlite3
+import threading
+
+import pytest
+
+from tetris_core import PersistenceWorker, SchemaMigrator, TetrisEngine
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "tetris_memory.db")
+    SchemaMigrator(path).migrate()
+    return path
+
+
+@pytest.fixture
+def engine(db_path):
+    engine = TetrisEngine(db_path=db_path, start_sampler=False)
+    yield engine
+    engine.close()
+
+
+def rows(db_path, sql, params=()):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def test_worker_batches_writes_into_few_transactions(db_path):
+    worker = PersistenceWorker(db_path, batch_size=50, flush_interval=5)
+    try:
+        for i in range(120):
+            worker.submit("INSERT INTO user_preferences (key, value) VALUES (?, ?)", (f"key {i}", str(i)))
+        worker.submit_many("INSERT INTO user_preferences (key, value) VALUES (?, ?)", [("a", "1"), ("b", "2")])
+        worker.submit("INSERT INTO no_such_table VALUES (1)")
+        assert worker.flush(5)
+
+        stats = worker.stats()
+        assert rows(db_path, "SELECT COUNT(*) FROM user_preferences") == [(122,)]
+        assert stats['writes'] == 122 and stats['errors'] == 1
+        assert stats['batches'] <= 4
+    finally:
+        worker.close()
+    with pytest.raises(RuntimeError):
+        worker.submit("SELECT 1")
+
+
+def test_saved_commands_are_usable_before_they_are_written(engine, db_path):
+    engine.save_custom_command("Lights On", "Turning the lights on", "response", "")
+
+    assert engine.check_custom_commands("please lights on") == "Turning the lights on"
+    engine.persistence.flush()
+    assert rows(db_path, "SELECT trigger, response FROM custom_commands") == [("Lights On", "Turning the lights on")]
+
+
+def test_edit_rename_and_delete_go_through_the_worker(engine, db_path):
+    engine.save_custom_command("lights on", "On", "response", "")
+    engine.save_custom_command("lamp on", "Lamp", "response", "", old_trigger="Lights On")
+
+    assert "lights on" not in engine.custom_commands
+    assert engine.check_custom_commands("lamp on now") == "Lamp"
+    engine.persistence.flush()
+    assert rows(db_path, "SELECT trigger, response FROM custom_commands") == [("lamp on", "Lamp")]
+
+    engine.delete_custom_command("LAMP ON")
+    assert engine.check_custom_commands("lamp on now") is None
+    engine.persistence.flush()
+    assert rows(db_path, "SELECT COUNT(*) FROM custom_commands") == [(0,)]
+
+
+def test_duplicate_and_empty_triggers_are_rejected(engine):
+    engine.save_custom_command("lights on", "On", "response", "")
+
+    with pytest.raises(ValueError):
+        engine.save_custom_command("Lights ON", "Again", "response", "")
+    with pytest.raises(ValueError):
+        engine.save_custom_command("  ", "Nothing", "response", "")
+    # Changing only the case of a command's own trigger is an edit, not a duplicate
+    engine.save_custom_command("Lights On", "On", "response", "", old_trigger="lights on")
+    engine.persistence.flush()
+    assert engine.custom_command_row("lights on")[0] == "Lights On"
+
+
+def test_preferences_are_written_behind(engine, db_path):
+    engine.save_user_preference("voice", "female")
+
+    assert engine.user_preferences["voice"] == "female"
+    engine.persistence.flush()
+    assert rows(db_path, "SELECT value FROM user_preferences WHERE key = 'voice'") == [("female",)]
+
+
+def test_conversation_pages_include_queued_messages(engine):
+    for i in range(25):
+        engine.store_conversation(f"message {i}", "")
+
+    page = engine.load_conversation_page(0, 10)
+    assert [row[0] for row in page] == [f"message {i}" for i in range(15, 25)]
+    assert [row[0] for row in engine.load_conversation_page(20, 10)] == [f"message {i}" for i in range(5)]
+
+
+def test_shared_connection_serves_workers_and_ui_concurrently(engine, db_path):
+    for i in range(300):
+        engine.save_custom_command(f"command {i}", f"reply {i}", "response", "")
+        engine.store_conversation(f"message {i}", "")
+    engine.persistence.flush()
+    stop = threading.Event()
+    errors = []
+
+    def repeat(action):
+        try:
+            while not stop.is_set():
+                action()
+        except Exception as e:
+            errors.append(repr(e))
+
+    actions = [
+        lambda: engine.refresh_custom_commands(force=True),
+        lambda: engine.process_command("command 7"),
+        lambda: engine.query_custom_commands(prefix="command 1", sort='trigger'),
+        lambda: engine.count_custom_commands(),
+        lambda: engine.load_conversation_page(5, 20),
+    ]
+    threads = [threading.Thread(target=repeat, args=(action,)) for action in actions]
+    for thread in threads:
+        thread.start()
+    writer = sqlite3.connect(db_path)
+    try:
+        for i in range(200):
+            with writer:
+                writer.execute("UPDATE custom_commands SET response = ? WHERE trigger = ?", (f"changed {i}", f"command {i}"))
+    finally:
+        writer.close()
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert errors == []
+    engine.refresh_custom_commands()
+    assert engine.custom_commands["command 199"]["response"] == "changed 199"
@@ -0,0 +1,215 @@
+"""Schema migrations and query plans for tetris_memory.db"""
+import sqlite3
+import threading
+
+import pytest
+
+from tetris_core import COMMAND_SORT_KEYS, SchemaMigrator, TetrisEngine, tune_connection
+
+
+BASELINE_SCHEMA = """
+    CREATE TABLE custom_commands (
+        id INTEGER PRIMARY KEY, trigger TEXT UNIQUE, response TEXT, action_type TEXT, parameters TEXT,
+        usage_count INTEGER DEFAULT 0, created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP, last_used TIMESTAMP
+    );
+    CREATE TABLE user_preferences (key TEXT PRIMARY KEY, value TEXT, updated_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+    CREATE TABLE conversation_memory (
+        id INTEGER PRIMARY KEY, user_input TEXT, tetris_response TEXT, context TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP, importance_score INTEGER DEFAULT 1
+    );
+    CREATE TABLE learned_patterns (
+        id INTEGER PRIMARY KEY, pattern TEXT, response_template TEXT, confidence_score REAL,
+        success_rate REAL DEFAULT 0.0, usage_count INTEGER DEFAULT 0
+    );
+"""
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "tetris_memory.db")
+
+
+def schema(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return sorted(conn.execute("SELECT type, name, tbl_name, sql FROM sqlite_master WHERE name != 'schema_migrations'"))
+
+
+def applied_versions(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return [row[0] for row in conn.execute("SELECT version FROM schema_migrations ORDER BY version")]
+
+
+def test_fresh_database_migrates_to_latest(db_path):
+    migrator = SchemaMigrator(db_path)
+
+    assert migrator.migrate() == [version for version, _, _ in SchemaMigrator.MIGRATIONS]
+    assert migrator.migrate() == []
+    assert applied_versions(db_path)[-1] == SchemaMigrator.latest_version()
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+
+def test_hot_queries_use_indexes(db_path):
+    migrator = SchemaMigrator(db_path)
+    migrator.migrate()
+
+    assert migrator.check_query_plans() == []
+
+
+def test_hot_queries_use_indexes_with_statistics(db_path):
+    migrator = SchemaMigrator(db_path)
+    migrator.migrate()
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("INSERT INTO custom_commands (trigger, response, action_type, parameters, usage_count) "
+                         "VALUES (?, 'ok', 'response', '', ?)", [(f"command {i}", i % 50) for i in range(2000)])
+        conn.executemany("INSERT INTO learned_patterns (pattern, response_template, usage_count) VALUES (?, 'ok', 1)",
+                         [(f"pattern {i}",) for i in range(2000)])
+        conn.executemany("INSERT INTO conversation_memory (user_input, tetris_response, context, timestamp) "
+                         "VALUES ('hi', 'hello', ?, datetime('now', ?))",
+                         [('chat' if i % 3 else 'normal', f"-{i % 90} days") for i in range(3000)])
+        conn.execute("ANALYZE")
+
+    assert migrator.check_query_plans() == []
+
+
+def test_check_query_plans_rejects_scans_of_narrow_indexes(db_path):
+    migrator = SchemaMigrator(db_path)
+    migrator.migrate()
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP INDEX idx_custom_commands_usage")
+        conn.execute("CREATE INDEX idx_custom_commands_usage ON custom_commands (usage_count, trigger)")
+
+    assert [name for name, _ in migrator.check_query_plans()] == ["commands page sorted by usage"]
+
+
+def test_check_query_plans_reports_full_scans(db_path):
+    migrator = SchemaMigrator(db_path)
+    migrator.migrate()
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP INDEX idx_learned_patterns_pattern")
+
+    assert [name for name, _ in migrator.check_query_plans()] == ["learned pattern update"]
+
+
+def test_baseline_schema_migrates_and_deduplicates_patterns(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+        conn.executemany(
+            "INSERT INTO learned_patterns (pattern, response_template, usage_count) VALUES (?, ?, ?)",
+            [('hello there', 'older', 4), ('hello there', 'newer', 4), ('hello there', 'least used', 1),
+             ('what time', 'only', 2), (None, 'unnamed', 1), (None, 'unnamed', 1)]
+        )
+        conn.execute("INSERT INTO custom_commands (trigger, response, action_type) VALUES ('lights on', 'ok', 'response')")
+
+    SchemaMigrator(db_path).migrate()
+
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT pattern, response_template FROM learned_patterns ORDER BY id").fetchall()
+        assert rows == [('hello there', 'newer'), ('what time', 'only'), (None, 'unnamed'), (None, 'unnamed')]
+        with pytest.raises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO learned_patterns (pattern) VALUES ('what time')")
+        # Existing rows survive and the change log triggers are installed
+        conn.execute("UPDATE custom_commands SET response = 'done' WHERE trigger = 'lights on'")
+        assert conn.execute("SELECT trigger, operation FROM custom_command_changes").fetchall() == [('lights on', 'upsert')]
+    assert applied_versions(db_path) == [version for version, _, _ in SchemaMigrator.MIGRATIONS]
+
+
+def test_migration_1_is_a_no_op_on_the_baseline_schema(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+    before = schema(db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        for statement in SchemaMigrator.MIGRATIONS[0][2]:
+            conn.execute(statement)
+
+    assert schema(db_path) == before
+
+
+def test_every_starting_point_reaches_the_same_schema(tmp_path):
+    fresh, baseline, early = (str(tmp_path / f"{name}.db") for name in ("fresh", "baseline", "early"))
+    SchemaMigrator(fresh).migrate()
+    with sqlite3.connect(baseline) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+    SchemaMigrator(baseline).migrate()
+    # Databases whose version 1 also created the change log and narrower command indexes
+    with sqlite3.connect(early) as conn:
+        conn.executescript(BASELINE_SCHEMA + """
+            CREATE INDEX idx_custom_commands_lower ON custom_commands (lower(trigger));
+            CREATE INDEX idx_custom_commands_usage ON custom_commands (usage_count, trigger);
+            CREATE INDEX idx_custom_commands_action ON custom_commands (action_type, trigger);
+            CREATE INDEX idx_custom_commands_last_used ON custom_commands (COALESCE(last_used, ''), trigger);
+        """)
+        for version, _, statements in SchemaMigrator.MIGRATIONS:
+            if version in (2, 3, 5):
+                for statement in statements:
+                    conn.execute(statement)
+    with sqlite3.connect(early) as conn:
+        conn.execute("CREATE TABLE schema_migrations (version INTEGER PRIMARY KEY, description TEXT, "
+                     "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+        conn.execute("INSERT INTO schema_migrations (version) VALUES (1), (2), (3)")
+
+    assert SchemaMigrator(early).migrate() == [4, 5]
+    # Table definitions differ only in whitespace; indexes and triggers must match exactly
+    expected = schema(fresh)
+    for upgraded in (schema(baseline), schema(early)):
+        assert [row[:3] for row in upgraded] == [row[:3] for row in expected]
+        assert [row for row in upgraded if row[0] != 'table'] == [row for row in expected if row[0] != 'table']
+
+
+@pytest.mark.parametrize("sort", sorted(COMMAND_SORT_KEYS))
+@pytest.mark.parametrize("descending", [True, False])
+def test_command_pages_walk_every_row_in_order(db_path, sort, descending):
+    SchemaMigrator(db_path).migrate()
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("INSERT INTO custom_commands (trigger, response, action_type, usage_count, last_used) "
+                         "VALUES (?, 'ok', ?, ?, ?)",
+                         [(f"command {i:02}", ('web', 'response', 'command')[i % 3], i % 4,
+                           None if i % 5 == 0 else f"2024-01-0{i % 3 + 1} 00:00:00") for i in range(40)])
+        rows = conn.execute("SELECT trigger, action_type, usage_count, COALESCE(last_used, '') "
+                            "FROM custom_commands WHERE lower(trigger) >= 'command 1'").fetchall()
+    column = {'trigger': 0, 'action': 1, 'usage': 2, 'last_used': 3}[sort]
+    expected = [row[0] for row in sorted(rows, key=lambda row: (row[column], row[0]), reverse=descending)]
+
+    engine = TetrisEngine(db_path=db_path, start_sampler=False)
+    try:
+        seen, after = [], None
+        while True:
+            page, after = engine.query_custom_commands(prefix="command 1", sort=sort, descending=descending,
+                                                       after=after, limit=7)
+            seen += [trigger for trigger, *_ in page]
+            if after is None:
+                break
+    finally:
+        engine.close()
+
+    assert seen == [trigger for trigger in expected if trigger.startswith("command 1")]
+
+
+def test_concurrent_migrations_apply_each_version_once(db_path):
+    errors = []
+
+    def migrate():
+        try:
+            SchemaMigrator(db_path).migrate()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=migrate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert applied_versions(db_path) == [version for version, _, _ in SchemaMigrator.MIGRATIONS]
+
+
+def test_tune_connection_applies_pragmas(db_path):
+    conn = tune_connection(sqlite3.connect(db_path))
+    try:
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == -16000
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    finally:
+        conn.close()
@@ -0,0 +1,207 @@
+"""Priority ordering, preemption and shedding in the speech worker"""
+import threading
+import time
+
+import pytest
+
+from tetris_core import SpeechWorker, Tracer
+
+
+class FakeEngine:
+    """pyttsx3 stand-in that fires word callbacks and can be held before each word"""
+
+    def __init__(self):
+        self.callbacks = {}
+        self.properties = {}
+        self.spoken = []
+        self.speaking = threading.Event()
+        self.hold = threading.Event()
+        self.hold.set()
+
+    def connect(self, name, callback):
+        self.callbacks[name] = callback
+
+    def setProperty(self, name, value):
+        self.properties[name] = value
+
+    def say(self, text):
+        self.text = text
+        self.stopped = False
+
+    def runAndWait(self):
+        self.callbacks['started-utterance']('utterance')
+        self.speaking.set()
+        words = []
+        for i, word in enumerate(self.text.split()):
+            assert self.hold.wait(5)
+            self.callbacks['started-word']('utterance', i, len(word))
+            if self.stopped:
+                break
+            words.append(word)
+        self.spoken.append((' '.join(words), self.properties['volume']))
+        self.speaking.clear()
+
+    def stop(self):
+        self.stopped = True
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def engine():
+    return FakeEngine()
+
+
+@pytest.fixture
+def start_worker(engine):
+    workers = []
+
+    def start(**kwargs):
+        worker = SpeechWorker(lambda: engine, **kwargs)
+        worker.ready.wait(5)
+        workers.append(worker)
+        return worker
+
+    yield start
+    for worker in workers:
+        worker.close()
+
+
+def busy(worker, engine, text="busy speaking now", priority="normal"):
+    """Hold the worker inside an utterance so further text queues up"""
+    engine.hold.clear()
+    worker.say(text, priority)
+    assert engine.speaking.wait(5)
+
+
+def finished(worker):
+    stats = worker.stats()
+    return stats['queue_length'] == 0 and not stats['speaking']
+
+
+def test_queued_text_is_spoken_by_priority_then_arrival(engine, start_worker):
+    worker = start_worker()
+    busy(worker, engine)
+
+    worker.say("whisper one", "whisper")
+    worker.say("normal one")
+    worker.say("normal two", "normal")
+    worker.say("odd priority", "shouting")  # Unknown priorities are normal
+    engine.hold.set()
+    wait_until(lambda: finished(worker))
+
+    assert [text for text, _ in engine.spoken] == [
+        "busy speaking now", "normal one", "normal two", "odd priority", "whisper one"]
+    assert engine.spoken[-1][1] == SpeechWorker.VOICE_SETTINGS['whisper'][1]
+    assert worker.stats()['spoken'] == 5
+
+
+def test_urgent_text_stops_the_current_utterance_at_a_word_boundary(engine, start_worker):
+    worker = start_worker()
+    busy(worker, engine)
+
+    worker.say("whisper later", "whisper")
+    worker.say("intruder detected", "urgent")
+    engine.hold.set()
+    wait_until(lambda: finished(worker))
+
+    assert engine.spoken == [("", 0.9), ("intruder detected", 1.0), ("whisper later", 0.6)]
+    assert worker.stats()['preempted'] == 1
+
+
+def test_normal_text_does_not_preempt(engine, start_worker):
+    worker = start_worker()
+    busy(worker, engine, "whisper in progress", "whisper")
+
+    worker.say("normal arrives")
+    engine.hold.set()
+    wait_until(lambda: finished(worker))
+
+    assert engine.spoken == [("whisper in progress", 0.6), ("normal arrives", 0.9)]
+    assert worker.stats()['preempted'] == 0
+
+
+def test_stale_text_is_dropped_but_urgent_text_never_expires(engine, start_worker):
+    worker = start_worker(max_age={'urgent': None, 'normal': 0.05, 'whisper': 0.05})
+    busy(worker, engine, "busy")
+
+    worker.say("old news")
+    worker.say("too quiet", "whisper")
+    time.sleep(0.1)
+    worker.say("fresh")
+    engine.hold.set()
+    wait_until(lambda: finished(worker))
+
+    assert [text for text, _ in engine.spoken] == ["busy", "fresh"]
+    assert worker.stats()['dropped_stale'] == 2
+
+
+def test_repeated_text_is_coalesced_and_keeps_the_higher_priority(engine, start_worker):
+    worker = start_worker()
+    busy(worker, engine)
+
+    worker.say("battery low", "whisper")
+    worker.say("hello")
+    worker.say("battery low", "urgent")
+    worker.say("hello")
+    assert worker.stats()['queue_length'] == 2
+    engine.hold.set()
+    wait_until(lambda: finished(worker))
+
+    assert [text for text, _ in engine.spoken][-2:] == ["battery low", "hello"]
+    assert worker.stats()['coalesced'] == 2
+
+
+def test_full_queue_sheds_the_oldest_lowest_priority_text(engine, start_worker):
+    worker = start_worker(max_pending=2)
+    busy(worker, engine)
+
+    worker.say("first normal")
+    worker.say("old whisper", "whisper")
+    worker.say("second normal")
+    worker.say("third normal")
+    engine.hold.set()
+    wait_until(lambda: finished(worker))
+
+    assert [text for text, _ in engine.spoken] == ["busy speaking now", "second normal", "third normal"]
+    assert worker.stats()['evicted'] == 2
+
+
+def test_first_audio_latency_is_traced(engine, start_worker):
+    tracer = Tracer()
+    worker = start_worker(tracer=tracer)
+
+    worker.say("hello there")
+    wait_until(lambda: worker.stats()['spoken'] == 1)
+
+    assert tracer.snapshot()['speech.time_to_first_audio']['count'] == 1
+    assert worker.stats()['first_audio_last_ms'] >= 0
+
+
+def test_missing_engine_reports_unavailable():
+    ready = []
+
+    def broken():
+        raise RuntimeError("no audio device")
+
+    worker = SpeechWorker(broken, on_ready=ready.append)
+    worker.ready.wait(5)
+    try:
+        assert ready == [False]
+        assert worker.say("hello") is False
+    finally:
+        worker.close()
+    assert not worker.thread.is_alive()
+
+
+def test_closed_worker_refuses_text(engine, start_worker):
+    worker = start_worker()
+    worker.close()
+
+    assert worker.say("hello") is False
+    assert not worker.thread.is_alive()
@@ -0,0 +1,63 @@
+"""Cold startup time and deferred imports"""
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from tetris_bench import generate_database
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STARTUP_BUDGET_MS = float(os.environ.get("TETRIS_STARTUP_BUDGET_MS", 1500))
+HEAVY_MODULES = ['cv2', 'numpy', 'openai', 'PIL', 'cryptography', 'requests',
+                 'speech_recognition', 'pyttsx3', 'psutil', 'tetris_voice']
+
+STARTUP_SCRIPT = textwrap.dedent("""
+    import json, sys, time
+    start = time.perf_counter()
+    import tetris_ai
+    from tetris_core import STARTUP_PROFILER, TetrisEngine
+    engine = TetrisEngine(db_path=sys.argv[1], start_sampler=False)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    loaded = sorted(name for name in sys.argv[2:] if name in sys.modules)
+    reply = engine.process_command("hello")
+    engine.close()
+    print(json.dumps({"elapsed_ms": elapsed_ms, "engine_ms": STARTUP_PROFILER.total_ms(),
+                      "loaded": loaded, "reply": reply}))
+""")
+
+
+@pytest.fixture(scope="module")
+def seeded_db(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("startup") / "tetris_memory.db")
+    generate_database(path, 5000)
+    return path
+
+
+def cold_start(db_path):
+    result = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, db_path, *HEAVY_MODULES],
+                            cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_cold_start_within_budget(seeded_db):
+    stats = cold_start(seeded_db)
+
+    assert stats["elapsed_ms"] < STARTUP_BUDGET_MS, stats
+    assert stats["reply"]
+
+
+def test_heavy_modules_stay_deferred(seeded_db):
+    assert cold_start(seeded_db)["loaded"] == []
+
+
+def test_startup_budget_flag(seeded_db):
+    result = subprocess.run([sys.executable, "tetris_core.py", "--db", seeded_db, "--profile-startup",
+                             "--startup-budget", str(STARTUP_BUDGET_MS)],
+                            cwd=ROOT, capture_output=True, text=True, timeout=60)
+
+    assert result.returncode == 0, result.stderr
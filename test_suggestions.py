@@ -0,0 +1,94 @@
+"""Autocomplete from the usage-weighted suggestion trie"""
+import random
+
+import pytest
+
+from tetris_core import SchemaMigrator, SuggestionTrie, TetrisEngine
+
+
+def sorted_completions(weights, prefix, k):
+    matching = [(weight, phrase) for phrase, weight in weights.items() if phrase.startswith(prefix)]
+    return [phrase for _, phrase in sorted(matching, key=lambda item: (-item[0], item[1]))[:k]]
+
+
+def all_prefixes(phrases):
+    return {phrase[:i] for phrase in phrases for i in range(len(phrase) + 1)} | {"zz"}
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_cached_top_k_equals_a_full_sort(seed):
+    rng = random.Random(seed)
+    trie = SuggestionTrie(k=3)
+    weights = {}
+    words = ["open", "opera", "operate", "lock", "locate", "log", "lo", "o"]
+
+    for step in range(300):
+        phrase = rng.choice(words) + rng.choice(["", " mail", " door", "s"])
+        action = rng.random()
+        if action < 0.5:
+            weights[phrase] = rng.randint(0, 20)
+            trie.set(phrase, weights[phrase])
+        elif action < 0.8:
+            weights[phrase] = weights.get(phrase, 0) + 1
+            trie.increment(phrase)
+        else:
+            assert trie.remove(phrase) == (weights.pop(phrase, None) is not None)
+        if step % 50 == 0:
+            trie.load([])  # Rebuilds from scratch, which must agree with the incremental updates
+
+        for prefix in all_prefixes(weights):
+            assert trie.complete(prefix) == sorted_completions(weights, prefix, 3), prefix
+    assert len(trie) == len(weights)
+
+
+def test_bulk_load_matches_incremental_inserts():
+    rng = random.Random(3)
+    items = [(''.join(rng.choice("abc") for _ in range(rng.randint(1, 6))), rng.randint(0, 9)) for _ in range(400)]
+    loaded, inserted = SuggestionTrie(), SuggestionTrie()
+
+    loaded.load(items)
+    for phrase, weight in items:
+        inserted.set(phrase, weight)
+
+    weights = dict(items)
+    for prefix in all_prefixes(weights):
+        assert loaded.complete(prefix) == inserted.complete(prefix) == sorted_completions(weights, prefix, 5)
+    assert loaded.complete("a", k=2) == sorted_completions(weights, "a", 2)
+
+
+def test_updates_made_during_a_load_are_replayed():
+    trie = SuggestionTrie()
+    trie.set("lock screen", 1)
+
+    def items():
+        yield "lights on", 5
+        # Runs while load is building the new trie without the lock
+        trie.set("lock screen", 9)
+        trie.set("play music", 3)
+        trie.remove("lights on")
+        yield "lights off", 2
+
+    trie.load(items())
+
+    assert trie.complete("l") == ["lock screen", "lights off"]
+    assert trie.complete("") == ["lock screen", "play music", "lights off"]
+    assert trie.changes is None
+
+
+def test_engine_suggests_repeated_inputs(tmp_path):
+    db_path = str(tmp_path / "tetris_memory.db")
+    SchemaMigrator(db_path).migrate()
+    engine = TetrisEngine(db_path=db_path, start_sampler=False)
+    try:
+        engine.indexes_ready.wait(5)
+        engine.record_input_usage("Check Weather")
+        assert engine.get_command_suggestions("check") == []
+        engine.record_input_usage("check weather ")
+        engine.record_input_usage("check mail")
+        engine.record_input_usage("check mail")
+        engine.record_input_usage("check mail")
+
+        assert engine.get_command_suggestions("check") == ["check mail", "check weather"]
+        assert engine.input_counts == {"check weather": 2, "check mail": 3}
+    finally:
+        engine.close()
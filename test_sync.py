@@ -0,0 +1,74 @@
+"""Custom command changes propagating between engines sharing one database"""
+import sqlite3
+
+import pytest
+
+from tetris_core import SchemaMigrator, TetrisEngine
+
+
+@pytest.fixture
+def engines(tmp_path):
+    path = str(tmp_path / "tetris_memory.db")
+    SchemaMigrator(path).migrate()
+    a = TetrisEngine(db_path=path, start_sampler=False)
+    b = TetrisEngine(db_path=path, start_sampler=False)
+    yield a, b
+    a.close()
+    b.close()
+
+
+def changes_seen_by(engine):
+    seen = []
+    engine.on_custom_commands_changed = lambda changed, removed: seen.append((changed, removed))
+    return seen
+
+
+def test_insert_edit_and_delete_reach_the_other_engine(engines):
+    a, b = engines
+    seen = changes_seen_by(b)
+
+    a.save_custom_command("Lights On", "Turning the lights on", "response", "")
+    a.persistence.flush()
+    assert b.refresh_custom_commands() == 1
+    assert b.check_custom_commands("lights on please") == "Turning the lights on"
+
+    a.save_custom_command("lamp on", "Lamp on", "response", "", old_trigger="Lights On")
+    a.persistence.flush()
+    assert b.refresh_custom_commands() == 2
+    assert b.check_custom_commands("lights on please") is None
+    assert b.check_custom_commands("lamp on please") == "Lamp on"
+
+    a.delete_custom_command("lamp on")
+    a.persistence.flush()
+    assert b.refresh_custom_commands() == 1
+    assert b.check_custom_commands("lamp on please") is None
+    assert b.custom_commands == {}
+
+    assert seen == [(["lights on"], []), (["lamp on"], ["lights on"]), ([], ["lamp on"])]
+
+
+def test_refresh_is_a_no_op_without_new_commits(engines):
+    a, b = engines
+    a.save_custom_command("lock screen", "Locking", "response", "")
+    a.persistence.flush()
+    assert b.refresh_custom_commands() == 1
+
+    assert b.refresh_custom_commands() == 0
+    # An engine's own writes are already in its memory and apply as no-ops
+    a.refresh_custom_commands()
+    assert a.refresh_custom_commands() == 0
+
+
+def test_bulk_changes_reload_once(engines):
+    a, b = engines
+    seen = changes_seen_by(b)
+    b.bulk_reload_threshold = 10
+    with sqlite3.connect(a.db_path) as conn:
+        conn.executemany("INSERT INTO custom_commands (trigger, response, action_type) VALUES (?, ?, 'response')",
+                         [(f"command {i}", f"reply {i}") for i in range(25)])
+
+    b.refresh_custom_commands()
+
+    assert seen == [(None, None)]
+    assert len(b.custom_commands) == 25
+    assert b.check_custom_commands("run command 24") == "reply 24"
@@ -0,0 +1,147 @@
+"""Latency histograms and their Prometheus and JSON exports"""
+import json
+import random
+import re
+import socket
+import threading
+
+import pytest
+
+from tetris_core import LatencyHistogram, SchemaMigrator, TetrisEngine, Tracer
+
+
+def test_small_values_get_exact_buckets():
+    histogram = LatencyHistogram()
+    for micros in range(64):
+        index = histogram.bucket_index(micros)
+        assert histogram.bucket_upper_ms(index) == (micros + 1) / 1000
+
+
+@pytest.mark.parametrize("sub_buckets", [16, 32])
+def test_buckets_are_contiguous_and_within_relative_error(sub_buckets):
+    histogram = LatencyHistogram(sub_buckets)
+    previous_index, lower = 0, 0
+    for micros in range(1, 300_000):
+        index = histogram.bucket_index(micros)
+        assert index in (previous_index, previous_index + 1)
+        if index != previous_index:
+            lower = micros
+            previous_index = index
+        upper = histogram.bucket_upper_ms(index) * 1000
+        assert lower <= micros < upper
+        # One microsecond wide at first, then never wider than 1/sub_buckets of the value
+        assert upper - lower <= max(1, lower / sub_buckets)
+
+
+def test_percentiles_stay_within_bucket_error():
+    rng = random.Random(1)
+    values = [rng.lognormvariate(1, 1.5) for _ in range(10_000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    values.sort()
+
+    for fraction in (0.5, 0.9, 0.95, 0.99):
+        exact = values[int(round(len(values) * fraction)) - 1]
+        assert exact <= histogram.percentile(fraction) <= exact * (1 + 1 / 32) + 0.001
+    assert histogram.percentile(1.0) == max(values)
+    summary = histogram.summary()
+    assert summary['count'] == 10_000 and summary['min_ms'] == values[0] and summary['max_ms'] == values[-1]
+    assert summary['sum_ms'] == pytest.approx(sum(values))
+
+
+def test_cumulative_buckets_count_values_at_or_below_each_bound():
+    rng = random.Random(2)
+    bounds = LatencyHistogram.PROMETHEUS_BOUNDS_MS
+    # Bounds themselves, values either side of them and values past the last bound
+    values = [bound * factor for bound in bounds for factor in (0.999, 1, 1.001)]
+    values += [rng.uniform(0, 20_000) for _ in range(1000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+
+    assert histogram.cumulative_buckets() == [sum(value <= bound for value in values) for bound in bounds]
+
+
+def test_empty_histogram_reports_zeros():
+    summary = LatencyHistogram().summary()
+
+    assert summary == {'count': 0, 'sum_ms': 0.0, 'min_ms': 0.0, 'max_ms': 0.0, 'mean_ms': 0.0,
+                       'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0}
+    assert LatencyHistogram().cumulative_buckets() == [0] * len(LatencyHistogram.PROMETHEUS_BOUNDS_MS)
+
+
+def test_prometheus_export_is_a_valid_cumulative_histogram():
+    tracer = Tracer()
+    for value in (0.2, 3, 3, 40, 12_000):
+        tracer.record('stage.core_handler', value)
+    tracer.record('process_command', 1)
+
+    text = tracer.export_prometheus()
+
+    assert text.endswith("\n")
+    buckets = re.findall(r'tetris_span_latency_ms_bucket\{span="stage.core_handler",le="([^"]+)"\} (\d+)', text)
+    assert [le for le, _ in buckets] == [str(bound) for bound in LatencyHistogram.PROMETHEUS_BOUNDS_MS] + ["+Inf"]
+    counts = [int(n) for _, n in buckets]
+    assert counts == sorted(counts) and counts[-1] == 5
+    assert dict(buckets)["0.25"] == "1" and dict(buckets)["5"] == "3" and dict(buckets)["10000"] == "4"
+    assert 'tetris_span_latency_ms_count{span="stage.core_handler"} 5' in text
+    assert 'tetris_span_latency_ms_sum{span="stage.core_handler"} 12046.2' in text
+    assert 'le="1"} 1' in text.split('span="process_command"', 1)[1]
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer(enabled=False)
+    with tracer.span('process_command'):
+        pass
+
+    assert tracer.snapshot() == {}
+
+
+def test_json_export_to_file_and_socket(tmp_path):
+    tracer = Tracer()
+    tracer.record('process_command', 2.0)
+    target = tmp_path / "metrics.json"
+
+    tracer.export(str(target))
+
+    assert json.loads(target.read_text())['spans']['process_command']['count'] == 1
+    tracer.export(str(tmp_path / "metrics.prom"))
+    assert (tmp_path / "metrics.prom").read_text().startswith("# HELP")
+
+    received = []
+    server = socket.create_server(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+
+    def accept():
+        conn, _ = server.accept()
+        with conn:
+            chunks = []
+            while chunk := conn.recv(4096):
+                chunks.append(chunk)
+            received.append(b"".join(chunks).decode("utf-8"))
+
+    thread = threading.Thread(target=accept)
+    thread.start()
+    try:
+        tracer.export(f"tcp://127.0.0.1:{port}", fmt='json')
+        thread.join(5)
+    finally:
+        server.close()
+    assert json.loads(received[0])['spans']['process_command']['max_ms'] == 2.0
+
+
+def test_process_command_records_each_stage(tmp_path):
+    db_path = str(tmp_path / "tetris_memory.db")
+    SchemaMigrator(db_path).migrate()
+    engine = TetrisEngine(db_path=db_path, start_sampler=False)
+    try:
+        engine.process_command("what time is it")
+        spans = engine.tracer.snapshot()
+    finally:
+        engine.close()
+
+    for name in ('process_command', 'stage.wake_words', 'stage.custom_triggers', 'stage.intent_match',
+                 'stage.core_handler'):
+        assert spans[name]['count'] == 1, name
+    assert spans['process_command']['max_ms'] >= spans['stage.core_handler']['max_ms']
@@ -0,0 +1,144 @@
+"""Crash safety of the batched custom command usage counters"""
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import textwrap
+import time
+
+import pytest
+
+from tetris_core import SchemaMigrator, UsageCounters
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Counts hits in a child process that dies without flushing or closing
+CRASH_SCRIPT = textwrap.dedent("""
+    import os, sys
+    from tetris_core import UsageCounters
+    db_path, hits, flushed_hits, keep_rotated = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), sys.argv[4] == '1'
+    counters = UsageCounters(db_path, flush_interval=3600)
+    counters.load([('Lights On', 0, None), ('lock screen', 0, None)])
+    for _ in range(flushed_hits):
+        counters.hit('lights on')
+    if keep_rotated:
+        os.remove = lambda path: None  # Die between the commit and removing the rotated journal
+    counters.flush()
+    for i in range(hits):
+        counters.hit('lights on' if i % 2 else 'lock screen')
+    os._exit(0)
+""")
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "tetris_memory.db")
+    SchemaMigrator(path).migrate()
+    with sqlite3.connect(path) as conn:
+        conn.executemany("INSERT INTO custom_commands (trigger, response, action_type) VALUES (?, 'ok', 'response')",
+                         [('Lights On',), ('lock screen',)])
+    return path
+
+
+def usage(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return dict(conn.execute("SELECT trigger, usage_count FROM custom_commands"))
+
+
+def journal_files(db_path):
+    directory, name = os.path.split(db_path)
+    return sorted(entry for entry in os.listdir(directory) if entry.startswith(f"{name}-usage-"))
+
+
+def crash(db_path, hits, flushed_hits=0, keep_rotated=False):
+    subprocess.run([sys.executable, "-c", CRASH_SCRIPT, db_path, str(hits), str(flushed_hits),
+                    '1' if keep_rotated else '0'], cwd=ROOT, check=True, timeout=60)
+
+
+def reopen(db_path):
+    # The default interval keeps the heartbeat window at its 60 s minimum
+    counters = UsageCounters(db_path)
+    counters.close()
+
+
+def test_hits_from_a_crashed_process_are_recovered(db_path):
+    crash(db_path, hits=7)
+    assert usage(db_path) == {'Lights On': 0, 'lock screen': 0}
+    assert len(journal_files(db_path)) == 1
+
+    reopen(db_path)
+
+    assert usage(db_path) == {'Lights On': 3, 'lock screen': 4}
+    assert journal_files(db_path) == []
+
+
+def test_committed_generation_is_not_counted_twice(db_path):
+    crash(db_path, hits=2, flushed_hits=5, keep_rotated=True)
+    assert usage(db_path) == {'Lights On': 5, 'lock screen': 0}
+    assert len(journal_files(db_path)) == 2  # Rotated generation 1 and the live journal
+
+    reopen(db_path)
+
+    assert usage(db_path) == {'Lights On': 6, 'lock screen': 1}
+    assert journal_files(db_path) == []
+    reopen(db_path)
+    assert usage(db_path) == {'Lights On': 6, 'lock screen': 1}
+
+
+def test_torn_final_line_is_ignored(db_path):
+    crash(db_path, hits=3)
+    journal = os.path.join(os.path.dirname(db_path), journal_files(db_path)[0])
+    with open(journal, 'a', encoding='utf-8') as f:
+        f.write('["lock scr')
+
+    reopen(db_path)
+
+    assert usage(db_path) == {'Lights On': 1, 'lock screen': 2}
+
+
+def write_journal(db_path, journal_id, hits, age=0):
+    path = os.path.join(os.path.dirname(db_path), f"{os.path.basename(db_path)}-usage-{journal_id}.journal")
+    with open(path, 'w', encoding='utf-8') as f:
+        for _ in range(hits):
+            f.write(json.dumps(['Lights On', '2024-01-01 00:00:00']) + "\n")
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_journal_of_a_running_instance_is_left_alone(db_path):
+    live = write_journal(db_path, f"{os.getpid()}-{int(time.time())}-live", hits=4)
+
+    reopen(db_path)
+
+    assert usage(db_path)['Lights On'] == 0
+    assert os.path.exists(live)
+
+
+def test_silent_heartbeat_marks_a_reused_pid_abandoned(db_path):
+    # The pid is alive (it is ours) but nothing has touched the journal for too long
+    write_journal(db_path, f"{os.getpid()}-{int(time.time()) - 3600}-old", hits=4, age=3600)
+
+    reopen(db_path)
+
+    assert usage(db_path)['Lights On'] == 4
+    assert journal_files(db_path) == []
+
+
+def test_flush_writes_pending_hits_in_one_batch(db_path):
+    counters = UsageCounters(db_path, flush_interval=3600)
+    try:
+        counters.load([('Lights On', 0, None)])
+        for _ in range(3):
+            counters.hit('lights on')
+        assert counters.get('LIGHTS ON')[0] == 3
+        assert usage(db_path)['Lights On'] == 0
+
+        assert counters.flush() == 1
+        assert usage(db_path)['Lights On'] == 3
+        assert counters.flush() == 0
+        assert [entry.endswith('.journal') for entry in journal_files(db_path)] == [True]
+    finally:
+        counters.close()
@@ -0,0 +1,226 @@
+"""Voice capture, segmentation and batch replay against WAV fixtures"""
+import argparse
+import json
+import shutil
+import sqlite3
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from tetris_core import SchemaMigrator  # noqa: E402
+from tetris_voice import (RingBuffer, ScriptedRecognizer, SidecarRecognizer, SpeechSegmenter,  # noqa: E402
+                          VoicePipeline, WavSource, find_audio_files, load_audio, run_batch)
+
+
+ROOT = Path(__file__).parent
+FIXTURES = ROOT / "fixtures"
+# Tone bursts in hello.wav, in seconds
+HELLO_PHRASES = [(0.5, 1.0), (2.2, 2.6)]
+
+
+class ArraySource:
+    """In-memory audio source yielding fixed-size chunks"""
+
+    def __init__(self, samples, sample_rate=8000, chunk=800):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.chunk = chunk
+        self.position = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def read(self):
+        chunk = self.samples[self.position:self.position + self.chunk]
+        self.position += len(chunk)
+        return chunk
+
+
+class UnreliableRecognizer(SidecarRecognizer):
+    """Sidecar recognizer that fails on one file; built in batch workers as test_voice:UnreliableRecognizer"""
+
+    def transcribe_file(self, path):
+        if Path(path).stem == "run_backup":
+            raise OSError("device busy")
+        return super().transcribe_file(path)
+
+
+def segment(samples, sample_rate, chunk):
+    segmenter = SpeechSegmenter(sample_rate)
+    calibration = sample_rate // 2
+    segmenter.calibrate(samples[:calibration])
+    segments = []
+    for start in range(calibration, len(samples), chunk):
+        segments.extend(segmenter.feed(samples[start:start + chunk]))
+    tail = segmenter.flush()
+    return segments + ([tail] if tail is not None else [])
+
+
+def test_ring_buffer_wraps_around():
+    ring = RingBuffer(10)
+    ring.write(np.arange(7, dtype=np.int16))
+    ring.write(np.arange(7, 15, dtype=np.int16))
+
+    assert ring.written == 15
+    assert ring.read(5, 15).tolist() == list(range(5, 15))
+    # Positions that were overwritten are clamped away
+    assert ring.read(0, 8).tolist() == [5, 6, 7]
+    assert ring.read(12, 20).tolist() == [12, 13, 14]
+    assert ring.read(15, 20).tolist() == []
+
+
+def test_ring_buffer_keeps_newest_samples_of_an_oversized_write():
+    ring = RingBuffer(4)
+    ring.write(np.arange(3, dtype=np.int16))
+    ring.write(np.arange(100, 110, dtype=np.int16))
+
+    assert ring.written == 13
+    assert ring.read(0, 13).tolist() == [106, 107, 108, 109]
+
+
+@pytest.mark.parametrize("chunk_ms", [30, 100, 1000])
+def test_vad_finds_each_phrase_in_the_fixture(chunk_ms):
+    samples, sample_rate = load_audio(FIXTURES / "hello.wav")
+
+    segments = segment(samples, sample_rate, sample_rate * chunk_ms // 1000)
+
+    assert len(segments) == len(HELLO_PHRASES)
+    for found, (start, end) in zip(segments, HELLO_PHRASES):
+        # Pre-roll reaches back before the onset; the pause closes it after the end
+        assert start - 0.35 <= found.start <= start
+        assert end <= found.end <= end + 0.85
+        assert len(found.samples) == round((found.end - found.start) * sample_rate)
+
+
+def test_vad_ignores_silence_and_short_clicks():
+    samples, sample_rate = load_audio(FIXTURES / "silence.wav")
+    assert segment(samples, sample_rate, 800) == []
+
+    clicked = samples.copy()
+    clicked[4000:4400] = 8000  # 50 ms, below min_phrase_ms
+    assert segment(clicked, sample_rate, 800) == []
+
+
+def test_pipeline_transcribes_each_segment_with_a_fake_recognizer():
+    transcripts = []
+    pipeline = VoicePipeline(WavSource(FIXTURES / "hello.wav"), ScriptedRecognizer(["what time is it", "tell a joke"]),
+                             on_transcript=lambda text, info: transcripts.append((text, info))).start()
+    pipeline.join(5)
+
+    assert [text for text, _ in transcripts] == ["what time is it", "tell a joke"]
+    assert transcripts[0][1]['start'] < transcripts[1][1]['start']
+    stats = pipeline.stats()
+    assert (stats['segments'], stats['recognized'], stats['dropped'], stats['errors']) == (2, 2, 0, 0)
+    assert stats['calibrations'] == 1
+
+
+def test_pipeline_drops_oldest_segments_when_recognition_falls_behind():
+    samples, _ = load_audio(FIXTURES / "hello.wav")
+    release = threading.Event()
+
+    class SlowRecognizer(ScriptedRecognizer):
+        def transcribe(self, samples, sample_rate):
+            release.wait(5)
+            return super().transcribe(samples, sample_rate)
+
+    recognizer = SlowRecognizer([f"phrase {i}" for i in range(10)])
+    transcripts = []
+    pipeline = VoicePipeline(ArraySource(np.tile(samples, 4)), recognizer, max_pending=1,
+                             on_transcript=lambda text, info: transcripts.append(text)).start()
+    while pipeline.stats()['segments'] < 8:
+        threading.Event().wait(0.01)
+    release.set()
+    pipeline.join(5)
+
+    stats = pipeline.stats()
+    assert stats['dropped'] == 6
+    assert transcripts == ["phrase 0", "phrase 1"]
+
+
+def test_pipeline_reports_recognizer_errors_and_keeps_going():
+    errors = []
+
+    class FlakyRecognizer:
+        calls = 0
+
+        def transcribe(self, samples, sample_rate):
+            self.calls += 1
+            if self.calls == 1:
+                raise RuntimeError("service unavailable")
+            return "tell a joke"
+
+    transcripts = []
+    pipeline = VoicePipeline(WavSource(FIXTURES / "hello.wav"), FlakyRecognizer(), on_error=errors.append,
+                             on_transcript=lambda text, info: transcripts.append(text)).start()
+    pipeline.join(5)
+
+    assert [str(error) for error in errors] == ["service unavailable"]
+    assert transcripts == ["tell a joke"]
+    assert pipeline.stats()['errors'] == 1
+
+
+def test_sidecar_recognizer_reads_transcripts(tmp_path):
+    recognizer = SidecarRecognizer()
+
+    assert recognizer.transcribe_file(FIXTURES / "commands" / "what_time.wav") == "what time is it"
+    shutil.copy(FIXTURES / "silence.wav", tmp_path / "silence.wav")
+    assert recognizer.transcribe_file(tmp_path / "silence.wav") is None
+
+
+def test_batch_dry_run_replays_without_side_effects(tmp_path, capsys):
+    db_path = str(tmp_path / "tetris_memory.db")
+    SchemaMigrator(db_path).migrate()
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO custom_commands (trigger, response, action_type, parameters) "
+                     "VALUES ('run backup', 'Backing up', 'command', 'touch ' || ?)", (str(tmp_path / "ran"),))
+    report = tmp_path / "report.jsonl"
+    args = argparse.Namespace(directory=str(FIXTURES / "commands"), recognizer='sidecar', workers=1, chunksize=1,
+                              report=str(report), db=db_path, no_learning=True, dry_run=True)
+
+    assert run_batch(args) == 0
+
+    records = {record['file']: record for record in map(json.loads, report.read_text().splitlines())}
+    assert records['open_calculator.wav']['response'] == "dry run: open_app skipped"
+    assert records['run_backup.wav']['response'] == "dry run: custom command 'run backup' skipped"
+    assert records['what_time.wav']['transcript'] == "what time is it"
+    assert records['what_time.wav']['response']
+    assert not (tmp_path / "ran").exists()
+
+
+def test_batch_runs_across_worker_processes_and_reports_failures(tmp_path):
+    db_path = str(tmp_path / "tetris_memory.db")
+    report = tmp_path / "report.jsonl"
+    args = argparse.Namespace(directory=str(FIXTURES / "commands"), recognizer='test_voice:UnreliableRecognizer',
+                              workers=2, chunksize=1, report=str(report), db=db_path, no_learning=True, dry_run=True)
+
+    assert run_batch(args) == 0
+
+    records = [json.loads(line) for line in report.read_text().splitlines()]
+    assert [record['file'] for record in records] == ["open_calculator.wav", "run_backup.wav", "what_time.wav"]
+    assert records[1]['error'] == "OSError: device busy" and records[1]['response'] is None
+    assert records[0]['intent'] == "open_app" and records[0]['recognition_ms'] >= 0
+    assert all(record['dispatch_ms'] is not None for record in (records[0], records[2]))
+
+
+def test_audio_files_are_found_recursively():
+    files = [Path(path).relative_to(FIXTURES).as_posix() for path in find_audio_files(FIXTURES)]
+
+    assert files == ["commands/open_calculator.wav", "commands/run_backup.wav", "commands/what_time.wav",
+                     "hello.wav", "silence.wav"]
+
+
+def test_segments_tool_prints_each_phrase():
+    result = subprocess.run([sys.executable, "tetris_voice.py", "segments", str(FIXTURES / "hello.wav")],
+                            cwd=ROOT, capture_output=True, text=True, check=True, timeout=60)
+
+    segments = [json.loads(line) for line in result.stdout.splitlines()]
+    assert len(segments) == len(HELLO_PHRASES)
+    assert json.loads(result.stderr.splitlines()[-1])['segments'] == 2
@@ -0,0 +1,169 @@
+"""WeatherClient against a local stub of the weather service"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from tetris_core import TetrisEngine, WeatherClient
+
+requests = pytest.importorskip("requests")
+
+
+class StubWeatherService:
+    """Answers GET /<location>?format=3 with a canned report after an optional delay"""
+
+    def __init__(self):
+        self.calls = []
+        self.status = 200
+        self.delay = 0
+        self.report = "London: +12°C"
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                service.calls.append(self.path)
+                time.sleep(service.delay)
+                body = service.report.encode('utf-8')
+                self.send_response(service.status)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def service():
+    service = StubWeatherService()
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "tetris_memory.db")
+
+
+@pytest.fixture
+def make_client(db_path, service):
+    clients = []
+
+    def make_client(**options):
+        client = WeatherClient(db_path, base_url=service.url, **options)
+        clients.append(client)
+        return client
+    yield make_client
+    for client in clients:
+        client.close()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_fetches_and_caches_fresh_reports(make_client, service):
+    client = make_client()
+
+    report, _, stale = client.get("London")
+    assert (report, stale) == ("London: +12°C", False)
+    assert client.get("london ")[0] == report
+    assert service.calls == ["/london?format=3"]
+
+
+def test_concurrent_requests_share_one_upstream_call(make_client, service):
+    client = make_client()
+    service.delay = 0.3
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        reports = list(pool.map(lambda _: client.get("Paris")[0], range(8)))
+
+    assert reports == ["London: +12°C"] * 8
+    assert service.calls == ["/paris?format=3"]
+
+
+def test_stale_report_is_served_while_refreshing(make_client, service):
+    client = make_client(ttl=0.2)
+    client.get("Oslo")
+    time.sleep(0.25)
+    service.delay = 0.5
+    service.report = "Oslo: -3°C"
+
+    start = time.perf_counter()
+    report, _, stale = client.get("Oslo")
+    assert (report, stale) == ("London: +12°C", True)
+    assert time.perf_counter() - start < 0.2
+
+    wait_for(lambda: client.cache["oslo"][0] == "Oslo: -3°C")
+    report, _, stale = client.get("Oslo")
+    assert (report, stale) == ("Oslo: -3°C", False)
+    assert len(service.calls) == 2
+
+
+def test_cache_survives_a_restart(db_path, make_client, service):
+    make_client().get("Rome")
+    service.status = 500
+
+    report, _, stale = make_client().get("Rome")
+
+    assert (report, stale) == ("London: +12°C", False)
+    assert len(service.calls) == 1
+
+
+def test_upstream_error_is_reported_and_retried(make_client, service):
+    client = make_client()
+    service.status = 503
+
+    with pytest.raises(RuntimeError, match="HTTP 503"):
+        client.get("Lima")
+    service.status = 200
+    assert client.get("Lima")[0] == "London: +12°C"
+    assert len(service.calls) == 2
+
+
+def test_upstream_error_keeps_serving_stale_report(make_client, service):
+    client = make_client(ttl=0.1)
+    client.get("Cairo")
+    time.sleep(0.15)
+    service.status = 500
+
+    for _ in range(2):
+        report, _, stale = client.get("Cairo")
+        assert (report, stale) == ("London: +12°C", True)
+        wait_for(lambda: not client.inflight)
+
+
+def test_upstream_timeout(make_client, service):
+    client = make_client(timeout=0.2)
+    service.delay = 1
+
+    start = time.perf_counter()
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get("Quito")
+    assert time.perf_counter() - start < 0.9
+
+
+def test_engine_reports_weather_failures(db_path, service):
+    engine = TetrisEngine(db_path=db_path, start_sampler=False)
+    try:
+        engine.weather_client.base_url = service.url
+        assert engine.get_advanced_weather("Berlin") == "Weather for Berlin: London: +12°C"
+        service.status = 500
+        assert engine.get_advanced_weather("Madrid") == "Unable to retrieve weather for Madrid."
+    finally:
+        engine.close()
@@ -1,98 +1,131 @@
+import time
+from tetris_core import STARTUP_PROFILER, lazy_import
+
+_import_start = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog, simpledialog
-import pyttsx3
-import speech_recognition as sr
 import datetime
-import webbrowser
 import os
-import subprocess
-import platform
-import time
-import requests
-import json
 import threading
-import psutil
 import sys
-import shutil
-from pathlib import Path
-import math
-import random
-import sqlite3
-import re
-import hashlib
-from PIL import Image, ImageTk
-import cv2
-import numpy as np
-import openai
-from cryptography.fernet import Fernet
-import pickle
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from tetris_core import CommandExecutor, MainThreadDispatcher, SpeechWorker, TetrisEngine
+STARTUP_PROFILER.record_phase("ui.imports", _import_start, time.perf_counter())
+
+# Heavy optional dependencies load on first use
+pyttsx3 = lazy_import('pyttsx3')
+sr = lazy_import('speech_recognition')
+tetris_voice = lazy_import('tetris_voice')
+
 
 class TETRISInterface:
     def __init__(self):
-        self.root = tk.Tk()
-        self.setup_database()
-        self.setup_window()
-        self.setup_ai_engine()
-        self.setup_ui()
-        self.setup_custom_commands()
+        with STARTUP_PROFILER.phase("ui.tk_root"):
+            self.root = tk.Tk()
+        
+        startup_steps = [
+            self.setup_executor,
+            self.setup_engine,
+            self.setup_window,
+            self.setup_ai_engine,
+            self.setup_ui,
+            self.register_ui_handlers,
+        ]
+        for step in startup_steps:
+            with STARTUP_PROFILER.phase(f"ui.{step.__name__}"):
+                step()
+        
         self.is_listening = False
         self.conversation_history = []
-        self.user_preferences = self.load_user_preferences()
+        self.user_preferences = self.core.user_preferences
+        self.schedule_retention()
         self.learning_mode = True
         self.security_level = "STANDARD"
         self.active_protocols = []
         
-    def setup_database(self):
-        """Initialize SQLite database for custom commands and learning"""
-        self.db_path = "tetris_memory.db"
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.cursor = self.conn.cursor()
-        
-        # Create tables
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS custom_commands (
-                id INTEGER PRIMARY KEY,
-                trigger TEXT UNIQUE,
-                response TEXT,
-                action_type TEXT,
-                parameters TEXT,
-                usage_count INTEGER DEFAULT 0,
-                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_used TIMESTAMP
-            )
-        ''')
+        if '--profile-startup' in sys.argv:
+            print(STARTUP_PROFILER.report())
         
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_preferences (
-                key TEXT PRIMARY KEY,
-                value TEXT,
-                updated_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS conversation_memory (
-                id INTEGER PRIMARY KEY,
-                user_input TEXT,
-                tetris_response TEXT,
-                context TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                importance_score INTEGER DEFAULT 1
-            )
-        ''')
-        
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS learned_patterns (
-                id INTEGER PRIMARY KEY,
-                pattern TEXT,
-                response_template TEXT,
-                confidence_score REAL,
-                success_rate REAL DEFAULT 0.0,
-                usage_count INTEGER DEFAULT 0
-            )
-        ''')
+    def setup_engine(self):
+        """Start the headless command engine this interface drives"""
+        self.core = TetrisEngine()
+        self.core.prompt_folder_name = lambda: self.run_on_main_thread(
+            simpledialog.askstring, "Create Folder", "Enter folder name:"
+        )
         
-        self.conn.commit()
+        # Shared with the command dialogs and management views
+        self.db_path = self.core.db_path
+        self.persistence = self.core.persistence
+        
+        # Pick up commands changed by other instances or imports
+        self.core.on_custom_commands_changed = lambda changed, removed: self.main_thread.post(
+            self.on_custom_commands_changed, changed, removed
+        )
+        self.core.on_command_used = lambda trigger, usage_count, last_used: self.main_thread.post(
+            self.on_command_used, trigger, usage_count, last_used
+        )
+        self.root.after(2000, self.poll_custom_commands)
+    
+    def poll_custom_commands(self):
+        """Apply custom command changes committed by other connections"""
+        self.core.refresh_custom_commands()
+        self.root.after(2000, self.poll_custom_commands)
+    
+    def on_custom_commands_changed(self, changed, removed):
+        """Apply another writer's command changes to the COMMANDS tab row by row"""
+        if changed is None:
+            self.refresh_command_list()  # Bulk reload; the loaded page is stale as a whole
+            return
+        for trigger in removed:
+            self.remove_command_row(trigger)
+        for trigger in changed:
+            self.apply_command_row(trigger)
+        if changed or removed:
+            self.update_command_count()
+    
+    def on_command_used(self, trigger, usage_count, last_used):
+        """Update one COMMANDS row with the live usage counters"""
+        if self.command_tree.exists(trigger):
+            values = list(self.command_tree.item(trigger, 'values'))
+            values[2:4] = [usage_count, last_used]
+            self.command_tree.item(trigger, values=values)
+    
+    @property
+    def custom_commands(self):
+        # Not cached: the engine swaps in a new table after a bulk reload
+        return self.core.custom_commands
+    
+    @property
+    def learning_mode(self):
+        return self.core.learning_mode
+    
+    @learning_mode.setter
+    def learning_mode(self, value):
+        self.core.learning_mode = value
+    
+    def register_ui_handlers(self):
+        """Plug handlers that live in the desktop interface into the engine"""
+        ui_handlers = {
+            'shutdown': lambda command, original: self.advanced_shutdown(command),
+            'restart': lambda command, original: self.advanced_restart(command),
+            'sleep': lambda command, original: self.advanced_sleep(command),
+            'lock': lambda command, original: self.advanced_lock(),
+            'remember': lambda command, original: self.create_memory(command),
+            'forget': lambda command, original: self.delete_memory(command),
+            'recall': lambda command, original: self.recall_memory(command),
+            'security_scan': lambda command, original: self.security_scan(),
+            'privacy_mode': lambda command, original: self.toggle_privacy_mode(),
+            'analyze': lambda command, original: self.perform_analysis(command),
+            'predict': lambda command, original: self.make_prediction(command),
+            'optimize': lambda command, original: self.optimize_system(command),
+            'help': lambda command, original: self.show_advanced_help(),
+        }
+        
+        for intent, handler in ui_handlers.items():
+            if intent in self.tk_bound_intents:
+                handler = (lambda handler: lambda command, original: self.run_on_main_thread(handler, command, original))(handler)
+            self.core.register_handler(intent, handler)
     
     def setup_window(self):
         """Setup the main T.E.T.R.I.S window with modern design"""
@@ -110,40 +143,121 @@ class TETRISInterface:
         style.configure('Modern.TLabel', background='#0a0a0a', foreground='#00ff41')
         style.configure('Modern.TButton', background='#1a1a1a', foreground='#00ff41')
         
+        # Flush pending writes before the window goes away
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Set window icon
         try:
             self.root.iconbitmap("tetris.ico")
         except:
             pass
     
+    def setup_executor(self):
+        """Worker pool for command handlers plus a pump for calls that must touch Tk"""
+        self.executor = CommandExecutor(max_workers=4)
+        self.main_thread = MainThreadDispatcher()
+        self.pending_commands = 0
+        # Holds the running command's deadline on each worker thread
+        self.command_context = threading.local()
+        self.default_command_timeout = 15
+        # Seconds each core intent may run before the user is told it timed out
+        self.handler_timeouts = {
+            'weather': 8,
+            'system_status': 5,
+            'web_search': 5,
+            'youtube': 5,
+            'open_app': 10,
+            'close_app': 10,
+        }
+        # Intents whose handlers open dialogs or change window state. The remember, forget,
+        # recall, analyze, predict, optimize and help handlers call methods this interface
+        # doesn't define yet, so they fail on the worker before reaching Tk; list them here
+        # once their implementations touch widgets or messagebox
+        self.tk_bound_intents = {'shutdown', 'restart', 'sleep', 'lock', 'privacy_mode', 'security_scan'}
+        self.root.after(30, self.pump_main_thread_calls)
+    
+    def pump_main_thread_calls(self):
+        """Run Tk work requested by command workers"""
+        self.main_thread.pump()
+        self.root.after(30, self.pump_main_thread_calls)
+    
+    def run_on_main_thread(self, fn, *args, **kwargs):
+        """Call fn on the Tk thread, waiting for its result when called from a worker
+
+        From a command worker the wait ends at the command's deadline, so a
+        dialog answered after the timeout message has no effect.
+        """
+        deadline = getattr(self.command_context, 'deadline', None)
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        return self.main_thread.call(fn, *args, timeout=timeout, **kwargs)
+    
+    def on_close(self):
+        """Flush background persistence and close the window"""
+        self.executor.shutdown()
+        if self.voice_pipeline is not None:
+            self.voice_pipeline.stop()
+        self.speech.close()
+        self.core.close()
+        self.root.destroy()
+    
+    def get_persistence_stats(self):
+        """Queue depth and commit latency of the write-behind worker"""
+        return self.core.persistence.stats()
+    
     def setup_ai_engine(self):
-        """Initialize advanced AI components"""
-        # Text-to-Speech with advanced settings
-        try:
-            self.engine = pyttsx3.init()
-            voices = self.engine.getProperty('voices')
-            
-            # Find the best voice (prefer female for Friday/EDITH style)
-            selected_voice = None
-            for voice in voices:
-                if any(name in voice.name.lower() for name in ['zira', 'hazel', 'female']):
-                    selected_voice = voice.id
-                    break
-            
-            if selected_voice:
-                self.engine.setProperty('voice', selected_voice)
-            
-            self.engine.setProperty('rate', 165)
-            self.engine.setProperty('volume', 0.9)
-            self.tts_available = True
-        except Exception as e:
-            print(f"TTS Error: {e}")
-            self.tts_available = False
+        """Initialize advanced AI components in the background"""
+        self.tts_available = False
+        self.sr_available = False
+        self.voice_start_pending = False
+        # Each subsystem is 'starting', 'ready' or 'offline'
+        self.subsystem_state = {'tts': 'starting', 'voice': 'starting'}
+        self.sr_ready = threading.Event()
+        self.voice_pipeline = None
+        
+        # Engines start concurrently so the window can appear immediately;
+        # the speech worker creates and owns the TTS engine on its own thread
+        self.speech = SpeechWorker(
+            self.init_tts_engine,
+            tracer=self.core.tracer,
+            on_ready=lambda available: self.main_thread.post(self.on_subsystem_ready, 'tts', available)
+        )
+        threading.Thread(target=self.init_speech_recognition, name="tetris-sr-init", daemon=True).start()
         
-        # Speech Recognition with advanced settings
+        # Initialize OpenAI (optional - for advanced AI responses)
+        self.openai_available = False
+        try:
+            # You can set your OpenAI API key here
+            # openai.api_key = "your-api-key-here"
+            # self.openai_available = True
+            pass
+        except:
+            pass
+    
+    def init_tts_engine(self):
+        """Text-to-Speech with advanced settings (runs on the speech worker thread)"""
+        engine = pyttsx3.init()
+        voices = engine.getProperty('voices')
+        
+        # Find the best voice (prefer female for Friday/EDITH style)
+        selected_voice = None
+        for voice in voices:
+            if any(name in voice.name.lower() for name in ['zira', 'hazel', 'female']):
+                selected_voice = voice.id
+                break
+        
+        if selected_voice:
+            engine.setProperty('voice', selected_voice)
+        
+        engine.setProperty('rate', 165)
+        engine.setProperty('volume', 0.9)
+        return engine
+    
+    def init_speech_recognition(self):
+        """Speech Recognition with advanced settings"""
         try:
             self.recognizer = sr.Recognizer()
             self.microphone = sr.Microphone()
+            tetris_voice.VoicePipeline  # Load the capture pipeline (and NumPy) off the Tk thread
             
             # Adjust recognition settings
             self.recognizer.energy_threshold = 300
@@ -156,15 +270,29 @@ class TETRISInterface:
             print(f"Speech Recognition Error: {e}")
             self.sr_available = False
         
-        # Initialize OpenAI (optional - for advanced AI responses)
-        self.openai_available = False
-        try:
-            # You can set your OpenAI API key here
-            # openai.api_key = "your-api-key-here"
-            # self.openai_available = True
-            pass
-        except:
-            pass
+        self.sr_ready.set()
+        self.main_thread.post(self.on_subsystem_ready, 'voice', self.sr_available)
+    
+    def on_subsystem_ready(self, name, available):
+        """Update readiness indicators and release work queued for the subsystem"""
+        self.subsystem_state[name] = 'ready' if available else 'offline'
+        self.update_subsystem_indicators()
+        
+        if name == 'tts':
+            self.tts_available = available
+        elif name == 'voice' and self.voice_start_pending:
+            self.voice_start_pending = False
+            self.start_voice_listening()
+    
+    def update_subsystem_indicators(self):
+        styles = {
+            'starting': ("◌", "#ffaa00"),
+            'ready': ("●", "#00ff41"),
+            'offline': ("✖", "#ff4444")
+        }
+        for name, label in self.subsystem_labels.items():
+            symbol, color = styles[self.subsystem_state[name]]
+            label.config(text=f"{symbol} {name.upper()} {self.subsystem_state[name].upper()}", fg=color)
     
     def setup_ui(self):
         """Create the modern T.E.T.R.I.S user interface"""
@@ -219,6 +347,14 @@ class TETRISInterface:
         )
         self.security_label.pack()
         
+        # Engine readiness indicators
+        self.subsystem_labels = {}
+        for name in ('tts', 'voice'):
+            label = tk.Label(status_frame, font=("Consolas", 8), bg="#000000")
+            label.pack()
+            self.subsystem_labels[name] = label
+        self.update_subsystem_indicators()
+        
         # Main content area with tabs
         self.notebook = ttk.Notebook(main_frame)
         self.notebook.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
@@ -269,7 +405,28 @@ class TETRISInterface:
             relief="solid"
         )
         self.chat_display.pack(fill=tk.BOTH, expand=True)
-        
+
+        # Message styling is configured once; each message carries its own type tag
+        self.chat_display.tag_config("tetris_header", foreground="#00ff41", font=("Consolas", 11, "bold"))
+        self.chat_display.tag_config("tetris_msg", foreground="#ffffff")
+        self.chat_display.tag_config("tetris_msg_warning", foreground="#ff8800")
+        self.chat_display.tag_config("tetris_msg_error", foreground="#ff4444")
+        self.chat_display.tag_config("tetris_msg_success", foreground="#44ff44")
+        self.chat_display.tag_config("user_header", foreground="#ffaa00", font=("Consolas", 11, "bold"))
+        self.chat_display.tag_config("user_msg", foreground="#cccccc")
+        self.chat_display.tag_config("history_notice", foreground="#666666", font=("Consolas", 9))
+
+        # Bounded transcript: one mark per visible message, older/newer history paged from the database
+        self.transcript_limit = max(20, int(self.core.user_preferences.get('transcript_limit', 200)))
+        self.transcript_page_size = max(10, self.transcript_limit // 4)
+        self.transcript_marks = deque()
+        self.transcript_serial = 0
+        self.hidden_newer = 0
+        self.history_exhausted = False
+        self.history_paging = False
+        self.history_request = 0
+        self.chat_display.config(yscrollcommand=self.on_chat_scroll)
+
         # Advanced input area
         input_container = tk.Frame(self.chat_frame, bg="#000000", height=100)
         input_container.pack(fill=tk.X, padx=10, pady=(0, 10))
@@ -288,6 +445,8 @@ class TETRISInterface:
         self.input_entry.pack(fill=tk.X, pady=(10, 5))
         self.input_entry.bind('<Return>', self.process_text_input)
         self.input_entry.bind('<KeyRelease>', self.on_key_release)
+        self.suggestion_after_id = None
+        self.suggestion_delay_ms = 120
         
         # Suggestion box
         self.suggestion_var = tk.StringVar()
@@ -382,16 +541,49 @@ class TETRISInterface:
             bg="#000000"
         ).pack(pady=(0, 10))
         
-        # Command treeview
+        # Filters run as indexed SQL queries rather than over widget rows
+        filter_frame = tk.Frame(list_frame, bg="#000000")
+        filter_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        tk.Label(filter_frame, text="Trigger starts with:", font=("Consolas", 9), fg="#cccccc", bg="#000000").pack(side=tk.LEFT)
+        self.command_filter_var = tk.StringVar()
+        filter_entry = tk.Entry(filter_frame, textvariable=self.command_filter_var, bg="#1a1a1a", fg="#ffffff",
+                                font=("Consolas", 10), insertbackground="#00ff41", width=30)
+        filter_entry.pack(side=tk.LEFT, padx=5)
+        filter_entry.bind('<KeyRelease>', self.on_command_filter_changed)
+        
+        tk.Label(filter_frame, text="Action:", font=("Consolas", 9), fg="#cccccc", bg="#000000").pack(side=tk.LEFT, padx=(10, 0))
+        self.command_action_var = tk.StringVar(value="all")
+        action_box = ttk.Combobox(filter_frame, textvariable=self.command_action_var, state="readonly", width=10,
+                                  values=("all", "response", "command", "web"))
+        action_box.pack(side=tk.LEFT, padx=5)
+        action_box.bind('<<ComboboxSelected>>', lambda event: self.refresh_command_list())
+        
+        self.command_count_var = tk.StringVar()
+        self.command_count = 0
+        tk.Label(filter_frame, textvariable=self.command_count_var, font=("Consolas", 9), fg="#666666", bg="#000000").pack(side=tk.RIGHT)
+        
+        # Command treeview, loaded a page at a time as it scrolls
         columns = ("Trigger", "Action", "Usage", "Last Used")
+        sort_keys = ("trigger", "action", "usage", "last_used")
         self.command_tree = ttk.Treeview(list_frame, columns=columns, show="headings", height=15)
         
-        for col in columns:
-            self.command_tree.heading(col, text=col)
+        for col, sort_key in zip(columns, sort_keys):
+            self.command_tree.heading(col, text=col, command=lambda sort_key=sort_key: self.sort_command_list(sort_key))
             self.command_tree.column(col, width=200)
         
+        command_scroll = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.command_tree.yview)
+        self.command_tree.configure(yscrollcommand=lambda first, last: self.on_command_tree_scroll(command_scroll, first, last))
+        command_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         self.command_tree.pack(fill=tk.BOTH, expand=True)
         
+        self.command_sort = 'usage'
+        self.command_sort_descending = True
+        self.command_page_size = 200
+        self.command_next_key = None
+        self.command_page_pending = False
+        self.command_filter_after_id = None
+        
         # Command management buttons
         cmd_button_frame = tk.Frame(self.command_frame, bg="#000000")
         cmd_button_frame.pack(fill=tk.X, padx=10, pady=10)
@@ -437,10 +629,26 @@ class TETRISInterface:
             font=("Consolas", 10),
             wrap=tk.WORD,
             state=tk.DISABLED,
-            height=20
+            height=14
         )
         self.stats_display.pack(fill=tk.BOTH, expand=True)
         
+        # Live pipeline latency table
+        tk.Label(
+            stats_frame,
+            text="Pipeline Latency (ms)",
+            font=("Consolas", 11, "bold"),
+            fg="#00ff41",
+            bg="#000000"
+        ).pack(anchor=tk.W, pady=(10, 5))
+        
+        columns = ("Span", "Count", "p50", "p95", "p99", "Max")
+        self.latency_tree = ttk.Treeview(stats_frame, columns=columns, show="headings", height=8)
+        for col in columns:
+            self.latency_tree.heading(col, text=col)
+            self.latency_tree.column(col, width=220 if col == "Span" else 90, anchor=tk.W if col == "Span" else tk.E)
+        self.latency_tree.pack(fill=tk.X)
+        
         # Monitor controls
         monitor_controls = tk.Frame(self.monitor_frame, bg="#000000")
         monitor_controls.pack(fill=tk.X, padx=10, pady=10)
@@ -451,7 +659,8 @@ class TETRISInterface:
             ("🌡️ Temperature", self.system_temperature),
             ("🔌 Processes", self.running_processes),
             ("💾 Storage", self.storage_analysis),
-            ("🌐 Network", self.network_status)
+            ("🌐 Network", self.network_status),
+            ("⏱️ Export Latency", self.export_latency_metrics)
         ]
         
         for text, command in monitor_buttons:
@@ -469,6 +678,7 @@ class TETRISInterface:
             btn.pack(side=tk.LEFT, padx=2)
         
         # Auto-refresh system stats
+        self.stats_after_id = None
         self.refresh_system_stats()
     
     def setup_learning_tab(self):
@@ -570,75 +780,211 @@ class TETRISInterface:
             )
             btn.pack(side=tk.LEFT, padx=2, pady=5)
     
-    def setup_custom_commands(self):
-        """Load custom commands from database"""
-        self.custom_commands = {}
-        try:
-            self.cursor.execute("SELECT trigger, response, action_type, parameters FROM custom_commands")
-            for row in self.cursor.fetchall():
-                trigger, response, action_type, parameters = row
-                self.custom_commands[trigger.lower()] = {
-                    'response': response,
-                    'action_type': action_type,
-                    'parameters': parameters
-                }
-        except Exception as e:
-            print(f"Error loading custom commands: {e}")
+    def schedule_retention(self):
+        """Run conversation retention shortly after startup and then periodically"""
+        self.retention_interval_ms = 6 * 60 * 60 * 1000
+        self.root.after(60 * 1000, self.run_retention)
+    
+    def run_retention(self):
+        """Archive old conversation turns in the background and reschedule"""
+        def retention_thread():
+            try:
+                summary = self.core.retention.run()
+                if summary['archived']:
+                    print(f"Retention archived {summary['archived']} turns, {summary['remaining']} remain")
+            except Exception as e:
+                print(f"Retention error: {e}")
+        
+        threading.Thread(target=retention_thread, daemon=True).start()
+        self.root.after(self.retention_interval_ms, self.run_retention)
+    
+    def process_command(self, command):
+        return self.core.process_command(command)
+    
+    def register_custom_command(self, trigger, response, action_type, parameters, old_trigger=None):
+        self.core.register_custom_command(trigger, response, action_type, parameters, old_trigger)
+    
+    def unregister_custom_command(self, trigger):
+        self.core.unregister_custom_command(trigger)
+    
+    def sync_trigger_index(self):
+        self.core.sync_trigger_index()
+    
+    def store_conversation(self, user_input, tetris_response):
+        self.core.store_conversation(user_input, tetris_response)
+    
+    def save_user_preference(self, key, value):
+        self.core.save_user_preference(key, value)
     
     def add_message(self, sender, message, message_type="normal"):
         """Add message to chat display with advanced formatting"""
-        self.chat_display.config(state=tk.NORMAL)
+        # Store in conversation memory
+        self.store_conversation(message if sender == "USER" else "", message if sender == "T.E.T.R.I.S" else "")
+        
+        if self.hidden_newer:
+            # The user paged far back; jump to the live end before appending
+            self.reload_latest_messages()
+            return
+        
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+        self.chat_display.config(state=tk.NORMAL)
+        self.render_message(tk.END, sender, message, message_type, timestamp)
+        self.trim_transcript(from_top=True)
+        self.chat_display.config(state=tk.DISABLED)
+        self.chat_display.see(tk.END)
+    
+    def render_message(self, index, sender, message, message_type, timestamp):
+        """Insert one message at the start or end of the transcript and mark where it begins"""
+        self.transcript_serial += 1
+        mark = f"msg{self.transcript_serial}"
         
         if sender == "T.E.T.R.I.S":
-            self.chat_display.insert(tk.END, f"[{timestamp}] ◆ T.E.T.R.I.S: ", "tetris_header")
-            self.chat_display.insert(tk.END, f"{message}\n\n", "tetris_msg")
+            header = (f"[{timestamp}] ◆ T.E.T.R.I.S: ", "tetris_header")
+            body_tag = "tetris_msg" if message_type == "normal" else f"tetris_msg_{message_type}"
         else:
-            self.chat_display.insert(tk.END, f"[{timestamp}] USER: ", "user_header")
-            self.chat_display.insert(tk.END, f"{message}\n\n", "user_msg")
-        
-        # Configure advanced styling
-        self.chat_display.tag_config("tetris_header", foreground="#00ff41", font=("Consolas", 11, "bold"))
-        self.chat_display.tag_config("tetris_msg", foreground="#ffffff")
-        self.chat_display.tag_config("user_header", foreground="#ffaa00", font=("Consolas", 11, "bold"))
-        self.chat_display.tag_config("user_msg", foreground="#cccccc")
-        
-        # Special formatting for different message types
-        if message_type == "warning":
-            self.chat_display.tag_config("tetris_msg", foreground="#ff8800")
-        elif message_type == "error":
-            self.chat_display.tag_config("tetris_msg", foreground="#ff4444")
-        elif message_type == "success":
-            self.chat_display.tag_config("tetris_msg", foreground="#44ff44")
-        
+            header = (f"[{timestamp}] USER: ", "user_header")
+            body_tag = "user_msg"
+        
+        if index == tk.END:
+            self.chat_display.mark_set(mark, "end-1c")
+            self.chat_display.mark_gravity(mark, tk.LEFT)
+            self.chat_display.insert(tk.END, header[0], header[1], f"{message}\n\n", body_tag)
+            self.transcript_marks.append(mark)
+        else:
+            # Keep the current first message's mark after the inserted text
+            if self.transcript_marks:
+                self.chat_display.mark_gravity(self.transcript_marks[0], tk.RIGHT)
+            self.chat_display.insert("1.0", header[0], header[1], f"{message}\n\n", body_tag)
+            if self.transcript_marks:
+                self.chat_display.mark_gravity(self.transcript_marks[0], tk.LEFT)
+            self.chat_display.mark_set(mark, "1.0")
+            self.chat_display.mark_gravity(mark, tk.LEFT)
+            self.transcript_marks.appendleft(mark)
+    
+    def trim_transcript(self, from_top):
+        """Evict messages beyond transcript_limit from the top or bottom of the widget"""
+        while len(self.transcript_marks) > self.transcript_limit:
+            if from_top:
+                mark = self.transcript_marks.popleft()
+                self.chat_display.delete("1.0", self.transcript_marks[0])
+                self.history_exhausted = False
+            else:
+                mark = self.transcript_marks.pop()
+                self.chat_display.delete(mark, tk.END)
+                self.hidden_newer += 1
+            self.chat_display.mark_unset(mark)
+    
+    def render_history_rows(self, rows, index):
+        """Render conversation_memory rows (oldest first) at the top or bottom"""
+        if index != tk.END:
+            rows = reversed(rows)
+        for user_input, tetris_response, stored_at in rows:
+            try:
+                timestamp = datetime.datetime.strptime(stored_at, "%Y-%m-%d %H:%M:%S").replace(
+                    tzinfo=datetime.timezone.utc).astimezone().strftime("%Y-%m-%d %H:%M:%S")
+            except (TypeError, ValueError):
+                timestamp = stored_at or ""
+            if user_input:
+                self.render_message(index, "USER", user_input, "normal", timestamp)
+            else:
+                self.render_message(index, "T.E.T.R.I.S", tetris_response, "normal", timestamp)
+    
+    def on_chat_scroll(self, first, last):
+        """Scrollbar callback that pages history in at either end of the transcript"""
+        self.chat_display.vbar.set(first, last)
+        if self.history_paging:
+            return
+        first, last = float(first), float(last)
+        if first <= 0.0 and last >= 1.0:
+            return  # Everything fits; nothing to page
+        if first <= 0.0 and not self.history_exhausted and self.transcript_marks:
+            self.history_paging = True
+            self.root.after_idle(self.page_older_messages)
+        elif last >= 1.0 and self.hidden_newer:
+            self.history_paging = True
+            self.root.after_idle(self.page_newer_messages)
+    
+    def request_history_page(self, offset, limit, show):
+        """Load stored history on a worker and pass the rows to show on the Tk thread
+
+        load_conversation_page waits for queued conversation writes, so it
+        never runs on the Tk thread. A newer request makes pending ones obsolete.
+        """
+        self.history_paging = True
+        self.history_request += 1
+        request = self.history_request
+        try:
+            future = self.executor.submit(self.core.load_conversation_page, offset, limit)
+        except RuntimeError:
+            self.history_paging = False  # Workers are busy; the next scroll asks again
+            return
+        future.add_done_callback(lambda done: self.main_thread.post(self.show_history_page, request, done, show))
+    
+    def show_history_page(self, request, future, show):
+        if request != self.history_request:
+            return
+        try:
+            show(future.result())
+        except Exception as e:
+            print(f"History paging error: {e}")
+        finally:
+            self.history_paging = False
+    
+    def page_older_messages(self):
+        """Load the page of history just above the oldest visible message"""
+        offset = self.hidden_newer + len(self.transcript_marks)
+        self.request_history_page(offset, self.transcript_page_size, self.show_older_messages)
+    
+    def show_older_messages(self, rows):
+        if not rows:
+            self.history_exhausted = True
+            return
+        anchor = self.transcript_marks[0]
+        self.chat_display.config(state=tk.NORMAL)
+        self.render_history_rows(rows, "1.0")
+        self.trim_transcript(from_top=False)
+        self.chat_display.config(state=tk.DISABLED)
+        self.chat_display.yview(anchor)
+    
+    def page_newer_messages(self):
+        """Bring back messages evicted from the bottom while the user read older history"""
+        count = min(self.transcript_page_size, self.hidden_newer)
+        self.request_history_page(self.hidden_newer - count, count,
+                                  lambda rows: self.show_newer_messages(rows, count))
+    
+    def show_newer_messages(self, rows, count):
+        self.hidden_newer -= count
+        anchor = self.transcript_marks[-1] if self.transcript_marks else tk.END
+        self.chat_display.config(state=tk.NORMAL)
+        self.render_history_rows(rows, tk.END)
+        self.trim_transcript(from_top=True)
+        self.chat_display.config(state=tk.DISABLED)
+        self.chat_display.see(anchor)
+    
+    def reload_latest_messages(self):
+        """Rebuild the transcript from the newest stored messages"""
+        self.request_history_page(0, self.transcript_limit, self.show_latest_messages)
+    
+    def show_latest_messages(self, rows):
+        self.chat_display.config(state=tk.NORMAL)
+        self.chat_display.delete("1.0", tk.END)
+        for mark in self.transcript_marks:
+            self.chat_display.mark_unset(mark)
+        self.transcript_marks.clear()
+        self.hidden_newer = 0
+        self.history_exhausted = False
+        self.render_history_rows(rows, tk.END)
         self.chat_display.config(state=tk.DISABLED)
         self.chat_display.see(tk.END)
-        
-        # Store in conversation memory
-        self.store_conversation(message if sender == "USER" else "", message if sender == "T.E.T.R.I.S" else "")
     
     def speak(self, text, priority="normal"):
         """Advanced text-to-speech with priority system"""
-        if self.tts_available:
-            def speak_thread():
-                try:
-                    # Adjust speech parameters based on priority
-                    if priority == "urgent":
-                        self.engine.setProperty('rate', 180)
-                        self.engine.setProperty('volume', 1.0)
-                    elif priority == "whisper":
-                        self.engine.setProperty('rate', 150)
-                        self.engine.setProperty('volume', 0.6)
-                    else:
-                        self.engine.setProperty('rate', 165)
-                        self.engine.setProperty('volume', 0.9)
-                    
-                    self.engine.say(text)
-                    self.engine.runAndWait()
-                except Exception as e:
-                    print(f"Speech error: {e}")
-            
-            threading.Thread(target=speak_thread, daemon=True).start()
+        # Queued until the engine is up; urgent text interrupts lower priorities
+        self.speech.say(text, priority)
+    
+    def get_speech_stats(self):
+        """Speech queue length, drops and time-to-first-audio"""
+        return self.speech.stats()
     
     def toggle_voice_listening(self):
         """Advanced voice listening with continuous mode"""
@@ -649,6 +995,11 @@ class TETRISInterface:
     
     def start_voice_listening(self):
         """Start advanced voice recognition"""
+        if not self.sr_ready.is_set():
+            self.voice_start_pending = True
+            self.add_message("T.E.T.R.I.S", "Voice recognition is still starting up. I'll begin listening as soon as it's ready.", "warning")
+            return
+        
         if not self.sr_available:
             self.add_message("T.E.T.R.I.S", "Voice recognition systems offline. Please check microphone connection.", "error")
             return
@@ -657,749 +1008,189 @@ class TETRISInterface:
         self.voice_button.config(text="🛑 STOP LISTENING", bg="#ff4444")
         self.status_label.config(text="● LISTENING", fg="#ffaa00")
         
-        def continuous_listen():
-            while self.is_listening:
-                try:
-                    with self.microphone as source:
-                        # Adjust for ambient noise
-                        self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                        
-                        # Listen for audio
-                        audio = self.recognizer.listen(source, timeout=1, phrase_time_limit=8)
-                    
-                    # Recognize speech
-                    command = self.recognizer.recognize_google(audio)
-                    
-                    # Process command on main thread
-                    self.root.after(0, lambda: self.process_voice_command(command))
-                    
-                    # Brief pause before next listen
-                    time.sleep(0.5)
-                    
-                except sr.WaitTimeoutError:
-                    continue
-                except sr.UnknownValueError:
-                    continue
-                except Exception as e:
-                    self.root.after(0, lambda: self.add_message("T.E.T.R.I.S", f"Voice recognition error: {str(e)}", "error"))
-                    break
-        
-        threading.Thread(target=continuous_listen, daemon=True).start()
+        # Capture streams continuously; recognition runs on its own thread
+        self.voice_pipeline = tetris_voice.VoicePipeline(
+            tetris_voice.MicrophoneSource(self.microphone),
+            tetris_voice.SpeechRecognitionBackend(self.recognizer),
+            on_transcript=lambda command, info: self.main_thread.post(self.process_voice_command, command),
+            on_error=lambda e: self.main_thread.post(
+                self.add_message, "T.E.T.R.I.S", f"Voice recognition error: {str(e)}", "error"
+            ),
+            calibration_seconds=0.5,
+            min_threshold=self.recognizer.energy_threshold,
+            pause_ms=int(self.recognizer.pause_threshold * 1000),
+            min_phrase_ms=int(self.recognizer.phrase_threshold * 1000),
+            max_phrase_ms=8000,
+        ).start()
     
     def stop_voice_listening(self):
         """Stop voice listening"""
         self.is_listening = False
+        if self.voice_pipeline is not None:
+            self.voice_pipeline.stop()
+            self.voice_pipeline = None
         self.voice_button.config(text="🎤 VOICE COMMAND", bg="#00ff41")
         self.status_label.config(text="● ACTIVE", fg="#00ff41")
     
     def process_voice_command(self, command):
         """Process voice command with learning capability"""
-        self.add_message("USER", command)
-        response = self.process_command(command)
-        self.add_message("T.E.T.R.I.S", response)
-        self.speak(response)
+        self.dispatch_command(command)
     
     def process_text_input(self, event=None):
         """Process text input with advanced parsing"""
         command = self.input_entry.get().strip()
         if command:
-            self.add_message("USER", command)
-            response = self.process_command(command)
-            self.add_message("T.E.T.R.I.S", response)
-            self.speak(response)
             self.input_entry.delete(0, tk.END)
             self.suggestion_var.set("")
+            self.dispatch_command(command)
     
-    def process_command(self, command):
-        """Advanced command processing with AI learning"""
-        original_command = command
-        command = command.lower().strip()
-        
-        # Check for wake words
-        if any(wake in command for wake in ['tetris', 'friday', 'edith', 'ai']):
-            command = self.remove_wake_words(command)
-        
-        # Check custom commands first
-        custom_response = self.check_custom_commands(command)
-        if custom_response:
-            return custom_response
-        
-        # AI-powered response generation
-        if self.learning_mode:
-            learned_response = self.generate_learned_response(command)
-            if learned_response:
-                return learned_response
-        
-        # Core command processing
-        response = self.process_core_commands(command, original_command)
-        
-        # Learn from this interaction
-        if self.learning_mode:
-            self.learn_from_interaction(command, response)
-        
-        return response
-    
-    def process_core_commands(self, command, original_command):
-        """Process core system commands"""
-        
-        # Advanced greetings with personality
-        if any(word in command for word in ['hello', 'hi', 'hey', 'good morning', 'good evening']):
-            greetings = [
-                "Good to see you again. T.E.T.R.I.S systems are fully operational.",
-                "Hello. All systems green and ready for your commands.",
-                "Greetings. I've been monitoring system status while you were away.",
-                "Welcome back. How may I assist you today?"
-            ]
-            return random.choice(greetings)
-        
-        # Personality queries
-        elif any(phrase in command for phrase in ['who are you', 'what are you', 'introduce yourself']):
-            return ("I am T.E.T.R.I.S - Tactically Enhanced Technology Response Intelligence System. "
-                   "I'm an advanced AI assistant designed to learn, adapt, and assist with complex tasks. "
-                   "Think of me as your personal Friday or EDITH system.")
-        
-        # Time and date with advanced formatting
-        elif 'time' in command:
-            now = datetime.datetime.now()
-            return f"Current time: {now.strftime('%I:%M %p')} on {now.strftime('%A, %B %d, %Y')}"
-        
-        elif 'date' in command:
-            return f"Today is {datetime.datetime.now().strftime('%A, %B %d, %Y')}"
-        
-        # Advanced system controls
-        elif any(phrase in command for phrase in ['shutdown', 'turn off', 'power down']):
-            return self.advanced_shutdown(command)
-        
-        elif any(phrase in command for phrase in ['restart', 'reboot', 'reset']):
-            return self.advanced_restart(command)
-        
-        elif 'sleep' in command or 'hibernate' in command:
-            return self.advanced_sleep(command)
-        
-        elif 'lock' in command:
-            return self.advanced_lock()
-        
-        # Application management
-        elif 'open' in command or 'launch' in command:
-            app = self.extract_app_name(command, ['open', 'launch'])
-            return self.advanced_open_application(app)
-        
-        elif 'close' in command or 'terminate' in command:
-            app = self.extract_app_name(command, ['close', 'terminate'])
-            return self.advanced_close_application(app)
-        
-        # Web and search with AI enhancement
-        elif any(phrase in command for phrase in ['search', 'google', 'find', 'look up']):
-            query = self.extract_search_query(command)
-            return self.advanced_web_search(query)
-        
-        elif 'youtube' in command:
-            query = self.extract_search_query(command, 'youtube')
-            return self.advanced_youtube_search(query)
-        
-        # Study and learning assistance
-        elif any(phrase in command for phrase in ['study', 'homework', 'learn', 'explain', 'teach me']):
-            return self.advanced_study_assistant(command)
-        
-        elif any(phrase in command for phrase in ['calculate', 'math', 'compute', 'solve']):
-            return self.advanced_calculator(command)
-        
-        elif any(phrase in command for phrase in ['define', 'meaning', 'what is', 'explain']):
-            return self.advanced_dictionary(command)
-        
-        # File operations with AI
-        elif any(phrase in command for phrase in ['file', 'folder', 'directory', 'create', 'delete', 'move', 'copy']):
-            return self.advanced_file_operations(command)
-        
-        # System information
-        elif any(phrase in command for phrase in ['system status', 'performance', 'resources', 'stats']):
-            return self.get_advanced_system_status()
-        
-        elif 'weather' in command:
-            location = self.extract_location(command)
-            return self.get_advanced_weather(location)
-        
-        # Entertainment
-        elif 'joke' in command:
-            return self.tell_advanced_joke()
-        
-        elif 'music' in command or 'song' in command:
-            return self.advanced_music_control(command)
-        
-        # AI and learning commands
-        elif any(phrase in command for phrase in ['remember', 'save', 'note', 'remind me']):
-            return self.create_memory(command)
-        
-        elif any(phrase in command for phrase in ['forget', 'delete memory', 'clear']):
-            return self.delete_memory(command)
-        
-        elif 'what do you remember' in command or 'recall' in command:
-            return self.recall_memory(command)
-        
-        # Security and privacy
-        elif any(phrase in command for phrase in ['security scan', 'check security', 'scan system']):
-            return self.security_scan()
-        
-        elif 'privacy mode' in command:
-            return self.toggle_privacy_mode()
-        
-        # Advanced features
-        elif 'analyze' in command:
-            return self.perform_analysis(command)
-        
-        elif 'predict' in command or 'forecast' in command:
-            return self.make_prediction(command)
-        
-        elif 'optimize' in command:
-            return self.optimize_system(command)
-        
-        # Help system
-        elif 'help' in command or 'commands' in command:
-            return self.show_advanced_help()
-        
-        # Fallback with AI learning
-        else:
-            return self.generate_intelligent_response(command)
-    
-    def extract_app_name(self, command, remove_words):
-        """Extract application name from command"""
-        for word in remove_words:
-            command = command.replace(word, '')
-        return command.strip()
-    
-    def extract_search_query(self, command, platform=None):
-        """Extract search query from command"""
-        remove_words = ['search', 'google', 'find', 'look up', 'for', platform] if platform else ['search', 'google', 'find', 'look up', 'for']
-        query = command
-        for word in remove_words:
-            if word:
-                query = query.replace(word, '')
-        return query.strip()
-    
-    def extract_location(self, command):
-        """Extract location from weather command"""
-        location = command.replace('weather', '').replace('in', '').replace('for', '').strip()
-        return location if location else "current location"
-    
-    def advanced_open_application(self, app_name):
-        """Advanced application launcher with learning"""
-        # Enhanced application dictionary
-        apps = {
-            'notepad': 'notepad.exe',
-            'calculator': 'calc.exe',
-            'paint': 'mspaint.exe',
-            'chrome': 'chrome.exe',
-            'firefox': 'firefox.exe',
-            'edge': 'msedge.exe',
-            'explorer': 'explorer.exe',
-            'file explorer': 'explorer.exe',
-            'cmd': 'cmd.exe',
-            'command prompt': 'cmd.exe',
-            'powershell': 'powershell.exe',
-            'task manager': 'taskmgr.exe',
-            'control panel': 'control.exe',
-            'settings': 'ms-settings:',
-            'word': 'winword.exe',
-            'excel': 'excel.exe',
-            'powerpoint': 'powerpnt.exe',
-            'outlook': 'outlook.exe',
-            'teams': 'teams.exe',
-            'discord': 'discord.exe',
-            'spotify': 'spotify.exe',
-            'steam': 'steam.exe',
-            'vscode': 'code.exe',
-            'visual studio code': 'code.exe',
-            'photoshop': 'photoshop.exe',
-            'premiere': 'premiere.exe',
-            'after effects': 'afterfx.exe'
-        }
-        
-        app_lower = app_name.lower()
+    def dispatch_command(self, command):
+        """Run a command on the worker pool and post its response back on the Tk thread"""
+        self.add_message("USER", command)
         
-        if app_lower in apps:
-            try:
-                subprocess.Popen(apps[app_lower], shell=True)
-                return f"Launching {app_name}. Application should be starting now."
-            except Exception as e:
-                return f"Failed to launch {app_name}. Error: {str(e)}"
-        else:
-            # Try to find similar applications
-            similar_apps = [app for app in apps.keys() if app_lower in app or app in app_lower]
-            if similar_apps:
-                return f"Did you mean: {', '.join(similar_apps)}? Please specify which application you'd like to open."
-            
-            # Try to launch directly
-            try:
-                subprocess.Popen(app_name, shell=True)
-                return f"Attempting to launch {app_name}. If this fails, please check the application name."
-            except:
-                return f"Application '{app_name}' not found. Try saying 'help' for available applications."
-    
-    def advanced_close_application(self, app_name):
-        """Advanced application termination"""
+        deadline = time.monotonic() + self.get_command_timeout(command)
         try:
-            # Common process names
-            process_map = {
-                'chrome': 'chrome.exe',
-                'firefox': 'firefox.exe',
-                'notepad': 'notepad.exe',
-                'calculator': 'calc.exe',
-                'explorer': 'explorer.exe'
-            }
-            
-            process_name = process_map.get(app_name.lower(), f"{app_name}.exe")
-            
-            # Terminate process
-            subprocess.run(['taskkill', '/f', '/im', process_name], 
-                         capture_output=True, text=True, check=True)
-            return f"Successfully terminated {app_name}."
-        except subprocess.CalledProcessError:
-            return f"Could not terminate {app_name}. Process may not be running."
-        except Exception as e:
-            return f"Error terminating {app_name}: {str(e)}"
-    
-    def advanced_web_search(self, query):
-        """Advanced web search with multiple engines"""
-        if not query:
-            return "What would you like me to search for?"
-        
-        search_engines = {
-            'google': f"https://www.google.com/search?q={query.replace(' ', '+')}",
-            'bing': f"https://www.bing.com/search?q={query.replace(' ', '+')}",
-            'duckduckgo': f"https://duckduckgo.com/?q={query.replace(' ', '+')}"
-        }
-        
-        # Default to Google
-        webbrowser.open(search_engines['google'])
-        return f"Searching for '{query}' on Google. Results should appear in your browser."
-    
-    def advanced_youtube_search(self, query):
-        """Advanced YouTube search"""
-        if not query:
-            return "What would you like me to search for on YouTube?"
-        
-        url = f"https://www.youtube.com/results?search_query={query.replace(' ', '+')}"
-        webbrowser.open(url)
-        return f"Searching YouTube for '{query}'. Results should appear in your browser."
-    
-    def advanced_study_assistant(self, command):
-        """Advanced study assistance with subject detection"""
-        subjects = {
-            'math': "I can help with mathematics. Try asking me to calculate equations, explain formulas, or solve problems.",
-            'science': "I can assist with science topics including physics, chemistry, and biology. What specific area interests you?",
-            'history': "I can help with historical facts, dates, and events. What time period or topic are you studying?",
-            'english': "I can help with grammar, writing, literature analysis, and vocabulary. What do you need help with?",
-            'computer': "I can help with programming, computer science concepts, and technology. What programming language or topic?",
-            'physics': "I can help with physics concepts, formulas, and problem-solving. What physics topic are you working on?",
-            'chemistry': "I can assist with chemical equations, periodic table, and reactions. What chemistry topic do you need help with?",
-            'biology': "I can help with biological processes, anatomy, and life sciences. What biology topic interests you?"
-        }
-        
-        for subject, response in subjects.items():
-            if subject in command.lower():
-                return response
+            future = self.executor.submit(self.run_command_until, command, deadline)
+        except RuntimeError:
+            self.add_message("T.E.T.R.I.S", "I'm still working on earlier requests. Please try again in a moment.", "warning")
+            return
         
-        return ("Study mode activated. I can help with various subjects including mathematics, science, history, English, and computer science. "
-                "What subject would you like to focus on?")
+        self.pending_commands += 1
+        self.update_thinking_indicator()
+        self.root.after(30, lambda: self.poll_command(future, deadline))
     
-    def advanced_calculator(self, command):
-        """Advanced calculator with complex operations"""
-        # Extract mathematical expression
-        expression = command
-        for word in ['calculate', 'compute', 'solve', 'what is', 'math']:
-            expression = expression.replace(word, '')
-        expression = expression.strip()
-        
-        if not expression:
-            return "Please provide a mathematical expression to calculate."
-        
+    def run_command_until(self, command, deadline):
+        """Worker entry point; Tk calls made by the handler give up at the same deadline"""
+        self.command_context.deadline = deadline
         try:
-            # Enhanced expression processing
-            expression = expression.replace('x', '*')
-            expression = expression.replace('÷', '/')
-            expression = expression.replace('^', '**')
-            
-            # Handle advanced functions
-            replacements = {
-                'sin': 'math.sin',
-                'cos': 'math.cos',
-                'tan': 'math.tan',
-                'sqrt': 'math.sqrt',
-                'log': 'math.log',
-                'ln': 'math.log',
-                'exp': 'math.exp',
-                'pi': 'math.pi',
-                'e': 'math.e',
-                'factorial': 'math.factorial'
-            }
-            
-            for old, new in replacements.items():
-                expression = expression.replace(old, new)
-            
-            # Safe evaluation
-            allowed_names = {
-                k: v for k, v in math.__dict__.items() if not k.startswith("__")
-            }
-            allowed_names.update({"abs": abs, "round": round, "min": min, "max": max})
-            
-            result = eval(expression, {"__builtins__": {}}, allowed_names)
-            
-            # Format result appropriately
-            if isinstance(result, float):
-                if result.is_integer():
-                    result = int(result)
-                else:
-                    result = round(result, 6)
-            
-            return f"The result of '{expression}' is: {result}"
-            
-        except Exception as e:
-            return f"I couldn't calculate that expression. Please check the syntax. Error: {str(e)}"
+            return self.process_command(command)
+        finally:
+            self.command_context.deadline = None
     
-    def advanced_dictionary(self, command):
-        """Advanced dictionary with AI-powered definitions"""
-        word = command
-        for phrase in ['define', 'meaning', 'what is', 'explain']:
-            word = word.replace(phrase, '')
-        word = word.strip()
-        
-        if not word:
-            return "What word would you like me to define?"
-        
-        # Try to get definition from online API (you can integrate with dictionary APIs)
-        try:
-            # Placeholder for dictionary API integration
-            return f"Looking up definition for '{word}'. For detailed definitions, I recommend checking online dictionaries or saying 'search define {word}'."
-        except:
-            return f"I'll search for the definition of '{word}' online."
-    
-    def advanced_file_operations(self, command):
-        """Advanced file operations with AI assistance"""
-        if 'create' in command and 'folder' in command:
-            return self.create_folder_dialog()
-        elif 'delete' in command:
-            return "What file or folder would you like to delete? Please be specific for safety."
-        elif 'copy' in command:
-            return "What file would you like to copy and where?"
-        elif 'move' in command:
-            return "What file would you like to move and where?"
-        elif 'find' in command or 'search' in command:
-            return "What file are you looking for? I can help you search."
+    def poll_command(self, future, deadline):
+        """Deliver a finished command's response, or report a timeout"""
+        if not future.done():
+            if time.monotonic() < deadline:
+                self.root.after(30, lambda: self.poll_command(future, deadline))
+                return
+            # Only a command still queued can be cancelled; a running handler can't be interrupted
+            if future.cancel():
+                response = "That request waited too long to start, so I've cancelled it."
+            else:
+                future.add_done_callback(lambda done: self.main_thread.post(self.report_late_command, done))
+                response = ("That request is taking too long, so I've stopped waiting for it. "
+                            "It may still finish in the background; I'll tell you if it does.")
+            message_type = "warning"
         else:
-            return "I can help with file operations like create, delete, copy, move, or find files. What would you like to do?"
-    
-    def create_folder_dialog(self):
-        """Create folder with dialog"""
-        folder_name = simpledialog.askstring("Create Folder", "Enter folder name:")
-        if folder_name:
             try:
-                desktop = os.path.join(os.path.expanduser('~'), 'Desktop')
-                folder_path = os.path.join(desktop, folder_name)
-                os.makedirs(folder_path, exist_ok=True)
-                return f"Created folder '{folder_name}' on desktop."
+                response = future.result()
+                message_type = "normal"
             except Exception as e:
-                return f"Failed to create folder: {str(e)}"
-        return "Folder creation cancelled."
-    
-    def get_advanced_system_status(self):
-        """Get comprehensive system status"""
-        try:
-            # CPU Information
-            cpu_percent = psutil.cpu_percent(interval=1)
-            cpu_freq = psutil.cpu_freq()
-            cpu_count = psutil.cpu_count()
-            
-            # Memory Information
-            memory = psutil.virtual_memory()
-            swap = psutil.swap_memory()
-            
-            # Disk Information
-            disk = psutil.disk_usage('/')
-            
-            # Network Information
-            network = psutil.net_io_counters()
-            
-            # System Information
-            boot_time = datetime.datetime.fromtimestamp(psutil.boot_time())
-            uptime = datetime.datetime.now() - boot_time
-            
-            status = f"""T.E.T.R.I.S System Status Report:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-🖥️  SYSTEM OVERVIEW:
-   Platform: {platform.system()} {platform.release()}
-   Architecture: {platform.architecture()[0]}
-   Processor: {platform.processor()}
-   Boot Time: {boot_time.strftime('%Y-%m-%d %H:%M:%S')}
-   Uptime: {str(uptime).split('.')[0]}
-
-⚡ CPU STATUS:
-   Usage: {cpu_percent}%
-   Cores: {cpu_count} ({psutil.cpu_count(logical=False)} physical)
-   Frequency: {cpu_freq.current:.2f} MHz
-   Max Frequency: {cpu_freq.max:.2f} MHz
-
-💾 MEMORY STATUS:
-   Total RAM: {memory.total // (1024**3)} GB
-   Available: {memory.available // (1024**3)} GB
-   Used: {memory.used // (1024**3)} GB
-   Usage: {memory.percent}%
-   
-   Swap Total: {swap.total // (1024**3)} GB
-   Swap Used: {swap.used // (1024**3)} GB
-
-💿 STORAGE STATUS:
-   Total Space: {disk.total // (1024**3)} GB
-   Free Space: {disk.free // (1024**3)} GB
-   Used Space: {disk.used // (1024**3)} GB
-   Usage: {disk.percent}%
-
-🌐 NETWORK STATUS:
-   Bytes Sent: {network.bytes_sent // (1024**2)} MB
-   Bytes Received: {network.bytes_recv // (1024**2)} MB
-   Packets Sent: {network.packets_sent}
-   Packets Received: {network.packets_recv}
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-System Status: {'🟢 OPTIMAL' if cpu_percent < 80 and memory.percent < 80 else '🟡 MONITORING' if cpu_percent < 90 and memory.percent < 90 else '🔴 CRITICAL'}"""
-            
-            return status
-            
-        except Exception as e:
-            return f"Error retrieving system status: {str(e)}"
+                response = f"I ran into an error processing that command: {str(e)}"
+                message_type = "error"
+        
+        self.pending_commands -= 1
+        self.update_thinking_indicator()
+        self.add_message("T.E.T.R.I.S", response, message_type)
+        self.speak(response)
     
-    def get_advanced_weather(self, location):
-        """Get advanced weather information"""
+    def report_late_command(self, future):
+        """Show the outcome of a command that finished after its timeout was reported"""
         try:
-            # Using a free weather API
-            if location == "current location":
-                url = "http://wttr.in/?format=3"
-            else:
-                url = f"http://wttr.in/{location}?format=3"
-            
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                return f"Weather for {location}: {response.text.strip()}"
-            else:
-                return f"Unable to retrieve weather for {location}."
+            response = future.result()
+        except FutureTimeoutError:
+            self.add_message("T.E.T.R.I.S", "A request that timed out earlier was abandoned before it finished.", "warning")
+            return
         except Exception as e:
-            return f"Weather service unavailable: {str(e)}"
-    
-    def tell_advanced_joke(self):
-        """Tell advanced jokes with categories"""
-        joke_categories = {
-            'tech': [
-                "Why do programmers prefer dark mode? Because light attracts bugs!",
-                "How many programmers does it take to change a light bulb? None, that's a hardware problem!",
-                "Why did the AI break up with the database? It couldn't handle the relationship!",
-                "What's a computer's favorite snack? Microchips!"
-            ],
-            'science': [
-                "Why don't scientists trust atoms? Because they make up everything!",
-                "What do you call a sleeping bull at the particle accelerator? A bulldozer!",
-                "Why did the photon refuse to check a bag? Because it was traveling light!",
-                "What's the best thing about Switzerland? I don't know, but the flag is a big plus!"
-            ],
-            'ai': [
-                "Why did the neural network go to therapy? It had too many layers of issues!",
-                "What did the machine learning algorithm say to the data? You complete me!",
-                "Why don't AIs ever get lost? They always know their way around the neural pathways!",
-                "What's an AI's favorite type of music? Deep learning beats!"
-            ]
-        }
-        
-        category = random.choice(list(joke_categories.keys()))
-        joke = random.choice(joke_categories[category])
-        return f"Here's a {category} joke for you: {joke}"
+            self.add_message("T.E.T.R.I.S", f"A request that timed out earlier failed: {str(e)}", "error")
+            return
+        self.add_message("T.E.T.R.I.S", f"A request that timed out earlier has finished: {response}")
     
-    def advanced_music_control(self, command):
-        """Advanced music control system"""
-        if 'play' in command:
-            # Extract song/artist if mentioned
-            music_query = command.replace('play', '').replace('music', '').strip()
-            
-            # Try to open music applications
-            music_apps = ['spotify.exe', 'winamp.exe', 'vlc.exe', 'wmplayer.exe', 'itunes.exe']
-            
-            for app in music_apps:
-                try:
-                    subprocess.Popen(app, shell=True)
-                    if music_query:
-                        return f"Opening music player and searching for '{music_query}'."
-                    else:
-                        return "Opening music player."
-                except:
-                    continue
-            
-            # If no music app found, open music folder
-            music_folder = os.path.join(os.path.expanduser('~'), 'Music')
-            if os.path.exists(music_folder):
-                os.startfile(music_folder)
-                return "Opening music folder."
-            
-            return "No music player found. You can install Spotify, VLC, or other music applications."
-        
-        elif 'stop' in command or 'pause' in command:
-            return "You can control playback using your music player's controls or media keys."
-        
+    def update_thinking_indicator(self):
+        """Show a thinking status while commands are in flight"""
+        if self.pending_commands > 0:
+            self.status_label.config(text="● THINKING", fg="#00aaff")
+        elif self.is_listening:
+            self.status_label.config(text="● LISTENING", fg="#ffaa00")
         else:
-            return "I can help you play music, open music players, or manage your music library. What would you like to do?"
-    
-    def check_custom_commands(self, command):
-        """Check for custom user-defined commands"""
-        for trigger, cmd_data in self.custom_commands.items():
-            if trigger in command:
-                # Update usage statistics
-                self.cursor.execute(
-                    "UPDATE custom_commands SET usage_count = usage_count + 1, last_used = CURRENT_TIMESTAMP WHERE trigger = ?",
-                    (trigger,)
-                )
-                self.conn.commit()
-                
-                # Execute custom action
-                if cmd_data['action_type'] == 'response':
-                    return cmd_data['response']
-                elif cmd_data['action_type'] == 'command':
-                    try:
-                        subprocess.run(cmd_data['parameters'], shell=True)
-                        return cmd_data['response']
-                    except:
-                        return f"Failed to execute custom command: {trigger}"
-                elif cmd_data['action_type'] == 'web':
-                    webbrowser.open(cmd_data['parameters'])
-                    return cmd_data['response']
-        
-        return None
-    
-    def generate_learned_response(self, command):
-        """Generate response based on learned patterns"""
-        try:
-            self.cursor.execute(
-                "SELECT response_template, confidence_score FROM learned_patterns WHERE ? LIKE '%' || pattern || '%' ORDER BY confidence_score DESC LIMIT 1",
-                (command,)
-            )
-            result = self.cursor.fetchone()
-            
-            if result and result[1] > 0.7:  # Confidence threshold
-                return result[0]
-        except:
-            pass
-        
-        return None
+            self.status_label.config(text="● ACTIVE", fg="#00ff41")
     
-    def generate_intelligent_response(self, command):
-        """Generate intelligent response for unknown commands"""
-        # Analyze command for keywords
-        keywords = command.split()
-        
-        # Check for similar commands in database
-        similar_commands = []
-        for word in keywords:
-            if len(word) > 3:  # Ignore short words
-                similar_commands.extend(self.find_similar_commands(word))
+    def get_command_timeout(self, command):
+        """Timeout for the core handler a command is likely to reach"""
+        match = self.core.intent_router.match(command.lower())
+        return self.handler_timeouts.get(match.intent, self.default_command_timeout)
+    
+    def refresh_system_stats(self):
+        """Show the latest metrics snapshot in the Monitor tab and schedule the next refresh"""
+        if self.stats_after_id is not None:
+            self.root.after_cancel(self.stats_after_id)
+        
+        sampler = self.core.metrics_sampler
+        snapshot = sampler.latest()
+        if snapshot is None:
+            text = self.core.get_advanced_system_status()
+        else:
+            text = self.core.format_system_status(snapshot)
+            text += f"\n\nSampler overhead: {sampler.overhead_percent():.3f}% of one core"
         
-        if similar_commands:
-            return f"I'm not sure about that command. Did you mean: {', '.join(similar_commands[:3])}?"
+        speech = self.get_speech_stats()
+        text += (f"\nSpeech queue: {speech['queue_length']} waiting, {speech['spoken']} spoken, "
+                 f"{speech['preempted']} pre-empted, {speech['dropped_stale'] + speech['evicted']} dropped, "
+                 f"first audio p50 {speech['first_audio_p50_ms']:.0f} ms / p95 {speech['first_audio_p95_ms']:.0f} ms")
         
-        # Generic helpful response
-        responses = [
-            "I'm still learning that command. Can you teach me by saying 'teach mode' and showing me what you want?",
-            "That's a new one for me. You can add custom commands or try rephrasing your request.",
-            "I don't recognize that command yet. Try saying 'help' to see what I can do, or use 'teach mode' to show me.",
-            "Interesting request! I'm always learning. You can teach me new commands using the teach mode feature."
-        ]
+        self.stats_display.config(state=tk.NORMAL)
+        self.stats_display.delete("1.0", tk.END)
+        self.stats_display.insert(tk.END, text)
+        self.stats_display.config(state=tk.DISABLED)
+        self.refresh_latency_table()
         
-        return random.choice(responses)
+        self.stats_after_id = self.root.after(int(sampler.interval * 1000), self.refresh_system_stats)
     
-    def find_similar_commands(self, word):
-        """Find similar commands in the database"""
-        try:
-            self.cursor.execute(
-                "SELECT trigger FROM custom_commands WHERE trigger LIKE ?",
-                (f"%{word}%",)
+    def refresh_latency_table(self):
+        """Update the per-stage latency table in place"""
+        spans = self.core.tracer.snapshot()
+        existing = set(self.latency_tree.get_children())
+        for name, stats in spans.items():
+            values = (
+                name,
+                stats['count'],
+                f"{stats['p50_ms']:.3f}",
+                f"{stats['p95_ms']:.3f}",
+                f"{stats['p99_ms']:.3f}",
+                f"{stats['max_ms']:.3f}"
             )
-            return [row[0] for row in self.cursor.fetchall()]
-        except:
-            return []
-    
-    def learn_from_interaction(self, command, response):
-        """Learn from user interactions"""
-        try:
-            # Store the interaction
-            self.cursor.execute(
-                "INSERT INTO conversation_memory (user_input, tetris_response, context, importance_score) VALUES (?, ?, ?, ?)",
-                (command, response, "normal", 1)
-            )
-            
-            # Extract patterns
-            words = command.split()
-            if len(words) > 2:
-                pattern = ' '.join(words[:2])  # First two words as pattern
-                
-                # Check if pattern exists
-                self.cursor.execute(
-                    "SELECT id, success_rate, usage_count FROM learned_patterns WHERE pattern = ?",
-                    (pattern,)
-                )
-                existing = self.cursor.fetchone()
-                
-                if existing:
-                    # Update existing pattern
-                    new_usage = existing[2] + 1
-                    new_success_rate = (existing[1] * existing[2] + 1) / new_usage
-                    
-                    self.cursor.execute(
-                        "UPDATE learned_patterns SET success_rate = ?, usage_count = ? WHERE id = ?",
-                        (new_success_rate, new_usage, existing[0])
-                    )
-                else:
-                    # Create new pattern
-                    self.cursor.execute(
-                        "INSERT INTO learned_patterns (pattern, response_template, confidence_score, success_rate, usage_count) VALUES (?, ?, ?, ?, ?)",
-                        (pattern, response, 0.5, 1.0, 1)
-                    )
-            
-            self.conn.commit()
-        except Exception as e:
-            print(f"Learning error: {e}")
-    
-    def store_conversation(self, user_input, tetris_response):
-        """Store conversation in memory"""
-        try:
-            if user_input or tetris_response:
-                self.cursor.execute(
-                    "INSERT INTO conversation_memory (user_input, tetris_response, context) VALUES (?, ?, ?)",
-                    (user_input, tetris_response, "chat")
-                )
-                self.conn.commit()
-        except Exception as e:
-            print(f"Memory storage error: {e}")
-    
-    def load_user_preferences(self):
-        """Load user preferences from database"""
-        try:
-            self.cursor.execute("SELECT key, value FROM user_preferences")
-            return dict(self.cursor.fetchall())
-        except:
-            return {}
+            if name in existing:
+                self.latency_tree.item(name, values=values)
+            else:
+                self.latency_tree.insert("", "end", iid=name, values=values)
     
-    def save_user_preference(self, key, value):
-        """Save user preference to database"""
-        try:
-            self.cursor.execute(
-                "INSERT OR REPLACE INTO user_preferences (key, value) VALUES (?, ?)",
-                (key, value)
-            )
-            self.conn.commit()
-            self.user_preferences[key] = value
-        except Exception as e:
-            print(f"Preference save error: {e}")
+    def export_latency_metrics(self):
+        """Save pipeline latency histograms as JSON or Prometheus text"""
+        filename = filedialog.asksaveasfilename(
+            title="Export Latency Metrics",
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json"), ("Prometheus text", "*.prom")]
+        )
+        if filename:
+            try:
+                self.core.tracer.export(filename)
+                self.add_message("T.E.T.R.I.S", f"Latency metrics exported to {filename}.", "success")
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to export metrics: {str(e)}")
     
     def on_key_release(self, event):
         """Handle key release for autocomplete suggestions"""
+        # Debounce typing bursts so only the last keystroke triggers a lookup
+        if self.suggestion_after_id is not None:
+            self.root.after_cancel(self.suggestion_after_id)
+        self.suggestion_after_id = self.root.after(self.suggestion_delay_ms, self.update_suggestions)
+    
+    def update_suggestions(self):
+        """Show autocomplete suggestions for the current input"""
+        self.suggestion_after_id = None
         current_text = self.input_entry.get().lower()
         if len(current_text) > 2:
-            suggestions = self.get_command_suggestions(current_text)
+            suggestions = self.core.get_command_suggestions(current_text)
             if suggestions:
                 self.suggestion_var.set(f"Suggestions: {', '.join(suggestions[:3])}")
             else:
@@ -1407,86 +1198,62 @@ System Status: {'🟢 OPTIMAL' if cpu_percent < 80 and memory.percent < 80 else
         else:
             self.suggestion_var.set("")
     
-    def get_command_suggestions(self, partial_command):
-        """Get command suggestions based on partial input"""
-        suggestions = []
-        
-        # Common commands
-        common_commands = [
-            "open calculator", "open notepad", "system status", "what time is it",
-            "search for", "play music", "tell a joke", "weather forecast",
-            "shutdown computer", "lock screen", "create folder", "help"
-        ]
-        
-        # Find matching commands
-        for cmd in common_commands:
-            if cmd.startswith(partial_command):
-                suggestions.append(cmd)
-        
-        # Add custom commands
-        for trigger in self.custom_commands.keys():
-            if trigger.startswith(partial_command):
-                suggestions.append(trigger)
-        
-        return suggestions[:5]  # Return top 5 suggestions
-    
-    def remove_wake_words(self, command):
-        """Remove wake words from command"""
-        wake_words = ['tetris', 'friday', 'edith', 'ai', 'hey', 'ok']
-        words = command.split()
-        filtered_words = [word for word in words if word.lower() not in wake_words]
-        return ' '.join(filtered_words)
-    
-    # Advanced Features
     def enter_teach_mode(self):
         """Enter teaching mode for custom commands"""
-        teach_dialog = TeachModeDialog(self.root, self)
-        self.root.wait_window(teach_dialog.dialog)
+        dialog = TeachModeDialog(self.root, self)
+        self.root.wait_window(dialog.dialog)
+        if self.show_saved_command(dialog):
+            self.add_message("T.E.T.R.I.S", f"Understood. I'll answer '{dialog.saved}' from now on.", "success")
     
     def add_custom_command(self):
         """Add new custom command"""
         dialog = CustomCommandDialog(self.root, self)
         self.root.wait_window(dialog.dialog)
-        self.refresh_command_list()
+        if self.show_saved_command(dialog):
+            self.add_message("T.E.T.R.I.S", f"Custom command '{dialog.saved}' added successfully.")
     
     def edit_custom_command(self):
         """Edit existing custom command"""
         selection = self.command_tree.selection()
         if selection:
             item = self.command_tree.item(selection[0])
-            trigger = item['values'][0]
-            
-            # Get command details
-            self.cursor.execute(
-                "SELECT response, action_type, parameters FROM custom_commands WHERE trigger = ?",
-                (trigger,)
-            )
-            result = self.cursor.fetchone()
+            trigger = str(item['values'][0])
+            command = self.custom_commands.get(trigger.lower())
             
-            if result:
-                dialog = CustomCommandDialog(self.root, self, trigger, result[0], result[1], result[2])
+            if command:
+                dialog = CustomCommandDialog(self.root, self, trigger, command['response'],
+                                             command['action_type'], command['parameters'])
                 self.root.wait_window(dialog.dialog)
-                self.refresh_command_list()
+                if self.show_saved_command(dialog):
+                    self.add_message("T.E.T.R.I.S", f"Custom command '{dialog.saved}' updated successfully.")
         else:
             messagebox.showwarning("Selection Required", "Please select a command to edit.")
     
+    def show_saved_command(self, dialog):
+        """Update the COMMANDS list for a dialog's save; False when it was cancelled"""
+        if dialog.saved is None:
+            return False
+        # The engine already serves the command; its row is written behind, so the list is patched in place
+        if dialog.old_trigger is None:
+            self.update_command_count(1)
+        elif dialog.old_trigger.lower() != dialog.saved.lower():
+            self.remove_command_row(dialog.old_trigger)
+        self.apply_command_row(dialog.saved)
+        return True
+    
     def delete_custom_command(self):
         """Delete custom command"""
         selection = self.command_tree.selection()
         if selection:
             item = self.command_tree.item(selection[0])
-            trigger = item['values'][0]
+            trigger = str(item['values'][0])
             
             if messagebox.askyesno("Confirm Delete", f"Delete command '{trigger}'?"):
                 try:
-                    self.cursor.execute("DELETE FROM custom_commands WHERE trigger = ?", (trigger,))
-                    self.conn.commit()
-                    
-                    # Remove from memory
-                    if trigger.lower() in self.custom_commands:
-                        del self.custom_commands[trigger.lower()]
-                    
-                    self.refresh_command_list()
+                    # Gone from memory now; the row is deleted by the write-behind worker
+                    self.core.delete_custom_command(trigger)
+                    self.remove_command_row(trigger)
+                    self.update_command_count(-1)
                     self.add_message("T.E.T.R.I.S", f"Custom command '{trigger}' deleted successfully.")
                 except Exception as e:
                     messagebox.showerror("Error", f"Failed to delete command: {str(e)}")
@@ -1494,26 +1261,258 @@ System Status: {'🟢 OPTIMAL' if cpu_percent < 80 and memory.percent < 80 else
             messagebox.showwarning("Selection Required", "Please select a command to delete.")
     
     def refresh_command_list(self):
-        """Refresh the command list display"""
-        # Clear existing items
-        for item in self.command_tree.get_children():
-            self.command_tree.delete(item)
-        
-        # Load commands from database
+        """Reload the command list from its first page"""
+        self.command_tree.delete(*self.command_tree.get_children())
+        self.command_next_key = None
         try:
-            self.cursor.execute(
-                "SELECT trigger, action_type, usage_count, last_used FROM custom_commands ORDER BY usage_count DESC"
-            )
-            
-            for row in self.cursor.fetchall():
-                trigger, action_type, usage_count, last_used = row
-                last_used_str = last_used if last_used else "Never"
-                
-                self.command_tree.insert("", "end", values=(
-                    trigger, action_type, usage_count, last_used_str
-                ))
+            self.update_command_count()
+            self.load_command_page(first=True)
         except Exception as e:
             print(f"Error refreshing command list: {e}")
     
+    def update_command_count(self, delta=None):
+        """Count the commands matching the filters, or adjust the count for a change still being written"""
+        if delta is None:
+            prefix, action_type = self.command_filters()
+            self.command_count = self.core.count_custom_commands(prefix, action_type)
+        else:
+            self.command_count += delta
+        self.command_count_var.set(f"{self.command_count:,} commands")
+    
+    def command_filters(self):
+        action_type = self.command_action_var.get()
+        return self.command_filter_var.get().strip().lower(), (None if action_type == "all" else action_type)
+    
+    def load_command_page(self, first=False):
+        """Append the next page of rows for the current sort and filters"""
+        self.command_page_pending = False
+        if not first and self.command_next_key is None:
+            return
+        prefix, action_type = self.command_filters()
+        rows, self.command_next_key = self.core.query_custom_commands(
+            prefix, action_type, self.command_sort, self.command_sort_descending,
+            after=None if first else self.command_next_key, limit=self.command_page_size
+        )
+        for row in rows:
+            if not self.command_tree.exists(row[0].lower()):
+                self.command_tree.insert("", "end", iid=row[0].lower(), values=self.command_row_values(row))
+    
+    def command_row_values(self, row):
+        trigger, action_type, usage_count, last_used = row
+        return (trigger, action_type, usage_count, last_used if last_used else "Never")
+    
+    def on_command_tree_scroll(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        if float(last) >= 0.9 and self.command_next_key is not None and not self.command_page_pending:
+            self.command_page_pending = True
+            self.root.after_idle(self.load_command_page)
+    
+    def sort_command_list(self, sort_key):
+        """Heading click: sort by that column, toggling direction on repeat clicks"""
+        if self.command_sort == sort_key:
+            self.command_sort_descending = not self.command_sort_descending
+        else:
+            self.command_sort = sort_key
+            self.command_sort_descending = sort_key in ('usage', 'last_used')
+        self.refresh_command_list()
+    
+    def on_command_filter_changed(self, event=None):
+        if self.command_filter_after_id is not None:
+            self.root.after_cancel(self.command_filter_after_id)
+        self.command_filter_after_id = self.root.after(200, self.refresh_command_list)
+    
+    def command_sort_value(self, values):
+        """Sort key of a displayed row, matching the SQL ordering"""
+        trigger, action_type, usage_count, last_used = (str(value) for value in values)
+        key = {
+            'trigger': trigger,
+            'action': action_type,
+            'usage': int(usage_count),
+            'last_used': "" if last_used == "Never" else last_used,
+        }[self.command_sort]
+        return (key, trigger)
+    
+    def apply_command_row(self, trigger):
+        """Insert, move or update a single row after a command was added or edited"""
+        iid = trigger.lower()
+        row = self.core.custom_command_row(trigger)
+        prefix, action_type = self.command_filters()
+        if row is None or not row[0].lower().startswith(prefix) or (action_type and row[1] != action_type):
+            self.remove_command_row(trigger)
+            return
+        
+        values = self.command_row_values(row)
+        if self.command_tree.exists(iid):
+            self.command_tree.delete(iid)
+        
+        # Place it among the loaded rows; rows past the last page arrive with later pages
+        key = self.command_sort_value(values)
+        children = self.command_tree.get_children()
+        position = len(children)
+        for index, child in enumerate(children):
+            child_key = self.command_sort_value(self.command_tree.item(child, 'values'))
+            if (key > child_key) if self.command_sort_descending else (key < child_key):
+                position = index
+                break
+        if position == len(children) and self.command_next_key is not None:
+            return
+        self.command_tree.insert("", position, iid=iid, values=values)
+    
+    def remove_command_row(self, trigger):
+        if self.command_tree.exists(trigger.lower()):
+            self.command_tree.delete(trigger.lower())
+    
     def export_commands(self):
-        """
\ No newline at end of file
+        """Export custom commands to JSON Lines, gzip-compressed for .gz files"""
+        path = filedialog.asksaveasfilename(
+            title="Export Commands",
+            defaultextension=".jsonl.gz",
+            filetypes=[("Compressed JSON Lines", "*.jsonl.gz"), ("JSON Lines", "*.jsonl")]
+        )
+        if not path:
+            return
+        
+        def run_export():
+            try:
+                count = self.core.export_custom_commands(
+                    path, progress=lambda done: self.main_thread.post(self.command_count_var.set, f"Exported {done:,} commands...")
+                )
+                self.main_thread.post(self.add_message, "T.E.T.R.I.S",
+                                      f"Exported {count:,} custom commands to {os.path.basename(path)}.", "success")
+            except Exception as e:
+                self.main_thread.post(self.add_message, "T.E.T.R.I.S", f"Command export failed: {str(e)}", "error")
+            finally:
+                self.main_thread.post(self.update_command_count)
+        
+        threading.Thread(target=run_export, name="tetris-export", daemon=True).start()
+    
+    def import_commands(self):
+        """Import a JSON Lines command pack in chunks without blocking the interface"""
+        path = filedialog.askopenfilename(
+            title="Import Commands",
+            filetypes=[("JSON Lines", "*.jsonl *.jsonl.gz"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        replace = messagebox.askyesnocancel(
+            "Import Commands",
+            "Some imported triggers may already exist with a different definition.\n\n"
+            "Yes: use the imported definition\nNo: keep the local one"
+        )
+        if replace is None:
+            return
+        
+        def report_progress(stats):
+            percent = stats['bytes_read'] * 100 // max(stats['bytes_total'], 1)
+            self.main_thread.post(
+                self.command_count_var.set,
+                f"Importing {percent}%: {stats['inserted'] + stats['updated']:,} saved, "
+                f"{len(stats['conflicts'])} conflicts, {stats['errors']} errors"
+            )
+        
+        def run_import():
+            try:
+                stats = self.core.import_custom_commands(path, 'replace' if replace else 'skip', progress=report_progress)
+                self.main_thread.post(self.finish_import, path, stats)
+            except Exception as e:
+                self.main_thread.post(self.add_message, "T.E.T.R.I.S", f"Command import failed: {str(e)}", "error")
+                self.main_thread.post(self.update_command_count)
+        
+        threading.Thread(target=run_import, name="tetris-import", daemon=True).start()
+    
+    def finish_import(self, path, stats):
+        self.refresh_command_list()
+        summary = (f"Imported {os.path.basename(path)}: {stats['inserted']:,} new, {stats['updated']:,} updated, "
+                   f"{stats['unchanged']:,} unchanged, {stats['skipped']:,} kept local.")
+        if stats['conflicts']:
+            shown = ', '.join(stats['conflicts'][:5])
+            summary += f"\nConflicting triggers: {shown}{' ...' if len(stats['conflicts']) > 5 else ''}"
+        if stats['errors']:
+            line, error = stats['error_lines'][0]
+            summary += f"\n{stats['errors']:,} lines could not be read (first at line {line}: {error})."
+        self.add_message("T.E.T.R.I.S", summary, "warning" if stats['errors'] else "success")
+
+
+class CustomCommandDialog:
+    """Add or edit a custom command; saved holds the stored trigger once the user saves"""
+    
+    ACTION_TYPES = ("response", "command", "web")
+    
+    def __init__(self, parent, app, trigger=None, response="", action_type="response", parameters="",
+                 title=None, show_action=True):
+        self.app = app
+        self.old_trigger = trigger
+        self.saved = None
+        
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title(title or ("Edit Custom Command" if trigger else "Add Custom Command"))
+        self.dialog.configure(bg="#000000")
+        self.dialog.resizable(False, False)
+        self.dialog.transient(parent)
+        
+        form = tk.Frame(self.dialog, bg="#000000")
+        form.pack(fill=tk.BOTH, expand=True, padx=15, pady=15)
+        
+        self.trigger_var = tk.StringVar(value=trigger or "")
+        self.action_var = tk.StringVar(value=action_type or "response")
+        self.parameters_var = tk.StringVar(value=parameters or "")
+        
+        self.field_label(form, "When I say:", 0)
+        trigger_entry = self.entry(form, self.trigger_var)
+        trigger_entry.grid(row=0, column=1, sticky="ew", pady=4)
+        
+        self.field_label(form, "Reply with:", 1)
+        self.response_text = tk.Text(form, bg="#1a1a1a", fg="#ffffff", font=("Consolas", 10),
+                                     insertbackground="#00ff41", width=45, height=4, wrap=tk.WORD)
+        self.response_text.insert("1.0", response or "")
+        self.response_text.grid(row=1, column=1, sticky="ew", pady=4)
+        
+        if show_action:
+            self.field_label(form, "Action:", 2)
+            ttk.Combobox(form, textvariable=self.action_var, state="readonly", width=12,
+                         values=self.ACTION_TYPES).grid(row=2, column=1, sticky="w", pady=4)
+            self.field_label(form, "Parameters:", 3)
+            self.entry(form, self.parameters_var).grid(row=3, column=1, sticky="ew", pady=4)
+            tk.Label(form, text="Shell command for 'command', URL for 'web'", font=("Consolas", 8),
+                     fg="#666666", bg="#000000").grid(row=4, column=1, sticky="w")
+        
+        buttons = tk.Frame(self.dialog, bg="#000000")
+        buttons.pack(fill=tk.X, padx=15, pady=(0, 15))
+        tk.Button(buttons, text="CANCEL", command=self.dialog.destroy, bg="#333333", fg="#ffffff",
+                  font=("Consolas", 9, "bold"), relief=tk.FLAT).pack(side=tk.RIGHT, padx=(5, 0))
+        tk.Button(buttons, text="SAVE", command=self.save, bg="#00ff41", fg="#000000",
+                  font=("Consolas", 9, "bold"), relief=tk.FLAT).pack(side=tk.RIGHT)
+        
+        self.dialog.bind('<Escape>', lambda event: self.dialog.destroy())
+        trigger_entry.focus_set()
+        self.dialog.grab_set()
+    
+    @staticmethod
+    def field_label(parent, text, row):
+        tk.Label(parent, text=text, font=("Consolas", 9), fg="#cccccc", bg="#000000").grid(
+            row=row, column=0, sticky="nw", padx=(0, 10), pady=4)
+    
+    @staticmethod
+    def entry(parent, variable):
+        return tk.Entry(parent, textvariable=variable, bg="#1a1a1a", fg="#ffffff", font=("Consolas", 10),
+                        insertbackground="#00ff41", width=45)
+    
+    def save(self):
+        """Save through the engine, keeping the dialog open when the trigger is rejected"""
+        trigger = self.trigger_var.get().strip()
+        response = self.response_text.get("1.0", tk.END).strip()
+        try:
+            self.app.core.save_custom_command(trigger, response, self.action_var.get(),
+                                              self.parameters_var.get().strip(), old_trigger=self.old_trigger)
+        except ValueError as e:
+            messagebox.showerror("Invalid Command", str(e), parent=self.dialog)
+            return
+        self.saved = trigger
+        self.dialog.destroy()
+
+
+class TeachModeDialog(CustomCommandDialog):
+    """Teach a phrase and the reply to give, stored as a response command"""
+    
+    def __init__(self, parent, app):
+        super().__init__(parent, app, title="Teach Mode", show_action=False)
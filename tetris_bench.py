@@ -0,0 +1,339 @@
+"""Benchmarks for the T.E.T.R.I.S command pipeline and storage layer
+
+    python tetris_bench.py pipeline --sizes 1000,10000 --write-baseline bench_baseline.json
+    python tetris_bench.py pipeline --sizes 1000,10000 --baseline bench_baseline.json
+    python tetris_bench.py fuzzy --sizes 1000,10000,100000
+
+bench_baseline.json holds the 1000 and 10000 row results and the machine they
+were measured on; rewrite it before comparing on other hardware.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import string
+import sys
+import tempfile
+import time
+
+from tetris_core import SIDE_EFFECT_INTENTS, FuzzyMatcher, TetrisEngine
+
+
+WORDS = [
+    "alpha", "beta", "gamma", "delta", "report", "server", "backup", "status", "meeting",
+    "timer", "volume", "lights", "camera", "screen", "project", "budget", "garden", "kitchen",
+    "printer", "office", "summary", "invoice", "ticket", "sprint", "review", "deploy",
+]
+
+CORE_COMMANDS = [
+    "hello there", "what time is it", "what is the date today", "calculate 12 * 7 + 3",
+    "calculate sqrt(144) / 3", "tell me a joke", "explain photosynthesis", "help me study math",
+    "define entropy", "system status", "who are you", "predict tomorrow",
+]
+
+STAGES = ['process_command', 'check_custom_commands', 'generate_learned_response',
+          'find_similar_commands', 'get_command_suggestions']
+
+
+def random_token(rng, low=4, high=8):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(low, high)))
+
+
+def random_phrase(rng, words=3):
+    """Build a synthetic trigger from dictionary words and a random suffix"""
+    parts = [rng.choice(WORDS) for _ in range(words - 1)]
+    parts.append(random_token(rng))
+    return ' '.join(parts)
+
+
+def misspell(rng, phrase):
+    """Drop or swap a character to simulate a typo"""
+    chars = list(phrase)
+    i = rng.randrange(1, len(chars) - 1)
+    if rng.random() < 0.5:
+        del chars[i]
+    else:
+        chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    return ''.join(chars)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(samples, wall_seconds):
+    return {
+        'count': len(samples),
+        'throughput_per_s': len(samples) / wall_seconds if wall_seconds else 0.0,
+        'p50_ms': percentile(samples, 0.50),
+        'p95_ms': percentile(samples, 0.95),
+        'p99_ms': percentile(samples, 0.99),
+    }
+
+
+def generate_database(path, size, seed=11, batch_size=50000):
+    """Create a tetris_memory.db with size rows in each hot table"""
+    rng = random.Random(seed)
+    engine = TetrisEngine(db_path=path, start_sampler=False)
+    engine.close()
+
+    conn = sqlite3.connect(path)
+    triggers = set()
+    patterns = set()
+
+    def batches(make_row, existing=None):
+        rows = []
+        while len(rows) < size:
+            row = make_row()
+            if existing is not None:
+                if row[0] in existing:
+                    continue
+                existing.add(row[0])
+            rows.append(row)
+            if len(rows) % batch_size == 0:
+                yield rows[-batch_size:]
+        remainder = len(rows) % batch_size
+        if remainder:
+            yield rows[-remainder:]
+
+    with conn:
+        for rows in batches(lambda: (random_phrase(rng), "Synthetic response", "response", "",
+                                     rng.randint(0, 500)), triggers):
+            conn.executemany(
+                "INSERT INTO custom_commands (trigger, response, action_type, parameters, usage_count) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        for rows in batches(lambda: (f"{rng.choice(WORDS)} {random_token(rng)}", "Learned response",
+                                     round(rng.random(), 3), rng.random(), rng.randint(1, 50)), patterns):
+            conn.executemany(
+                "INSERT INTO learned_patterns (pattern, response_template, confidence_score, success_rate, usage_count) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+        for rows in batches(lambda: (random_phrase(rng), "Synthetic reply", "chat",
+                                     f"-{rng.randint(0, 90)} days", 1)):
+            conn.executemany(
+                "INSERT INTO conversation_memory (user_input, tetris_response, context, timestamp, importance_score) "
+                "VALUES (?, ?, ?, datetime('now', ?), ?)",
+                rows
+            )
+    conn.close()
+
+
+def build_corpus(engine, count, seed=23):
+    """Mixed corpus: custom trigger hits, learned pattern hits, core intents and typos"""
+    rng = random.Random(seed)
+    triggers = list(engine.custom_commands)
+    patterns = [pattern for pattern, entry in engine.learned_index.patterns.items() if entry[1] > 0.7]
+
+    corpus = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.3 and triggers:
+            corpus.append(f"please {rng.choice(triggers)} now")
+        elif roll < 0.5 and patterns:
+            corpus.append(f"{rng.choice(patterns)} {rng.choice(WORDS)}")
+        elif roll < 0.8:
+            corpus.append(rng.choice(CORE_COMMANDS))
+        elif triggers:
+            corpus.append(misspell(rng, rng.choice(triggers)))
+        else:
+            corpus.append(random_phrase(rng))
+    return corpus
+
+
+def time_stage(fn, inputs):
+    samples = []
+    wall_start = time.perf_counter()
+    for value in inputs:
+        start = time.perf_counter()
+        fn(value)
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples, time.perf_counter() - wall_start)
+
+
+def bench_pipeline(size, data_dir, commands=2000):
+    """Replay the corpus against a copy of the synthetic database for one size"""
+    os.makedirs(data_dir, exist_ok=True)
+    source = os.path.join(data_dir, f"tetris_bench_{size}.db")
+    if not os.path.exists(source):
+        print(f"Generating {size}-row database...", file=sys.stderr)
+        generate_database(source, size)
+
+    workdir = tempfile.mkdtemp(prefix="tetris_bench_")
+    db_path = os.path.join(workdir, "tetris_memory.db")
+    shutil.copy(source, db_path)
+
+    try:
+        load_start = time.perf_counter()
+        engine = TetrisEngine(db_path=db_path, start_sampler=False)
+        load_seconds = time.perf_counter() - load_start
+        # Time steady state: background indexing and the trigger automaton finished
+        engine.indexes_ready.wait()
+        engine.trigger_index.automaton.build()
+        index_seconds = time.perf_counter() - load_start
+        engine.dry_run = True
+        for intent in SIDE_EFFECT_INTENTS:
+            engine.register_handler(intent, lambda command, original, intent=intent: f"benchmark: {intent} skipped")
+
+        corpus = build_corpus(engine, commands)
+        prefixes = [command[:prefix_len] for command, prefix_len in zip(corpus, itertools.cycle((3, 5, 8)))]
+
+        stages = {
+            'check_custom_commands': time_stage(engine.check_custom_commands, corpus),
+            'generate_learned_response': time_stage(engine.generate_learned_response, corpus),
+            'find_similar_commands': time_stage(engine.find_similar_commands, corpus),
+            'get_command_suggestions': time_stage(engine.get_command_suggestions, prefixes),
+            'process_command': time_stage(engine.process_command, corpus),
+        }
+
+        flush_start = time.perf_counter()
+        engine.persistence.flush()
+        stages['persistence_flush'] = {'seconds': time.perf_counter() - flush_start,
+                                       **engine.persistence.stats()}
+        engine.close()
+        return {'load_seconds': load_seconds, 'index_seconds': index_seconds, 'stages': stages}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results, baseline, tolerance):
+    """Return regressions where p95 grew by more than tolerance over the baseline"""
+    regressions = []
+    for size, result in results['sizes'].items():
+        previous = baseline.get('sizes', {}).get(size)
+        if not previous:
+            continue
+        for stage in STAGES:
+            now = result['stages'].get(stage)
+            before = previous['stages'].get(stage)
+            if not now or not before or not before['p95_ms']:
+                continue
+            if now['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{stage} @ {size} rows: p95 {before['p95_ms']:.3f} -> {now['p95_ms']:.3f} ms")
+    return regressions
+
+
+def bench_fuzzy(sizes=(1000, 10000, 100000), queries=500, seed=7):
+    """Time FuzzyMatcher.suggest as the trigger table grows"""
+    rng = random.Random(seed)
+    results = []
+
+    for size in sizes:
+        matcher = FuzzyMatcher()
+        phrases = [random_phrase(rng) for _ in range(size)]
+        for phrase in phrases:
+            matcher.add(phrase)
+
+        probes = [misspell(rng, rng.choice(phrases)) for _ in range(queries)]
+        samples = []
+        for probe in probes:
+            start = time.perf_counter()
+            matcher.suggest(probe, k=3)
+            samples.append((time.perf_counter() - start) * 1000)
+
+        results.append({
+            'size': size,
+            'p50_ms': percentile(samples, 0.50),
+            'p95_ms': percentile(samples, 0.95),
+            'p99_ms': percentile(samples, 0.99),
+        })
+
+    return results
+
+
+def machine_info():
+    """What a baseline was measured on; timings only compare on like hardware"""
+    return {
+        'arch': platform.machine(),
+        'processor': platform.processor() or None,
+        'cpu_count': os.cpu_count(),
+        'sqlite': sqlite3.sqlite_version,
+    }
+
+
+def run_pipeline(args):
+    sizes = [int(size) for size in args.sizes.split(',')]
+    results = {
+        'format': 1,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': machine_info(),
+        'commands': args.commands,
+        'sizes': {},
+    }
+
+    for size in sizes:
+        result = bench_pipeline(size, args.data_dir, args.commands)
+        results['sizes'][str(size)] = result
+
+        print(f"\n{size} rows per table (engine load {result['load_seconds']:.2f}s, "
+              f"indexes ready {result['index_seconds']:.2f}s)")
+        print(f"{'stage':<28} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for stage in STAGES:
+            row = result['stages'][stage]
+            print(f"{stage:<28} {row['throughput_per_s']:>10.0f} {row['p50_ms']:>9.3f} "
+                  f"{row['p95_ms']:>9.3f} {row['p99_ms']:>9.3f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.write_baseline:
+        with open(args.write_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline written to {args.write_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('machine') != results['machine']:
+            print(f"\nNote: baseline was measured on {baseline.get('machine')}, this run on {results['machine']}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+def run_fuzzy(args):
+    sizes = [int(size) for size in args.sizes.split(',')]
+    print(f"{'triggers':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for row in bench_fuzzy(sizes, args.queries):
+        print(f"{row['size']:>10} {row['p50_ms']:>10.3f} {row['p95_ms']:>10.3f} {row['p99_ms']:>10.3f}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="T.E.T.R.I.S benchmarks")
+    subparsers = parser.add_subparsers(dest='suite')
+
+    pipeline = subparsers.add_parser('pipeline', help="replay a command corpus against synthetic databases")
+    pipeline.add_argument('--sizes', default="1000,100000", help="comma separated rows per table, e.g. 1000,100000,1000000")
+    pipeline.add_argument('--commands', type=int, default=2000, help="corpus size per database")
+    pipeline.add_argument('--data-dir', default="bench_data", help="where generated databases are cached")
+    pipeline.add_argument('--output', help="write results as JSON")
+    pipeline.add_argument('--write-baseline', help="save results as the new baseline file")
+    pipeline.add_argument('--baseline', help="compare against a baseline file and exit 1 on regression")
+    pipeline.add_argument('--tolerance', type=float, default=0.25, help="allowed p95 growth before flagging")
+
+    fuzzy = subparsers.add_parser('fuzzy', help="fuzzy suggestion latency as the trigger table grows")
+    fuzzy.add_argument('--sizes', default="1000,10000,100000", help="comma separated table sizes")
+    fuzzy.add_argument('--queries', type=int, default=500)
+
+    args = parser.parse_args()
+    if args.suite == 'fuzzy':
+        return run_fuzzy(args)
+    if args.suite is None:
+        args = parser.parse_args(['pipeline'] + sys.argv[1:])
+    return run_pipeline(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
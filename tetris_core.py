@@ -0,0 +1,3802 @@
+"""Headless core of T.E.T.R.I.S: command engine, indexes and background workers"""
+import argparse
+import ast
+import datetime
+import gzip
+import heapq
+import importlib
+import io
+import json
+import math
+import os
+import platform
+import queue
+import random
+import re
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import webbrowser
+from collections import deque, namedtuple
+from bisect import bisect_left
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from itertools import count, islice
+from pathlib import Path
+
+
+class StartupProfiler:
+    """Records how long each import and initialization phase takes at startup"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.phases = []
+        self.imports = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_phase(name, start, time.perf_counter())
+
+    def record_phase(self, name, start, end):
+        with self.lock:
+            self.phases.append((name, (start - self.origin) * 1000, (end - start) * 1000))
+
+    def record_import(self, name, elapsed_ms):
+        with self.lock:
+            self.imports.append((name, elapsed_ms))
+
+    def total_ms(self):
+        return (time.perf_counter() - self.origin) * 1000
+
+    def report(self):
+        lines = [f"Startup profile ({self.total_ms():.1f} ms since tetris_core import)"]
+        lines.append(f"  {'phase':<40} {'start ms':>10} {'took ms':>10}")
+        for name, offset, elapsed in self.phases:
+            lines.append(f"  {name:<40} {offset:>10.1f} {elapsed:>10.1f}")
+        if self.imports:
+            lines.append(f"  {'deferred import':<40} {'':>10} {'took ms':>10}")
+            for name, elapsed in self.imports:
+                lines.append(f"  {name:<40} {'':>10} {elapsed:>10.1f}")
+        return "\n".join(lines)
+
+
+STARTUP_PROFILER = StartupProfiler()
+
+
+class LazyModule:
+    """Stand-in for a heavy module (or one of its attributes) imported on first use"""
+
+    def __init__(self, name, attribute=None):
+        self._name = name
+        self._attribute = attribute
+        self._target = None
+
+    def _load(self):
+        if self._target is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self._name)
+            target = getattr(module, self._attribute) if self._attribute else module
+            label = f"{self._name}.{self._attribute}" if self._attribute else self._name
+            STARTUP_PROFILER.record_import(label, (time.perf_counter() - start) * 1000)
+            self._target = target
+        return self._target
+
+    def __getattr__(self, item):
+        return getattr(self._load(), item)
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __repr__(self):
+        state = "loaded" if self._target is not None else "deferred"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_import(name, attribute=None):
+    """Defer importing name until the returned proxy is first used"""
+    return LazyModule(name, attribute)
+
+
+IntentMatch = namedtuple('IntentMatch', ['intent', 'phrase', 'elapsed_ms'])
+
+
+class PatternAutomaton:
+    """Aho-Corasick automaton that finds every known phrase in one pass over the text
+
+    Adding a phrase can change the failure links of nodes anywhere in the
+    trie, so new phrases are matched with a plain substring search until a
+    background rebuild compiles them into fresh tables and swaps those in.
+    Removals clear the phrase's terminal in place.
+    """
+
+    MISSING = object()
+
+    def __init__(self, build_delay=0.2):
+        self.build_delay = build_delay
+        self.tables = self.compile_tables(())
+        self.values = {}
+        self.pending = {}  # Phrases not yet compiled into tables
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.builder = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, pattern):
+        return pattern in self.values
+
+    def get(self, pattern, default=None):
+        return self.values.get(pattern, default)
+
+    @staticmethod
+    def compile_tables(patterns):
+        """Build (children, fail, out, terminal) for patterns, failure links breadth-first"""
+        children, fail, out, terminal = [{}], [0], [0], [None]
+        for pattern in patterns:
+            node = 0
+            for ch in pattern:
+                child = children[node].get(ch)
+                if child is None:
+                    child = len(children)
+                    children.append({})
+                    fail.append(0)
+                    out.append(0)
+                    terminal.append(None)
+                    children[node][ch] = child
+                node = child
+            terminal[node] = pattern
+
+        queue = deque(children[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in children[node].items():
+                state = fail[node]
+                while state and ch not in children[state]:
+                    state = fail[state]
+                target = children[state].get(ch, 0)
+                fail[child] = target if target != child else 0
+                out[child] = fail[child] if terminal[fail[child]] is not None else out[fail[child]]
+                queue.append(child)
+        return children, fail, out, terminal
+
+    @staticmethod
+    def find_node(children, pattern):
+        node = 0
+        for ch in pattern:
+            node = children[node].get(ch)
+            if node is None:
+                return None
+        return node
+
+    def add(self, pattern, value=None):
+        """Insert or update a pattern; new patterns are matchable immediately"""
+        if not pattern:
+            return
+        with self.lock:
+            if pattern in self.values:
+                self.values[pattern] = value
+                return
+            self.values[pattern] = value
+            self.pending[pattern] = None
+            if self.builder is None:
+                self.builder = threading.Thread(target=self.build_in_background, name="tetris-automaton", daemon=True)
+                self.builder.start()
+
+    def remove(self, pattern):
+        """Remove a pattern in place; output chains simply skip cleared nodes"""
+        with self.lock:
+            if pattern not in self.values:
+                return False
+            self.pending.pop(pattern, None)
+            terminal = self.tables[3]
+            node = self.find_node(self.tables[0], pattern)
+            if node is not None and terminal[node] == pattern:
+                terminal[node] = None
+            del self.values[pattern]
+            return True
+
+    def clear(self):
+        with self.lock:
+            self.tables = self.compile_tables(())
+            self.values = {}
+            self.pending = {}
+
+    def build(self):
+        """Compile every pattern into fresh tables and swap them in"""
+        with self.build_lock:
+            with self.lock:
+                if not self.pending:
+                    return
+                patterns = list(self.values)
+            tables = self.compile_tables(patterns)
+
+            with self.lock:
+                children, _, _, terminal = tables
+                for pattern in patterns:
+                    if pattern not in self.values:
+                        # Removed while compiling
+                        terminal[self.find_node(children, pattern)] = None
+                # Swap before clearing pending; iter_matches reads them in the opposite order
+                self.tables = tables
+                for pattern in patterns:
+                    self.pending.pop(pattern, None)
+
+    def build_in_background(self):
+        while True:
+            time.sleep(self.build_delay)  # Let a burst of adds share one rebuild
+            try:
+                self.build()
+            except Exception as e:
+                print(f"Pattern automaton build error: {e}")
+            with self.lock:
+                if not self.pending:
+                    self.builder = None
+                    return
+
+    def iter_matches(self, text):
+        """Yield (start, pattern, value) for every pattern occurring in text"""
+        pending = tuple(self.pending)
+        children, fail, out, terminal = self.tables
+        values = self.values
+
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in children[state]:
+                state = fail[state]
+            state = children[state].get(ch, 0)
+
+            node = state
+            while node:
+                pattern = terminal[node]
+                if pattern is not None:
+                    # remove() may drop the value after the terminal was read
+                    value = values.get(pattern, self.MISSING)
+                    if value is not self.MISSING:
+                        yield i - len(pattern) + 1, pattern, value
+                node = out[node]
+
+        for pattern in pending:
+            start = text.find(pattern)
+            if start == -1:
+                continue
+            # A build that swapped in after pending was read already compiled it
+            node = self.find_node(children, pattern)
+            if node is not None and terminal[node] == pattern:
+                continue
+            while start != -1:
+                value = values.get(pattern, self.MISSING)
+                if value is not self.MISSING:
+                    yield start, pattern, value
+                start = text.find(pattern, start + 1)
+
+
+class IntentRouter:
+    """Routes a command to the highest-priority intent whose phrase it contains"""
+
+    def __init__(self):
+        self.automaton = PatternAutomaton()
+        self.intents = []
+        self.last_match = IntentMatch(None, None, 0.0)
+
+    def add_intent(self, name, phrases):
+        """Register an intent; earlier registrations take priority over later ones"""
+        priority = len(self.intents)
+        self.intents.append(name)
+
+        for phrase in phrases:
+            # A phrase shared by several intents belongs to the first one, like an elif chain
+            if phrase not in self.automaton:
+                self.automaton.add(phrase, priority)
+
+    def compile(self):
+        self.automaton.build()
+
+    def match(self, command):
+        """Return an IntentMatch for the command in a single scan"""
+        start = time.perf_counter()
+
+        best_priority = None
+        best_phrase = None
+        for _, phrase, priority in self.automaton.iter_matches(command):
+            if best_priority is None or priority < best_priority:
+                best_priority = priority
+                best_phrase = phrase
+                if priority == 0:
+                    break
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        intent = self.intents[best_priority] if best_priority is not None else None
+        self.last_match = IntentMatch(intent, best_phrase, elapsed_ms)
+        return self.last_match
+
+
+class TriggerIndex:
+    """Multi-pattern index over custom command triggers"""
+
+    def __init__(self, triggers=()):
+        self.automaton = PatternAutomaton()
+        for trigger in triggers:
+            self.add(trigger)
+
+    def __len__(self):
+        return len(self.automaton)
+
+    def __contains__(self, trigger):
+        return trigger in self.automaton
+
+    def add(self, trigger, priority=0):
+        self.automaton.add(trigger, priority)
+
+    def remove(self, trigger):
+        return self.automaton.remove(trigger)
+
+    def rebuild(self, triggers):
+        """Replace the whole index, e.g. after a bulk reload"""
+        self.automaton.clear()
+        for trigger in triggers:
+            self.add(trigger)
+        self.automaton.build()
+
+    def sync(self, triggers):
+        """Apply the difference between the index and the given trigger set"""
+        triggers = set(triggers)
+        current = set(self.automaton.values)
+        for trigger in current - triggers:
+            self.remove(trigger)
+        for trigger in triggers - current:
+            self.add(trigger)
+
+    def best_match(self, command):
+        """Return the highest-priority trigger in the command, longest first on ties"""
+        best = None
+        best_key = None
+        for _, trigger, priority in self.automaton.iter_matches(command):
+            key = (priority, len(trigger))
+            if best_key is None or key > best_key:
+                best = trigger
+                best_key = key
+        return best
+
+
+class LearnedPatternIndex:
+    """In-memory token n-gram index over the learned_patterns table
+
+    Patterns are whole-word prefixes taken from past commands, so a pattern is
+    "contained" in a command when its tokens appear consecutively. Lookups hash
+    every token n-gram of the command whose length matches a stored pattern,
+    which keeps them independent of how many patterns have been learned.
+    """
+
+    def __init__(self):
+        # pattern -> [response_template, confidence_score, success_rate, usage_count]
+        self.patterns = {}
+        self.length_counts = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __contains__(self, pattern):
+        return pattern in self.patterns
+
+    def load(self, cursor, batch_size=10000):
+        """Stream every row of learned_patterns into the index"""
+        cursor.execute(
+            "SELECT pattern, response_template, confidence_score, success_rate, usage_count FROM learned_patterns"
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for pattern, template, confidence, success_rate, usage_count in rows:
+                self.add(pattern, template, confidence, success_rate, usage_count)
+
+    def add(self, pattern, response_template, confidence_score, success_rate=0.0, usage_count=0):
+        if not pattern:
+            return
+        pattern = ' '.join(pattern.lower().split())
+        entry = [response_template, confidence_score or 0.0, success_rate or 0.0, usage_count or 0]
+
+        with self.lock:
+            existing = self.patterns.get(pattern)
+            if existing is None:
+                length = pattern.count(' ') + 1
+                self.length_counts[length] = self.length_counts.get(length, 0) + 1
+                self.patterns[pattern] = entry
+            elif existing[1] <= entry[1]:
+                # Keep the most confident template when the table holds duplicates
+                self.patterns[pattern] = entry
+
+    def update(self, pattern, success_rate=None, usage_count=None, confidence_score=None):
+        entry = self.patterns.get(pattern)
+        if entry is None:
+            return False
+        if confidence_score is not None:
+            entry[1] = confidence_score
+        if success_rate is not None:
+            entry[2] = success_rate
+        if usage_count is not None:
+            entry[3] = usage_count
+        return True
+
+    def get(self, pattern):
+        """Return (response_template, confidence_score, success_rate, usage_count) or None"""
+        entry = self.patterns.get(pattern)
+        return tuple(entry) if entry is not None else None
+
+    def remove(self, pattern):
+        with self.lock:
+            if self.patterns.pop(pattern, None) is None:
+                return False
+            length = pattern.count(' ') + 1
+            self.length_counts[length] -= 1
+            if not self.length_counts[length]:
+                del self.length_counts[length]
+            return True
+
+    def clear(self):
+        with self.lock:
+            self.patterns = {}
+            self.length_counts = {}
+
+    def best_match(self, command, min_confidence=0.0):
+        """Return (pattern, response_template, confidence_score) for the most confident contained pattern"""
+        tokens = command.split()
+        best = None
+        best_confidence = None
+
+        for length in list(self.length_counts):
+            for i in range(len(tokens) - length + 1):
+                key = ' '.join(tokens[i:i + length])
+                entry = self.patterns.get(key)
+                if entry is not None and (best_confidence is None or entry[1] > best_confidence):
+                    best = key
+                    best_confidence = entry[1]
+
+        if best is None or best_confidence < min_confidence:
+            return None
+        return best, self.patterns[best][0], best_confidence
+
+
+def trigrams(text):
+    """Character trigrams of each word, padded so short words still index"""
+    grams = set()
+    for word in text.lower().split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class FuzzyMatcher:
+    """Trigram index answering ranked "did you mean" suggestions
+
+    Candidates are gathered from the rarest query trigrams first until
+    scan_budget posting entries have been visited, so a lookup touches a
+    bounded number of entries however large the phrase table grows. The
+    survivors are then ranked by exact Dice similarity.
+    """
+
+    def __init__(self, scan_budget=3000, max_candidates=50, min_word_length=4):
+        self.scan_budget = scan_budget
+        self.max_candidates = max_candidates
+        self.min_word_length = min_word_length
+        self.postings = {}
+        self.phrases = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def __contains__(self, phrase):
+        return phrase in self.phrases
+
+    def add(self, phrase):
+        phrase = phrase.lower()
+        with self.lock:
+            if phrase in self.phrases:
+                return
+            grams = trigrams(phrase)
+            self.phrases[phrase] = grams
+            for gram in grams:
+                self.postings.setdefault(gram, set()).add(phrase)
+
+    def remove(self, phrase):
+        phrase = phrase.lower()
+        with self.lock:
+            grams = self.phrases.pop(phrase, None)
+            if grams is None:
+                return False
+            for gram in grams:
+                posting = self.postings.get(gram)
+                if posting is not None:
+                    posting.discard(phrase)
+                    if not posting:
+                        del self.postings[gram]
+            return True
+
+    def sync(self, phrases):
+        phrases = {phrase.lower() for phrase in phrases}
+        for phrase in set(self.phrases) - phrases:
+            self.remove(phrase)
+        for phrase in phrases - set(self.phrases):
+            self.add(phrase)
+
+    def suggest(self, text, k=3, min_score=0.3):
+        """Return up to k phrases most similar to the significant words of text"""
+        words = [word for word in text.lower().split() if len(word) >= self.min_word_length]
+        query = trigrams(' '.join(words))
+        if not query:
+            return []
+
+        postings = [self.postings[gram] for gram in query if gram in self.postings]
+        postings.sort(key=len)
+
+        counts = {}
+        budget = self.scan_budget
+        for posting in postings:
+            if len(posting) > budget:
+                if counts:
+                    break
+                # Every query trigram is common; sample the rarest posting instead
+                posting = islice(posting, budget)
+                budget = 0
+            else:
+                budget -= len(posting)
+            for phrase in posting:
+                counts[phrase] = counts.get(phrase, 0) + 1
+            if budget <= 0:
+                break
+
+        candidates = sorted(counts, key=counts.get, reverse=True)[:self.max_candidates]
+
+        scored = []
+        for phrase in candidates:
+            grams = self.phrases.get(phrase)
+            if not grams:
+                continue
+            score = 2 * len(query & grams) / (len(query) + len(grams))
+            if score >= min_score:
+                scored.append((score, phrase))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [phrase for _, phrase in scored[:k]]
+
+
+class SuggestionTrie:
+    """Prefix trie whose nodes cache their top-k phrases by weight
+
+    Each node is [children, top, weight, phrase]. Changing a phrase's weight
+    recomputes the cached lists bottom-up along its path only, so completion
+    is a walk down the prefix followed by a read of the cached list. Bulk
+    loads build a new trie without holding the lock and swap it in.
+    """
+
+    def __init__(self, k=5):
+        self.k = k
+        self.root = [{}, [], None, None]
+        self.weights = {}
+        self.changes = None  # (phrase, weight) updates made while a load is building
+        self.lock = threading.Lock()
+        self.load_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.weights)
+
+    def __contains__(self, phrase):
+        return phrase in self.weights
+
+    def set(self, phrase, weight):
+        if not phrase:
+            return
+        with self.lock:
+            self.update(phrase, weight)
+
+    def load(self, items):
+        """Bulk insert (phrase, weight) pairs; updates made meanwhile are replayed onto the new trie"""
+        with self.load_lock:
+            with self.lock:
+                weights = dict(self.weights)
+                self.changes = []
+            weights.update((phrase, weight) for phrase, weight in items if phrase)
+            root = self.build(weights)
+            with self.lock:
+                changes, self.changes = self.changes, None
+                self.root, self.weights = root, weights
+                for phrase, weight in changes:
+                    self.update(phrase, weight)
+
+    def build(self, weights):
+        """Build a trie in one pass; inserting in rank order means each node keeps its first k phrases"""
+        root = [{}, [], None, None]
+        k = self.k
+        for phrase, weight in sorted(weights.items(), key=lambda item: (-item[1], item[0])):
+            node = root
+            if len(node[1]) < k:
+                node[1].append((weight, phrase))
+            for ch in phrase:
+                child = node[0].get(ch)
+                if child is None:
+                    child = node[0][ch] = [{}, [], None, None]
+                node = child
+                if len(node[1]) < k:
+                    node[1].append((weight, phrase))
+            node[2] = weight
+            node[3] = phrase
+        return root
+
+    def increment(self, phrase, amount=1):
+        self.set(phrase, self.weights.get(phrase, 0) + amount)
+
+    def remove(self, phrase):
+        with self.lock:
+            if phrase not in self.weights:
+                if self.changes is not None:
+                    self.changes.append((phrase, None))  # It may be in the batch being loaded
+                return False
+            self.update(phrase, None)
+            return True
+
+    def update(self, phrase, weight):
+        """Set a phrase's weight, or remove it when weight is None; the caller holds the lock"""
+        if self.changes is not None:
+            self.changes.append((phrase, weight))
+        if weight is None:
+            self.weights.pop(phrase, None)
+        else:
+            self.weights[phrase] = weight
+
+        path = [self.root]
+        node = self.root
+        for ch in phrase:
+            child = node[0].get(ch)
+            if child is None:
+                if weight is None:
+                    return
+                child = node[0][ch] = [{}, [], None, None]
+            node = child
+            path.append(node)
+        node[2] = weight
+        node[3] = None if weight is None else phrase
+        self.refresh_path(path)
+
+    def refresh_path(self, path):
+        for node in reversed(path):
+            entries = []
+            if node[3] is not None:
+                entries.append((node[2], node[3]))
+            for child in node[0].values():
+                entries.extend(child[1])
+            node[1] = heapq.nsmallest(self.k, entries, key=lambda item: (-item[0], item[1]))
+
+    def complete(self, prefix, k=None):
+        """Return the highest-weighted phrases starting with prefix"""
+        node = self.root
+        for ch in prefix:
+            node = node[0].get(ch)
+            if node is None:
+                return []
+        return [phrase for _, phrase in node[1][:k or self.k]]
+
+
+# Applied to every connection; journal_mode is stored in the file, the rest are per connection
+SQLITE_PRAGMAS = [
+    ('journal_mode', 'WAL'),        # Readers never block the write-behind worker
+    ('synchronous', 'NORMAL'),      # Safe under WAL; a power cut can only drop the newest commits
+    ('cache_size', -16000),         # 16 MB page cache
+    ('mmap_size', 268435456),       # Read up to 256 MB through the OS page cache
+]
+
+
+# Sort keys for the COMMANDS tab; each has a covering index ending in trigger
+COMMAND_SORT_KEYS = {
+    'trigger': "trigger",
+    'action': "action_type",
+    'usage': "usage_count",
+    'last_used': "COALESCE(last_used, '')",
+}
+
+
+def command_page_sql(sort, clauses=(), keyset=False, descending=True):
+    """SELECT for one page of the COMMANDS tab
+
+    Parameters are the clause values, then (key, key, trigger) of the last
+    row on the previous page when keyset is set, then the page size.
+    """
+    expression = COMMAND_SORT_KEYS[sort]
+    clauses = list(clauses)
+    less, direction = ('<', 'DESC') if descending else ('>', 'ASC')
+    if keyset:
+        # (expression, trigger) < (?, ?) spelled out; SQLite won't range-search an expression index with a row value
+        clauses.append(f"{expression} {less}= ? AND ({expression} {less} ? OR trigger {less} ?)")
+    order = f"{expression} {direction}"
+    if expression != "trigger":
+        order += f", trigger {direction}"
+    where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+    return (f"SELECT trigger, action_type, usage_count, last_used, {expression} FROM custom_commands "
+            f"{where}ORDER BY {order} LIMIT ?")
+
+
+def tune_connection(conn):
+    """Apply SQLITE_PRAGMAS to a new connection and return it"""
+    for name, value in SQLITE_PRAGMAS:
+        conn.execute(f"PRAGMA {name}={value}").fetchall()
+    return conn
+
+
+class SchemaMigrator:
+    """Brings tetris_memory.db up to the latest schema through ordered migrations
+
+    Each migration runs in its own IMMEDIATE transaction together with the row
+    that records it in schema_migrations, so a crash leaves the previous
+    version intact and instances starting together apply each step once.
+    Migration 1 is the schema older releases created without a version, so
+    it is written to be a no-op on those databases.
+    """
+
+    MIGRATIONS = [
+        (1, "Core tables", [
+            '''CREATE TABLE IF NOT EXISTS custom_commands (
+                id INTEGER PRIMARY KEY,
+                trigger TEXT UNIQUE,
+                response TEXT,
+                action_type TEXT,
+                parameters TEXT,
+                usage_count INTEGER DEFAULT 0,
+                created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_used TIMESTAMP
+            )''',
+            '''CREATE TABLE IF NOT EXISTS user_preferences (
+                key TEXT PRIMARY KEY,
+                value TEXT,
+                updated_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )''',
+            '''CREATE TABLE IF NOT EXISTS conversation_memory (
+                id INTEGER PRIMARY KEY,
+                user_input TEXT,
+                tetris_response TEXT,
+                context TEXT,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                importance_score INTEGER DEFAULT 1
+            )''',
+            '''CREATE TABLE IF NOT EXISTS learned_patterns (
+                id INTEGER PRIMARY KEY,
+                pattern TEXT,
+                response_template TEXT,
+                confidence_score REAL,
+                success_rate REAL DEFAULT 0.0,
+                usage_count INTEGER DEFAULT 0
+            )''',
+        ]),
+        (2, "One learned pattern per phrase", [
+            # Duplicates all received the same updates; keep the most used, then the newest
+            '''DELETE FROM learned_patterns WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY pattern ORDER BY usage_count DESC, id DESC
+                    ) AS rank
+                    FROM learned_patterns WHERE pattern IS NOT NULL
+                ) WHERE rank > 1
+            )''',
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_learned_patterns_pattern ON learned_patterns (pattern)",
+        ]),
+        (3, "Timestamp and context indexes for conversation history", [
+            "CREATE INDEX IF NOT EXISTS idx_conversation_memory_timestamp ON conversation_memory (timestamp)",
+            "CREATE INDEX IF NOT EXISTS idx_conversation_memory_context ON conversation_memory (context)",
+        ]),
+        (4, "Covering indexes for the COMMANDS tab's sorted pages", [
+            "CREATE INDEX IF NOT EXISTS idx_custom_commands_lower ON custom_commands (lower(trigger))",
+            # Some databases already hold narrower indexes under these names
+            "DROP INDEX IF EXISTS idx_custom_commands_usage",
+            "DROP INDEX IF EXISTS idx_custom_commands_action",
+            "DROP INDEX IF EXISTS idx_custom_commands_last_used",
+            '''CREATE INDEX idx_custom_commands_trigger
+                ON custom_commands (trigger, action_type, usage_count, last_used)''',
+            '''CREATE INDEX idx_custom_commands_usage
+                ON custom_commands (usage_count, trigger, action_type, last_used)''',
+            '''CREATE INDEX idx_custom_commands_action
+                ON custom_commands (action_type, trigger, usage_count, last_used)''',
+            '''CREATE INDEX idx_custom_commands_last_used
+                ON custom_commands (COALESCE(last_used, ''), trigger, action_type, usage_count, last_used)''',
+        ]),
+        (5, "Command change log", [
+            # Every change to a command's definition is logged so running instances
+            # can apply just the changed rows; usage counters are deliberately not logged
+            '''CREATE TABLE IF NOT EXISTS custom_command_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                trigger TEXT,
+                operation TEXT,
+                changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )''',
+            '''CREATE TRIGGER IF NOT EXISTS custom_commands_log_insert AFTER INSERT ON custom_commands
+            BEGIN
+                INSERT INTO custom_command_changes (trigger, operation) VALUES (NEW.trigger, 'upsert');
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS custom_commands_log_update
+            AFTER UPDATE OF trigger, response, action_type, parameters ON custom_commands
+            BEGIN
+                INSERT INTO custom_command_changes (trigger, operation)
+                SELECT OLD.trigger, 'delete' WHERE OLD.trigger IS NOT NEW.trigger;
+                INSERT INTO custom_command_changes (trigger, operation) VALUES (NEW.trigger, 'upsert');
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS custom_commands_log_delete AFTER DELETE ON custom_commands
+            BEGIN
+                INSERT INTO custom_command_changes (trigger, operation) VALUES (OLD.trigger, 'delete');
+            END''',
+            "CREATE INDEX IF NOT EXISTS idx_custom_command_changes_changed_at ON custom_command_changes (changed_at)",
+        ]),
+    ]
+
+    # Queries run per command, per page or per flush, with representative parameters
+    HOT_QUERIES = [
+        ("custom command by trigger",
+         "SELECT response, action_type, parameters FROM custom_commands WHERE trigger = ?", ('hello',)),
+        ("custom commands by lowered trigger",
+         "SELECT trigger, response, action_type, parameters FROM custom_commands WHERE lower(trigger) IN (?, ?)",
+         ('hello', 'bye')),
+        ("usage counter flush",
+         "UPDATE custom_commands SET usage_count = usage_count + ?, last_used = ? WHERE trigger = ?",
+         (1, '2024-01-01 00:00:00', 'hello')),
+        ("command change log tail",
+         "SELECT seq, trigger, operation FROM custom_command_changes WHERE seq > ? ORDER BY seq", (0,)),
+        ("command change log pruning",
+         "DELETE FROM custom_command_changes WHERE changed_at < datetime('now', '-7 days')", ()),
+        ("learned pattern update",
+         "UPDATE learned_patterns SET success_rate = ?, usage_count = ? WHERE pattern = ?", (1.0, 2, 'hello there')),
+        ("transcript page",
+         "SELECT user_input, tetris_response, timestamp FROM conversation_memory "
+         "WHERE context = 'chat' ORDER BY id DESC LIMIT ? OFFSET ?", (200, 0)),
+        ("retention by age",
+         "SELECT id, user_input, tetris_response, context, timestamp, importance_score FROM conversation_memory "
+         "WHERE timestamp < datetime('now', ?) AND importance_score < ? ORDER BY timestamp LIMIT ?",
+         ('-30 days', 3, 5000)),
+    ] + [
+        query
+        for sort in COMMAND_SORT_KEYS
+        for query in [
+            (f"commands page sorted by {sort}", command_page_sql(sort), (200,)),
+            (f"next commands page sorted by {sort}", command_page_sql(sort, keyset=True), ('', '', '', 200)),
+            (f"filtered commands page sorted by {sort}",
+             command_page_sql(sort, ["lower(trigger) >= ? AND lower(trigger) < ?"], keyset=True),
+             ('a', 'b', '', '', '', 200)),
+        ]
+    ]
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def connect(self):
+        # Autocommit, so each migration controls its own transaction
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        return tune_connection(conn)
+
+    @classmethod
+    def latest_version(cls):
+        return cls.MIGRATIONS[-1][0]
+
+    def current_version(self, conn):
+        return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+    def migrate(self):
+        """Apply pending migrations in order and return the versions applied"""
+        applied = []
+        conn = self.connect()
+        try:
+            for version, description, statements in self.MIGRATIONS:
+                if version <= self.current_version(conn):
+                    continue
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Another instance may have applied it while we waited for the lock
+                    if version <= self.current_version(conn):
+                        conn.execute("ROLLBACK")
+                        continue
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute("INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                                 (version, description))
+                    conn.execute("COMMIT")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                applied.append(version)
+        finally:
+            conn.close()
+        return applied
+
+    def check_query_plans(self):
+        """Return (name, plan detail) for every hot query that scans a table instead of searching an index
+
+        A scan of a covering index is accepted for ORDER BY queries, where it
+        reads the first LIMIT rows in order without touching the table.
+        """
+        conn = self.connect()
+        try:
+            scans = []
+            for name, sql, params in self.HOT_QUERIES:
+                ordered = ' ORDER BY ' in sql
+                for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+                    detail = row[-1]
+                    if not detail.startswith('SCAN ') or 'CONSTANT ROW' in detail:
+                        continue
+                    if ordered and ' USING COVERING INDEX ' in detail:
+                        continue
+                    scans.append((name, detail))
+            return scans
+        finally:
+            conn.close()
+
+
+class PersistenceWorker:
+    """Write-behind SQLite writer that batches statements into transactions
+
+    Statements are queued from any thread and applied by a single worker on
+    its own connection. A batch is committed once batch_size statements have
+    been collected or flush_interval seconds have passed since the first one.
+    """
+
+    STOP = object()
+
+    def __init__(self, db_path, batch_size=200, flush_interval=0.25):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.stats_lock = threading.Lock()
+        self.batches = 0
+        self.writes = 0
+        self.errors = 0
+        self.last_commit_ms = 0.0
+        self.max_commit_ms = 0.0
+        self.total_commit_ms = 0.0
+        self.closed = False
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="tetris-persistence", daemon=True)
+        self.thread.start()
+        self.ready.wait(5)
+
+    def submit(self, sql, params=()):
+        """Queue a single statement"""
+        if self.closed:
+            raise RuntimeError("Persistence worker is closed")
+        self.queue.put((sql, params, False))
+
+    def submit_many(self, sql, rows):
+        """Queue a statement to run with executemany"""
+        if self.closed:
+            raise RuntimeError("Persistence worker is closed")
+        self.queue.put((sql, list(rows), True))
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far has been committed"""
+        if self.closed:
+            return True
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=10):
+        """Flush outstanding writes and stop the worker"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(self.STOP)
+        self.thread.join(timeout)
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'queue_depth': self.queue.qsize(),
+                'batches': self.batches,
+                'writes': self.writes,
+                'errors': self.errors,
+                'last_commit_ms': self.last_commit_ms,
+                'max_commit_ms': self.max_commit_ms,
+                'avg_commit_ms': self.total_commit_ms / self.batches if self.batches else 0.0,
+            }
+
+    def run(self):
+        conn = tune_connection(sqlite3.connect(self.db_path, check_same_thread=False, timeout=30))
+        self.ready.set()
+
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            batch = []
+            waiters = []
+            deadline = time.monotonic() + self.flush_interval
+
+            while True:
+                if item is self.STOP:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+
+                if stopping or waiters or len(batch) >= self.batch_size:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+
+            if stopping:
+                # Drain anything queued behind the stop marker
+                while True:
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                    elif item is not self.STOP:
+                        batch.append(item)
+
+            if batch:
+                self.commit_batch(conn, batch)
+            for waiter in waiters:
+                waiter.set()
+
+        conn.close()
+
+    def commit_batch(self, conn, batch):
+        start = time.perf_counter()
+        errors = 0
+        try:
+            with conn:
+                for sql, params, many in batch:
+                    try:
+                        if many:
+                            conn.executemany(sql, params)
+                        else:
+                            conn.execute(sql, params)
+                    except sqlite3.Error as e:
+                        errors += 1
+                        print(f"Persistence error: {e}")
+        except sqlite3.Error as e:
+            errors += len(batch)
+            print(f"Persistence commit error: {e}")
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self.stats_lock:
+            self.batches += 1
+            self.writes += len(batch)
+            self.errors += errors
+            self.last_commit_ms = elapsed_ms
+            self.max_commit_ms = max(self.max_commit_ms, elapsed_ms)
+            self.total_commit_ms += elapsed_ms
+
+
+class UsageCounters:
+    """Custom command usage held in memory and flushed in batches
+
+    Each hit updates the live totals and is appended to this instance's
+    journal. Every flush_interval seconds the journal is rotated and the
+    pending deltas are written with one executemany, in the same transaction
+    that records the rotated journal's generation. Journals left behind by a
+    crashed instance are replayed by the next one to start, skipping any
+    generation already committed, so hits are neither lost nor counted twice.
+    A journal belongs to a running instance while the pid in its id is alive
+    and the owner's flush thread keeps touching it.
+    """
+
+    UPDATE_SQL = "UPDATE custom_commands SET usage_count = usage_count + ?, last_used = ? WHERE trigger = ?"
+    instances = count()  # Keeps journals apart when one process opens several engines
+
+    def __init__(self, db_path, flush_interval=5.0):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        # The flush thread touches the journal every tick, so a live instance's is never this old
+        self.stale_after = max(60.0, flush_interval * 10)
+        self.directory = os.path.dirname(os.path.abspath(db_path))
+        self.prefix = f"{os.path.basename(db_path)}-usage-"
+        self.journal_id = f"{os.getpid()}-{int(time.time())}-{next(self.instances)}"
+        self.journal_path = os.path.join(self.directory, f"{self.prefix}{self.journal_id}.journal")
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.totals = {}   # lower-case trigger -> [stored trigger, usage_count, last_used]
+        self.pending = {}  # stored trigger -> [delta, last_used]
+        self.generation = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.conn = tune_connection(sqlite3.connect(db_path, check_same_thread=False, timeout=30))
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS usage_journal_state (
+                journal TEXT PRIMARY KEY,
+                generation INTEGER
+            )
+        ''')
+        self.conn.commit()
+        self.recover()
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="tetris-usage", daemon=True)
+        self.thread.start()
+
+    def journals(self):
+        """Map journal id -> (live journal path or None, [(generation, rotated path)])"""
+        found = {}
+        for entry in os.listdir(self.directory):
+            if not entry.startswith(self.prefix):
+                continue
+            journal_id, _, rest = entry[len(self.prefix):].partition('.journal')
+            live, rotated = found.setdefault(journal_id, [None, []])
+            path = os.path.join(self.directory, entry)
+            if not rest:
+                found[journal_id][0] = path
+            elif rest[1:].isdigit():
+                rotated.append((int(rest[1:]), path))
+        return {journal_id: (live, sorted(rotated)) for journal_id, (live, rotated) in found.items()}
+
+    @staticmethod
+    def owner_running(journal_id):
+        """Whether the process that created journal_id may still be running"""
+        try:
+            pid = int(journal_id.split('-', 1)[0])
+        except ValueError:
+            return False
+        if os.name == 'nt':
+            return True  # os.kill would terminate the process; the heartbeat alone decides
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            return True  # Running under another user
+        return True
+
+    def recover(self):
+        """Replay journals of instances that stopped without flushing"""
+        stale = time.time() - self.stale_after
+        for journal_id, (live, rotated) in self.journals().items():
+            paths = ([live] if live else []) + [path for _, path in rotated]
+            try:
+                if journal_id == self.journal_id:
+                    continue
+                # A reused pid can look alive, so a silent heartbeat still marks the journal abandoned
+                if self.owner_running(journal_id) and any(os.path.getmtime(path) > stale for path in paths):
+                    continue  # Still owned by a running instance
+                self.replay(journal_id)
+            except (OSError, sqlite3.Error) as e:
+                print(f"Usage journal recovery error: {e}")
+
+    def replay(self, journal_id):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-list under the write lock in case another instance just recovered it
+            live, rotated = self.journals().get(journal_id, (None, []))
+            row = self.conn.execute("SELECT generation FROM usage_journal_state WHERE journal = ?",
+                                    (journal_id,)).fetchone()
+            applied = row[0] if row else 0
+            generation = max([applied] + [rotated_generation for rotated_generation, _ in rotated])
+            if live:
+                # Give the live journal a generation so the marker covers it too
+                generation += 1
+                rotated.append((generation, f"{live}.{generation}"))
+                os.replace(live, rotated[-1][1])
+
+            deltas = {}
+            for rotated_generation, path in rotated:
+                if rotated_generation <= applied:
+                    continue
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            trigger, used_at = json.loads(line)
+                        except ValueError:
+                            continue  # Torn final line from the crash
+                        entry = deltas.setdefault(trigger, [0, used_at])
+                        entry[0] += 1
+                        entry[1] = max(entry[1], used_at)
+
+            self.conn.executemany(self.UPDATE_SQL, [(delta, used_at, trigger)
+                                                   for trigger, (delta, used_at) in deltas.items()])
+            self.conn.execute("INSERT OR REPLACE INTO usage_journal_state (journal, generation) VALUES (?, ?)",
+                              (journal_id, generation))
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+
+        for _, path in rotated:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self.conn:
+            self.conn.execute("DELETE FROM usage_journal_state WHERE journal = ?", (journal_id,))
+        if deltas:
+            print(f"Recovered {sum(delta for delta, _ in deltas.values())} command uses from a usage journal")
+
+    def load(self, rows):
+        """Seed live totals from (trigger, usage_count, last_used) rows"""
+        with self.lock:
+            for trigger, usage_count, last_used in rows:
+                self.totals[trigger.lower()] = [trigger, usage_count or 0, last_used]
+
+    def track(self, trigger):
+        """Start counting a command added after load"""
+        with self.lock:
+            entry = self.totals.get(trigger.lower())
+            if entry is None:
+                self.totals[trigger.lower()] = [trigger, 0, None]
+            else:
+                entry[0] = trigger
+
+    def forget(self, trigger):
+        with self.lock:
+            self.totals.pop(trigger.lower(), None)
+
+    def hit(self, trigger):
+        """Count one use of a lower-case trigger; returns (usage_count, last_used)"""
+        used_at = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        with self.lock:
+            entry = self.totals.setdefault(trigger, [trigger, 0, None])
+            entry[1] += 1
+            entry[2] = used_at
+            pending = self.pending.setdefault(entry[0], [0, used_at])
+            pending[0] += 1
+            pending[1] = used_at
+            try:
+                self.journal.write(json.dumps([entry[0], used_at]) + "\n")
+                self.journal.flush()
+            except (OSError, ValueError) as e:
+                # The hit is still pending in memory; only its crash protection is lost
+                print(f"Usage journal write error: {e}")
+            return entry[1], entry[2]
+
+    def get(self, trigger):
+        with self.lock:
+            entry = self.totals.get(trigger.lower())
+            return (entry[1], entry[2]) if entry else (0, None)
+
+    def entry(self, trigger):
+        """(stored trigger, usage_count, last_used) or None if the trigger isn't tracked"""
+        with self.lock:
+            entry = self.totals.get(trigger.lower())
+            return tuple(entry) if entry else None
+
+    def snapshot(self):
+        """Live (stored trigger, usage_count, last_used) for every tracked command"""
+        with self.lock:
+            return [tuple(entry) for entry in self.totals.values()]
+
+    def flush(self):
+        """Write pending deltas in one transaction and retire their journal"""
+        with self.flush_lock:
+            with self.lock:
+                if not self.pending:
+                    return 0
+                generation = self.generation + 1
+                self.journal.close()
+                try:
+                    os.replace(self.journal_path, f"{self.journal_path}.{generation}")
+                except OSError as e:
+                    # Keep the hits pending and journaling; the next flush tries again
+                    print(f"Usage journal rotation error: {e}")
+                    self.journal = open(self.journal_path, 'a', encoding='utf-8')
+                    return 0
+                self.journal = open(self.journal_path, 'a', encoding='utf-8')
+                self.generation = generation
+                batch, self.pending = self.pending, {}
+
+            start = time.perf_counter()
+            try:
+                with self.conn:
+                    self.conn.executemany(self.UPDATE_SQL, [(delta, used_at, trigger)
+                                                           for trigger, (delta, used_at) in batch.items()])
+                    self.conn.execute("INSERT OR REPLACE INTO usage_journal_state (journal, generation) VALUES (?, ?)",
+                                      (self.journal_id, generation))
+            except sqlite3.Error as e:
+                print(f"Usage flush error: {e}")
+                # Retry with the next flush; its generation also covers this rotated journal
+                with self.lock:
+                    for trigger, (delta, used_at) in batch.items():
+                        pending = self.pending.setdefault(trigger, [0, used_at])
+                        pending[0] += delta
+                        pending[1] = max(pending[1], used_at)
+                return 0
+
+            self.flushes += 1
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+            for rotated, path in self.journals().get(self.journal_id, (None, []))[1]:
+                if rotated <= generation:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+            return len(batch)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'tracked': len(self.totals),
+                'pending_commands': len(self.pending),
+                'pending_hits': sum(delta for delta, _ in self.pending.values()),
+                'flushes': self.flushes,
+                'last_flush_ms': self.last_flush_ms,
+            }
+
+    def run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+                os.utime(self.journal_path)  # Heartbeat, even when no commands were used
+            except Exception as e:
+                print(f"Usage flush error: {e}")
+
+    def close(self):
+        """Flush outstanding hits and remove this instance's journal"""
+        self.stop_event.set()
+        self.thread.join(self.flush_interval + 1)
+        self.flush()
+        with self.lock:
+            self.journal.close()
+            if not self.pending:
+                try:
+                    os.remove(self.journal_path)
+                except FileNotFoundError:
+                    pass
+                with self.conn:
+                    self.conn.execute("DELETE FROM usage_journal_state WHERE journal = ?", (self.journal_id,))
+        self.conn.close()
+
+
+class RetentionManager:
+    """Keeps conversation_memory small by rolling up and archiving old turns
+
+    Rows older than max_age_days, or beyond the newest max_rows, are written
+    to one gzip JSON-lines archive per day, counted into conversation_daily
+    and deleted. Rows with importance_score >= keep_importance are never
+    archived. Archives stay searchable through search_archive.
+    """
+
+    def __init__(self, db_path, archive_dir="tetris_archive", max_age_days=30, max_rows=50000,
+                 keep_importance=3, chunk_size=5000):
+        self.db_path = db_path
+        self.archive_dir = Path(archive_dir)
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.keep_importance = keep_importance
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+
+    def connect(self):
+        conn = tune_connection(sqlite3.connect(self.db_path, timeout=30))
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS conversation_daily (
+                day TEXT PRIMARY KEY,
+                messages INTEGER DEFAULT 0,
+                user_turns INTEGER DEFAULT 0,
+                response_turns INTEGER DEFAULT 0,
+                importance_total INTEGER DEFAULT 0
+            )
+        ''')
+        return conn
+
+    def run(self):
+        """Apply the retention policies once and return a summary"""
+        with self.lock:
+            conn = self.connect()
+            try:
+                archived = self.archive_where(
+                    conn,
+                    "timestamp < datetime('now', ?) AND importance_score < ?",
+                    (f"-{int(self.max_age_days)} days", self.keep_importance),
+                    order="timestamp"  # Walks idx_conversation_memory_timestamp instead of the whole table
+                ) if self.max_age_days else 0
+
+                overflow = 0
+                if self.max_rows:
+                    total = conn.execute("SELECT COUNT(*) FROM conversation_memory").fetchone()[0]
+                    excess = total - self.max_rows
+                    if excess > 0:
+                        # Oldest archivable rows go first; important rows may keep the table above max_rows
+                        cutoff = conn.execute(
+                            "SELECT id FROM conversation_memory WHERE importance_score < ? ORDER BY id LIMIT 1 OFFSET ?",
+                            (self.keep_importance, excess - 1)
+                        ).fetchone()
+                        if cutoff:
+                            overflow = self.archive_where(
+                                conn, "id <= ? AND importance_score < ?", (cutoff[0], self.keep_importance)
+                            )
+
+                remaining = conn.execute("SELECT COUNT(*) FROM conversation_memory").fetchone()[0]
+                return {'archived': archived + overflow, 'remaining': remaining}
+            finally:
+                conn.close()
+
+    def archive_where(self, conn, condition, params, order="id"):
+        archived = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, user_input, tetris_response, context, timestamp, importance_score "
+                f"FROM conversation_memory WHERE {condition} ORDER BY {order} LIMIT ?",
+                params + (self.chunk_size,)
+            ).fetchall()
+            if not rows:
+                return archived
+
+            by_day = {}
+            for row in rows:
+                day = (row[4] or "")[:10] or "undated"
+                by_day.setdefault(day, []).append(row)
+
+            # Archive files are written before the rows are deleted so a crash never loses history
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+            for day, day_rows in by_day.items():
+                with gzip.open(self.archive_path(day), "at", encoding="utf-8") as f:
+                    for row_id, user_input, response, context, timestamp, importance in day_rows:
+                        f.write(json.dumps({
+                            'id': row_id,
+                            'user_input': user_input,
+                            'tetris_response': response,
+                            'context': context,
+                            'timestamp': timestamp,
+                            'importance_score': importance
+                        }) + "\n")
+
+            with conn:
+                for day, day_rows in by_day.items():
+                    conn.execute(
+                        "INSERT INTO conversation_daily (day, messages, user_turns, response_turns, importance_total) "
+                        "VALUES (?, ?, ?, ?, ?) ON CONFLICT(day) DO UPDATE SET "
+                        "messages = messages + excluded.messages, user_turns = user_turns + excluded.user_turns, "
+                        "response_turns = response_turns + excluded.response_turns, "
+                        "importance_total = importance_total + excluded.importance_total",
+                        (
+                            day,
+                            len(day_rows),
+                            sum(1 for row in day_rows if row[1]),
+                            sum(1 for row in day_rows if row[2]),
+                            sum(row[5] or 0 for row in day_rows)
+                        )
+                    )
+                conn.executemany("DELETE FROM conversation_memory WHERE id = ?", [(row[0],) for row in rows])
+            archived += len(rows)
+
+    def archive_path(self, day):
+        return self.archive_dir / f"conversation-{day}.jsonl.gz"
+
+    def search_archive(self, text=None, start_day=None, end_day=None):
+        """Yield archived turns, optionally filtered by text and day range (YYYY-MM-DD)"""
+        if not self.archive_dir.exists():
+            return
+        text = text.lower() if text else None
+        for path in sorted(self.archive_dir.glob("conversation-*.jsonl.gz")):
+            day = path.name[len("conversation-"):-len(".jsonl.gz")]
+            if (start_day and day < start_day) or (end_day and day > end_day):
+                continue
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if text and text not in (record['user_input'] or "").lower() \
+                            and text not in (record['tetris_response'] or "").lower():
+                        continue
+                    yield record
+
+    def daily_rollup(self, limit=30):
+        conn = self.connect()
+        try:
+            return conn.execute(
+                "SELECT day, messages, user_turns, response_turns, importance_total "
+                "FROM conversation_daily ORDER BY day DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        finally:
+            conn.close()
+
+
+class CommandExecutor:
+    """Bounded worker pool that runs command handlers off the UI thread"""
+
+    def __init__(self, max_workers=4, max_pending=32):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tetris-command")
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule fn and return its Future; raises RuntimeError when the queue is full"""
+        if not self.slots.acquire(blocking=False):
+            raise RuntimeError("Command queue is full")
+
+        with self.lock:
+            self.pending += 1
+        try:
+            future = self.pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self.release()
+            raise
+        future.add_done_callback(lambda _: self.release())
+        return future
+
+    def release(self):
+        with self.lock:
+            self.pending -= 1
+        self.slots.release()
+
+    def shutdown(self, wait=False):
+        self.pool.shutdown(wait=wait, cancel_futures=True)
+
+
+class MainThreadDispatcher:
+    """Queue of calls that must run on the Tk thread, drained by a periodic pump"""
+
+    def __init__(self):
+        self.calls = queue.Queue()
+        self.main_thread = threading.current_thread()
+
+    def call(self, fn, *args, timeout=None, **kwargs):
+        """Run fn on the main thread and wait for its result
+
+        On timeout the call is withdrawn if it hasn't started, so a dialog
+        never opens after its caller gave up; one already open is left alone
+        and its result discarded.
+        """
+        if threading.current_thread() is self.main_thread:
+            return fn(*args, **kwargs)
+
+        future = Future()
+        self.calls.put((future, fn, args, kwargs))
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def post(self, fn, *args, **kwargs):
+        """Queue fn for the main thread without waiting for it"""
+        future = Future()
+        self.calls.put((future, fn, args, kwargs))
+        return future
+
+    def pump(self, limit=50):
+        """Execute queued calls; must be invoked from the main thread"""
+        for _ in range(limit):
+            try:
+                future, fn, args, kwargs = self.calls.get_nowait()
+            except queue.Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+
+
+class SystemMetricsSampler:
+    """Background psutil sampler keeping recent snapshots in a ring buffer
+
+    CPU usage comes from psutil's non-blocking cpu_percent, which measures
+    the time since the previous sample, and network/disk throughput is
+    computed from counter deltas, so no request ever waits on a measurement.
+    """
+
+    def __init__(self, interval=2.0, history=300, disk_path=None):
+        self.interval = interval
+        self.history = deque(maxlen=history)
+        self.disk_path = disk_path or os.path.abspath(os.sep)
+        self.static = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.sample_cost_ms = 0.0
+        self.previous = None
+        self.error = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        try:
+            import psutil
+        except ImportError:
+            self.error = "psutil not installed"
+            raise
+        try:
+            self.psutil = psutil
+            freq = psutil.cpu_freq()
+            self.static = {
+                'cpu_count': psutil.cpu_count(),
+                'cpu_physical': psutil.cpu_count(logical=False),
+                'cpu_freq_max': freq.max if freq else 0.0,
+                'boot_time': psutil.boot_time(),
+            }
+            psutil.cpu_percent(interval=None)  # Prime the CPU counter
+            self.sample()
+        except Exception as e:
+            self.error = str(e)
+            raise
+        self.thread = threading.Thread(target=self.run, name="tetris-metrics", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Metrics sampling error: {e}")
+
+    def sample(self):
+        start = time.perf_counter()
+        psutil = self.psutil
+        now = time.time()
+        net = psutil.net_io_counters()
+        try:
+            disk_io = psutil.disk_io_counters()
+        except Exception:
+            disk_io = None
+        freq = psutil.cpu_freq()
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        disk = psutil.disk_usage(self.disk_path)
+
+        snapshot = {
+            'time': now,
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'cpu_freq': freq.current if freq else 0.0,
+            'memory_total': memory.total,
+            'memory_available': memory.available,
+            'memory_used': memory.used,
+            'memory_percent': memory.percent,
+            'swap_total': swap.total,
+            'swap_used': swap.used,
+            'disk_total': disk.total,
+            'disk_free': disk.free,
+            'disk_used': disk.used,
+            'disk_percent': disk.percent,
+            'net_bytes_sent': net.bytes_sent,
+            'net_bytes_recv': net.bytes_recv,
+            'net_packets_sent': net.packets_sent,
+            'net_packets_recv': net.packets_recv,
+            'disk_read_bytes': disk_io.read_bytes if disk_io else 0,
+            'disk_write_bytes': disk_io.write_bytes if disk_io else 0,
+            'net_send_rate': 0.0,
+            'net_recv_rate': 0.0,
+            'disk_read_rate': 0.0,
+            'disk_write_rate': 0.0,
+        }
+
+        previous = self.previous
+        if previous is not None:
+            elapsed = now - previous['time']
+            if elapsed > 0:
+                for rate, counter in (('net_send_rate', 'net_bytes_sent'), ('net_recv_rate', 'net_bytes_recv'),
+                                      ('disk_read_rate', 'disk_read_bytes'), ('disk_write_rate', 'disk_write_bytes')):
+                    snapshot[rate] = max(0, snapshot[counter] - previous[counter]) / elapsed
+
+        self.previous = snapshot
+        self.history.append(snapshot)
+        self.sample_cost_ms = (time.perf_counter() - start) * 1000
+        return snapshot
+
+    def latest(self):
+        """Most recent snapshot merged with static system information"""
+        if not self.history:
+            return None
+        snapshot = dict(self.history[-1])
+        snapshot.update(self.static)
+        return snapshot
+
+    def unavailable_reason(self):
+        """Why no snapshot is coming, or None once sampling has started"""
+        if self.thread is None:
+            return self.error or "sampler not started"
+        return None
+
+    def recent(self, count=60):
+        return list(self.history)[-count:]
+
+    def overhead_percent(self):
+        """Share of one core spent sampling"""
+        return self.sample_cost_ms / (self.interval * 1000) * 100
+
+
+class WeatherClient:
+    """Cached wttr.in client with pooled connections and stale-while-revalidate
+
+    Results are cached per location in memory and in the weather_cache table.
+    Fresh entries are served directly, stale ones are served immediately
+    while a background refresh runs, and concurrent requests for the same
+    location share a single fetch.
+    """
+
+    def __init__(self, db_path, base_url="http://wttr.in", ttl=600, stale_ttl=24 * 60 * 60,
+                 timeout=5, session=None):
+        self.db_path = db_path
+        self.base_url = base_url.rstrip('/')
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.timeout = timeout
+        self.session = session
+        self.cache = {}
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+        self.conn = tune_connection(sqlite3.connect(db_path, check_same_thread=False, timeout=30))
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS weather_cache (
+                location TEXT PRIMARY KEY,
+                report TEXT,
+                fetched_at REAL
+            )
+        ''')
+        self.conn.commit()
+        for location, report, fetched_at in self.conn.execute("SELECT location, report, fetched_at FROM weather_cache"):
+            self.cache[location] = (report, fetched_at)
+
+    def get_session(self):
+        if self.session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self.session = session
+        return self.session
+
+    def url_for(self, location):
+        if location == "current location":
+            return f"{self.base_url}/?format=3"
+        return f"{self.base_url}/{location}?format=3"
+
+    def get(self, location):
+        """Return (report, fetched_at, is_stale) for a location"""
+        key = location.lower().strip()
+        entry = self.cache.get(key)
+        now = time.time()
+
+        if entry is not None:
+            age = now - entry[1]
+            if age < self.ttl:
+                return entry[0], entry[1], False
+            if age < self.stale_ttl:
+                self.fetch_async(key)
+                return entry[0], entry[1], True
+
+        report, fetched_at = self.fetch_async(key).result(self.timeout * 2)
+        return report, fetched_at, False
+
+    def fetch_async(self, key):
+        """Start a fetch for key unless one is already running, and return its Future"""
+        with self.lock:
+            future = self.inflight.get(key)
+            if future is not None:
+                return future
+            future = Future()
+            self.inflight[key] = future
+
+        def fetch_thread():
+            try:
+                future.set_result(self.fetch(key))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    self.inflight.pop(key, None)
+
+        threading.Thread(target=fetch_thread, name="tetris-weather", daemon=True).start()
+        return future
+
+    def fetch(self, key):
+        response = self.get_session().get(self.url_for(key), timeout=self.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"weather service returned HTTP {response.status_code}")
+
+        report = response.text.strip()
+        fetched_at = time.time()
+        self.cache[key] = (report, fetched_at)
+        with self.db_lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO weather_cache (location, report, fetched_at) VALUES (?, ?, ?)",
+                (key, report, fetched_at)
+            )
+            self.conn.commit()
+        return report, fetched_at
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+        with self.db_lock:
+            self.conn.close()
+
+
+class SpeechWorker:
+    """Single text-to-speech thread fed by a priority queue
+
+    The engine is created by engine_factory on the worker thread and is only
+    ever touched there. Utterances are spoken urgent first, then normal, then
+    whisper. An urgent utterance stops a lower priority one at its next word
+    boundary, identical queued text is coalesced, and normal/whisper text that
+    waited longer than its max_age is dropped instead of being read out late.
+    """
+
+    PRIORITIES = {'urgent': 0, 'normal': 1, 'whisper': 2}
+    VOICE_SETTINGS = {'urgent': (180, 1.0), 'normal': (165, 0.9), 'whisper': (150, 0.6)}
+
+    def __init__(self, engine_factory, max_pending=5, max_age=None, tracer=None, on_ready=None):
+        self.engine_factory = engine_factory
+        self.max_pending = max_pending
+        self.max_age = max_age or {'urgent': None, 'normal': 15.0, 'whisper': 5.0}
+        self.tracer = tracer
+        self.on_ready = on_ready
+        self.heap = []
+        self.sequence = 0
+        self.condition = threading.Condition()
+        self.engine = None
+        self.available = False
+        self.ready = threading.Event()
+        self.closed = False
+        self.current_rank = None
+        self.current_queued_at = None
+        self.first_audio_pending = False
+        self.preempt = threading.Event()
+        self.first_audio_ms = deque(maxlen=200)
+        self.spoken = 0
+        self.preempted = 0
+        self.coalesced = 0
+        self.dropped_stale = 0
+        self.evicted = 0
+        self.errors = 0
+        self.thread = threading.Thread(target=self.run, name="tetris-speech", daemon=True)
+        self.thread.start()
+
+    def say(self, text, priority="normal"):
+        """Queue text; returns False once the worker is closed or the engine is offline"""
+        if priority not in self.PRIORITIES:
+            priority = "normal"
+        rank = self.PRIORITIES[priority]
+        with self.condition:
+            if self.closed or (self.ready.is_set() and not self.available):
+                return False
+
+            for i, item in enumerate(self.heap):
+                if item[3] == text:
+                    if rank < item[0]:
+                        self.heap[i] = (rank, item[1], item[2], text, priority)
+                        heapq.heapify(self.heap)
+                    self.coalesced += 1
+                    break
+            else:
+                self.sequence += 1
+                heapq.heappush(self.heap, (rank, self.sequence, time.monotonic(), text, priority))
+                if len(self.heap) > self.max_pending:
+                    # Shed the oldest utterance of the lowest priority present
+                    victim = max(self.heap, key=lambda item: (item[0], -item[1]))
+                    self.heap.remove(victim)
+                    heapq.heapify(self.heap)
+                    self.evicted += 1
+
+            if self.current_rank is not None and rank < self.current_rank and priority == "urgent":
+                self.preempt.set()
+            self.condition.notify()
+        return True
+
+    def clear(self):
+        """Drop everything still waiting to be spoken"""
+        with self.condition:
+            self.heap.clear()
+
+    def close(self, timeout=2):
+        with self.condition:
+            self.closed = True
+            self.heap.clear()
+            self.preempt.set()
+            self.condition.notify()
+        self.thread.join(timeout)
+
+    def stats(self):
+        with self.condition:
+            samples = sorted(self.first_audio_ms)
+            return {
+                'available': self.available,
+                'queue_length': len(self.heap),
+                'speaking': self.current_rank is not None,
+                'spoken': self.spoken,
+                'preempted': self.preempted,
+                'coalesced': self.coalesced,
+                'dropped_stale': self.dropped_stale,
+                'evicted': self.evicted,
+                'errors': self.errors,
+                'first_audio_p50_ms': samples[len(samples) // 2] if samples else 0.0,
+                'first_audio_p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else 0.0,
+                'first_audio_last_ms': self.first_audio_ms[-1] if samples else 0.0,
+            }
+
+    def run(self):
+        try:
+            self.engine = self.engine_factory()
+            self.engine.connect('started-utterance', self.on_utterance_started)
+            self.engine.connect('started-word', self.on_word_started)
+            self.available = True
+        except Exception as e:
+            print(f"TTS Error: {e}")
+            self.available = False
+            with self.condition:
+                self.heap.clear()
+
+        self.ready.set()
+        if self.on_ready:
+            self.on_ready(self.available)
+        if not self.available:
+            return
+
+        while True:
+            with self.condition:
+                while not self.heap and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                rank, _, queued_at, text, priority = heapq.heappop(self.heap)
+                max_age = self.max_age.get(priority)
+                if max_age is not None and time.monotonic() - queued_at > max_age:
+                    self.dropped_stale += 1
+                    continue
+                self.current_rank = rank
+                self.current_queued_at = queued_at
+                self.first_audio_pending = True
+                self.preempt.clear()
+
+            try:
+                rate, volume = self.VOICE_SETTINGS[priority]
+                self.engine.setProperty('rate', rate)
+                self.engine.setProperty('volume', volume)
+                self.engine.say(text)
+                self.engine.runAndWait()
+                with self.condition:
+                    self.spoken += 1
+            except Exception as e:
+                with self.condition:
+                    self.errors += 1
+                print(f"Speech error: {e}")
+            finally:
+                with self.condition:
+                    self.current_rank = None
+
+    def on_utterance_started(self, name):
+        if not self.first_audio_pending:
+            return
+        self.first_audio_pending = False
+        elapsed_ms = (time.monotonic() - self.current_queued_at) * 1000
+        self.first_audio_ms.append(elapsed_ms)
+        if self.tracer is not None:
+            self.tracer.record('speech.time_to_first_audio', elapsed_ms)
+
+    def on_word_started(self, name, location, length):
+        # Stopping from inside a driver callback is the only thread-safe way to interrupt pyttsx3
+        if self.preempt.is_set():
+            self.preempt.clear()
+            self.preempted += 1
+            self.engine.stop()
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of latencies in milliseconds
+
+    Values are recorded in microseconds into buckets that double in width
+    every power of two and are split into sub_buckets linear steps, which
+    keeps the relative error under 1/sub_buckets at any magnitude.
+    """
+
+    PROMETHEUS_BOUNDS_MS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500,
+                            1000, 2500, 5000, 10000]
+
+    def __init__(self, sub_buckets=32):
+        self.sub_buckets = sub_buckets
+        self.sub_bits = sub_buckets.bit_length() - 1
+        self.counts = {}
+        # Exact counts per Prometheus bound; log-linear buckets can straddle a bound
+        self.bound_counts = [0] * (len(self.PROMETHEUS_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = 0.0
+        self.lock = threading.Lock()
+
+    def bucket_index(self, micros):
+        if micros < self.sub_buckets:
+            return micros
+        exponent = micros.bit_length() - self.sub_bits - 1
+        return (exponent + 1) * self.sub_buckets + ((micros >> exponent) - self.sub_buckets)
+
+    def bucket_upper_ms(self, index):
+        """Highest value (in ms) that lands in a bucket"""
+        if index < self.sub_buckets:
+            return (index + 1) / 1000
+        exponent = index // self.sub_buckets - 1
+        step = index % self.sub_buckets + self.sub_buckets
+        return ((step + 1) << exponent) / 1000
+
+    def record(self, value_ms):
+        micros = max(0, int(value_ms * 1000))
+        index = self.bucket_index(micros)
+        slot = bisect_left(self.PROMETHEUS_BOUNDS_MS, value_ms)
+        with self.lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.bound_counts[slot] += 1
+            self.count += 1
+            self.total_ms += value_ms
+            self.max_ms = max(self.max_ms, value_ms)
+            self.min_ms = value_ms if self.min_ms is None else min(self.min_ms, value_ms)
+
+    def percentile(self, fraction):
+        with self.lock:
+            if not self.count:
+                return 0.0
+            target = max(1, int(round(self.count * fraction)))
+            seen = 0
+            for index in sorted(self.counts):
+                seen += self.counts[index]
+                if seen >= target:
+                    return min(self.bucket_upper_ms(index), self.max_ms)
+            return self.max_ms
+
+    def cumulative_buckets(self):
+        """Prometheus-style cumulative counts of values at or below each of PROMETHEUS_BOUNDS_MS"""
+        with self.lock:
+            bound_counts = list(self.bound_counts)
+        result = []
+        total = 0
+        for hits in bound_counts[:-1]:
+            total += hits
+            result.append(total)
+        return result
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum_ms': self.total_ms,
+            'min_ms': self.min_ms or 0.0,
+            'max_ms': self.max_ms,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+        }
+
+
+class Tracer:
+    """Collects span timings into per-name latency histograms"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def record(self, name, value_ms):
+        if self.enabled:
+            self.histogram(name).record(value_ms)
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def snapshot(self):
+        return {name: self.histograms[name].summary() for name in sorted(self.histograms)}
+
+    def export_json(self):
+        return json.dumps({'generated_at': time.time(), 'spans': self.snapshot()}, indent=2)
+
+    def export_prometheus(self):
+        bounds = LatencyHistogram.PROMETHEUS_BOUNDS_MS
+        lines = [
+            "# HELP tetris_span_latency_ms Latency of T.E.T.R.I.S pipeline spans in milliseconds",
+            "# TYPE tetris_span_latency_ms histogram",
+        ]
+        for name in sorted(self.histograms):
+            histogram = self.histograms[name]
+            for bound, hits in zip(bounds, histogram.cumulative_buckets()):
+                lines.append(f'tetris_span_latency_ms_bucket{{span="{name}",le="{bound}"}} {hits}')
+            lines.append(f'tetris_span_latency_ms_bucket{{span="{name}",le="+Inf"}} {histogram.count}')
+            lines.append(f'tetris_span_latency_ms_sum{{span="{name}"}} {histogram.total_ms}')
+            lines.append(f'tetris_span_latency_ms_count{{span="{name}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, target, fmt=None):
+        """Write metrics to a file path, tcp://host:port or unix:///path/to/socket"""
+        if fmt is None:
+            fmt = 'prometheus' if target.endswith('.prom') or '://' in target else 'json'
+        payload = (self.export_prometheus() if fmt == 'prometheus' else self.export_json()).encode("utf-8")
+
+        if target.startswith("tcp://"):
+            host, port = target[len("tcp://"):].rsplit(':', 1)
+            with socket.create_connection((host, int(port)), timeout=5) as sock:
+                sock.sendall(payload)
+        elif target.startswith("unix://"):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(5)
+                sock.connect(target[len("unix://"):])
+                sock.sendall(payload)
+        else:
+            tmp_path = f"{target}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, target)
+
+
+class ExpressionError(ValueError):
+    """Raised for input the calculator refuses to evaluate"""
+
+
+class ExpressionEngine:
+    """Whitelisted arithmetic compiled once per normalized expression
+
+    Input is tokenized (so 'exp' never collides with 'e' or 'x'), checked
+    against an AST whitelist of numbers, arithmetic operators and known math
+    names, then compiled. The same code object is evaluated against the math
+    namespace for scalars or the NumPy namespace for whole ranges, e.g.
+    "sin(x) for x from 0 to 10 step 0.01".
+    """
+
+    TOKEN = re.compile(r"\s*(?:(?P<number>\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)"
+                       r"|(?P<name>[A-Za-z_]\w*)|(?P<op>\*\*|//|[-+*/%^(),÷×]))")
+    RANGE = re.compile(r"^(?P<expr>.+?)\s+for\s+(?P<var>[a-z_]\w*)\s+(?:from|in)\s+(?P<start>.+?)"
+                       r"\s+to\s+(?P<stop>.+?)(?:\s+step\s+(?P<step>.+))?$")
+    OPERATORS = {'^': '**', '÷': '/', '×': '*'}
+    ALIASES = {'ln': 'log'}
+    BINARY = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+    UNARY = (ast.UAdd, ast.USub)
+    # math name -> numpy name for range evaluation
+    VECTOR_NAMES = {
+        'sin': 'sin', 'cos': 'cos', 'tan': 'tan', 'asin': 'arcsin', 'acos': 'arccos', 'atan': 'arctan',
+        'atan2': 'arctan2', 'sinh': 'sinh', 'cosh': 'cosh', 'tanh': 'tanh', 'asinh': 'arcsinh',
+        'acosh': 'arccosh', 'atanh': 'arctanh', 'sqrt': 'sqrt', 'exp': 'exp', 'expm1': 'expm1',
+        'log': 'log', 'log10': 'log10', 'log2': 'log2', 'log1p': 'log1p', 'floor': 'floor',
+        'ceil': 'ceil', 'trunc': 'trunc', 'fabs': 'fabs', 'abs': 'abs', 'hypot': 'hypot',
+        'degrees': 'degrees', 'radians': 'radians', 'pow': 'power', 'round': 'round',
+        'min': 'minimum', 'max': 'maximum',
+    }
+    CONSTANTS = ('pi', 'e', 'tau', 'inf', 'nan')
+    MAX_POWER_BITS = 4096
+    MAX_FACTORIAL = 1000
+    MAX_COMBINATORIC_BITS = 8192
+    # round(n, -d) builds 10**d, so d stays within the float range
+    MAX_ROUND_DIGITS = 400
+    # Exact integers up to this size; larger ones are shown in scientific notation
+    MAX_DISPLAY_BITS = 8192
+
+    def __init__(self, cache_size=256, max_points=10_000_000):
+        self.cache_size = cache_size
+        self.max_points = max_points
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.scalar_names = {name: value for name, value in math.__dict__.items() if not name.startswith('_')}
+        self.scalar_names.update({'abs': abs, 'round': self.round, 'min': min, 'max': max,
+                                  'factorial': self.factorial, 'comb': self.comb, 'perm': self.perm,
+                                  '_pow': self.scalar_pow})
+        self.vector_names = None
+
+    @classmethod
+    def factorial(cls, n):
+        if n > cls.MAX_FACTORIAL:
+            raise ExpressionError(f"factorial is limited to n <= {cls.MAX_FACTORIAL}")
+        return math.factorial(n)
+
+    @classmethod
+    def check_combinatoric(cls, name, log_result):
+        if log_result / math.log(2) > cls.MAX_COMBINATORIC_BITS:
+            raise ExpressionError(f"{name} is limited to results below 2**{cls.MAX_COMBINATORIC_BITS}")
+
+    @classmethod
+    def comb(cls, n, k):
+        # Estimate the size with lgamma; math.comb itself rejects bad arguments
+        if isinstance(n, int) and isinstance(k, int) and 0 <= k <= n:
+            cls.check_combinatoric('comb', math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1))
+        return math.comb(n, k)
+
+    @classmethod
+    def perm(cls, n, k=None):
+        chosen = n if k is None else k
+        if isinstance(n, int) and isinstance(chosen, int) and 0 <= chosen <= n:
+            cls.check_combinatoric('perm', math.lgamma(n + 1) - math.lgamma(n - chosen + 1))
+        return math.perm(n, k)
+
+    @classmethod
+    def round(cls, number, ndigits=None):
+        if ndigits is None:
+            return round(number)
+        if isinstance(ndigits, int) and abs(ndigits) > cls.MAX_ROUND_DIGITS:
+            raise ExpressionError(f"round is limited to {cls.MAX_ROUND_DIGITS} digits either side of the point")
+        return round(number, ndigits)
+
+    @classmethod
+    def format_integer(cls, value):
+        if value.bit_length() <= cls.MAX_DISPLAY_BITS:
+            return str(value)
+        exponent = math.log10(abs(value))
+        mantissa, digits = 10 ** (exponent % 1), int(exponent)
+        # 9.9999996... rounds up to the next power of ten
+        if round(mantissa, 6) >= 10:
+            mantissa, digits = mantissa / 10, digits + 1
+        return f"{'-' if value < 0 else ''}{mantissa:.6f}e+{digits}"
+
+    @classmethod
+    def scalar_pow(cls, base, exponent):
+        # Integer powers stay exact only while the result is reasonably small
+        if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and abs(base) > 1:
+            if exponent * math.log2(abs(base)) > cls.MAX_POWER_BITS:
+                return math.pow(base, exponent)
+        return base ** exponent
+
+    def tokenize(self, text):
+        tokens = []
+        position = 0
+        text = text.strip()
+        while position < len(text):
+            match = self.TOKEN.match(text, position)
+            if not match or match.end() == position:
+                raise ExpressionError(f"Unexpected character '{text[position]}'")
+            position = match.end()
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == 'op':
+                value = self.OPERATORS.get(value, value)
+            elif kind == 'name':
+                value = self.ALIASES.get(value.lower(), value.lower())
+            tokens.append([kind, value])
+        return tokens
+
+    def normalize(self, text, variables=()):
+        """Tokenize and rewrite to canonical Python syntax; 'x' between operands means multiply"""
+        tokens = self.tokenize(text)
+        normalized = []
+        for i, (kind, value) in enumerate(tokens):
+            previous = normalized[-1] if normalized else None
+            after_operand = previous is not None and (previous[0] in ('number', 'name') or previous[1] == ')')
+            if kind == 'name' and value not in variables and after_operand:
+                if value == 'x':
+                    normalized.append(['op', '*'])
+                    continue
+                digits = re.fullmatch(r'x(\d+\.?\d*)', value)
+                if digits:
+                    normalized.extend([['op', '*'], ['number', digits.group(1)]])
+                    continue
+            normalized.append([kind, value])
+        return ' '.join(value for _, value in normalized)
+
+    def check(self, node, variables):
+        if isinstance(node, ast.Expression):
+            return self.check(node.body, variables)
+        if isinstance(node, ast.Constant):
+            if type(node.value) not in (int, float):
+                raise ExpressionError("Only numbers are allowed")
+            return
+        if isinstance(node, ast.Name):
+            if node.id not in variables and node.id not in self.scalar_names:
+                raise ExpressionError(f"Unknown name '{node.id}'")
+            return
+        if isinstance(node, ast.BinOp) and isinstance(node.op, self.BINARY):
+            self.check(node.left, variables)
+            self.check(node.right, variables)
+            return
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, self.UNARY):
+            self.check(node.operand, variables)
+            return
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            if not callable(self.scalar_names.get(node.func.id)):
+                raise ExpressionError(f"Unknown function '{node.func.id}'")
+            for argument in node.args:
+                if isinstance(argument, ast.Starred):
+                    raise ExpressionError("Argument unpacking is not allowed")
+                self.check(argument, variables)
+            return
+        raise ExpressionError(f"'{type(node).__name__}' is not allowed in expressions")
+
+    def compile(self, text, variables=()):
+        """Return (code, names used) for text, compiling and caching it on first use"""
+        key = (self.normalize(text, variables), tuple(variables))
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        try:
+            tree = ast.parse(key[0], mode='eval')
+        except SyntaxError:
+            raise ExpressionError("Invalid syntax") from None
+        self.check(tree, variables)
+        used = frozenset(node.id for node in ast.walk(tree) if isinstance(node, ast.Name))
+
+        # Route ** through a guard so 9**9**9 cannot stall the engine
+        class PowerGuard(ast.NodeTransformer):
+            def visit_BinOp(self, node):
+                self.generic_visit(node)
+                if isinstance(node.op, ast.Pow):
+                    return ast.copy_location(
+                        ast.Call(func=ast.Name(id='_pow', ctx=ast.Load()), args=[node.left, node.right], keywords=[]),
+                        node
+                    )
+                return node
+
+        tree = ast.fix_missing_locations(PowerGuard().visit(tree))
+        entry = (compile(tree, '<calculator>', 'eval'), used)
+        # Workers share the cache; compiling happens outside the lock
+        with self.lock:
+            while len(self.cache) >= self.cache_size:
+                del self.cache[next(iter(self.cache))]
+            self.cache[key] = entry
+        return entry
+
+    def evaluate(self, text):
+        return eval(self.compile(text)[0], {'__builtins__': {}}, self.scalar_names)
+
+    def numpy_names(self):
+        if self.vector_names is None:
+            import numpy
+            self.numpy = numpy
+            names = {name: getattr(numpy, target) for name, target in self.VECTOR_NAMES.items()}
+            names.update({name: getattr(math, name) for name in self.CONSTANTS})
+            names['_pow'] = lambda base, exponent: numpy.power(numpy.asarray(base, dtype=float), exponent)
+            self.vector_names = names
+        return self.vector_names
+
+    def evaluate_range(self, text, variable, start, stop, step=None):
+        """Evaluate text over an inclusive grid of variable values; returns (grid, values, timings)"""
+        names = self.numpy_names()
+        numpy = self.numpy
+        start, stop = float(self.evaluate(start)), float(self.evaluate(stop))
+        step = float(self.evaluate(step)) if step else (stop - start) / 100 or 1.0
+        if step == 0 or (stop - start) / step < 0:
+            raise ExpressionError("The step must move from the start towards the end")
+        points = int(math.floor((stop - start) / step + 1e-9)) + 1
+        if points > self.max_points:
+            raise ExpressionError(f"{points:,} points exceeds the limit of {self.max_points:,}")
+
+        compile_start = time.perf_counter()
+        code, used = self.compile(text, (variable,))
+        compile_ms = (time.perf_counter() - compile_start) * 1000
+        for name in used - set(names) - {variable}:
+            raise ExpressionError(f"'{name}' is not supported over ranges")
+
+        eval_start = time.perf_counter()
+        grid = start + step * numpy.arange(points)
+        with numpy.errstate(all='ignore'):
+            values = eval(code, {'__builtins__': {}}, dict(names, **{variable: grid}))
+        values = numpy.broadcast_to(numpy.asarray(values, dtype=float), grid.shape)
+        eval_ms = (time.perf_counter() - eval_start) * 1000
+        return grid, values, {'points': points, 'compile_ms': compile_ms, 'eval_ms': eval_ms}
+
+
+# Intents whose handlers launch programs, open the browser or touch the network
+SIDE_EFFECT_INTENTS = ['open_app', 'close_app', 'web_search', 'youtube', 'music', 'weather', 'file_ops']
+
+# Built-in phrases offered as suggestions alongside custom triggers
+COMMON_COMMANDS = [
+    "open calculator", "open notepad", "system status", "what time is it",
+    "search for", "play music", "tell a joke", "weather forecast",
+    "shutdown computer", "lock screen", "create folder", "help"
+]
+
+
+class TetrisEngine:
+    """Headless T.E.T.R.I.S command pipeline
+
+    Owns the database, the in-memory indexes and every core handler that does
+    not need a display. The desktop interface is a client of this class and
+    plugs its own handlers in through register_handler.
+    """
+
+    def __init__(self, db_path="tetris_memory.db", start_sampler=True):
+        self.db_path = db_path
+        self.learning_mode = True
+        # Custom 'command' and 'web' actions are reported instead of run
+        self.dry_run = False
+        self.last_intent = None
+        self.tracer = Tracer()
+        self.calculator = ExpressionEngine()
+        # Called to ask for a folder name when a command doesn't include one
+        self.prompt_folder_name = None
+        
+        startup_steps = [
+            self.setup_database,
+            self.load_preferences,
+            self.setup_usage_counters,
+            self.setup_custom_commands,
+            self.setup_learned_patterns,
+            self.setup_intent_router,
+            self.setup_fuzzy_matcher,
+            self.setup_suggestion_trie,
+            self.start_index_loader,
+            self.setup_retention,
+        ]
+        for step in startup_steps:
+            with STARTUP_PROFILER.phase(f"engine.{step.__name__}"):
+                step()
+        
+        self.metrics_sampler = SystemMetricsSampler(interval=2.0)
+        if start_sampler:
+            with STARTUP_PROFILER.phase("engine.metrics_sampler"):
+                try:
+                    self.metrics_sampler.start()
+                except Exception as e:
+                    print(f"System metrics unavailable: {e}")
+    
+    def load_preferences(self):
+        self.user_preferences = self.load_user_preferences()
+    
+    def setup_database(self):
+        """Migrate the SQLite database to the latest schema and open the engine's connections"""
+        self.schema_migrator = SchemaMigrator(self.db_path)
+        applied = self.schema_migrator.migrate()
+        if applied:
+            print(f"Database schema migrated to version {applied[-1]}")
+        
+        self.conn = tune_connection(sqlite3.connect(self.db_path, check_same_thread=False))
+        # Command workers and the UI thread share conn for reads; writes go through persistence
+        self.db_lock = threading.Lock()
+        self.persistence = PersistenceWorker(self.db_path)
+        self.weather_client = WeatherClient(self.db_path)
+    
+    def setup_retention(self):
+        """Configure conversation retention from user preferences"""
+        prefs = self.user_preferences
+        try:
+            self.retention = RetentionManager(
+                self.db_path,
+                archive_dir=prefs.get('retention_archive_dir', "tetris_archive"),
+                max_age_days=int(prefs.get('retention_max_age_days', 30)),
+                max_rows=int(prefs.get('retention_max_rows', 50000)),
+                keep_importance=int(prefs.get('retention_keep_importance', 3))
+            )
+        except (TypeError, ValueError) as e:
+            print(f"Invalid retention preferences, using defaults: {e}")
+            self.retention = RetentionManager(self.db_path)
+    
+    def close(self):
+        """Flush pending writes and stop background workers"""
+        self.metrics_sampler.stop()
+        self.weather_client.close()
+        try:
+            self.usage_counters.close()
+        except Exception as e:
+            print(f"Usage counter shutdown error: {e}")
+        try:
+            self.persistence.close()
+        except Exception as e:
+            print(f"Persistence shutdown error: {e}")
+        self.conn.close()
+    
+    def setup_intent_router(self):
+        """Compile the core command phrases into a single-pass intent router"""
+        # Order matters: earlier intents win when several phrases match, as in the old elif chain
+        core_intents = [
+            ('greeting', ['hello', 'hi', 'hey', 'good morning', 'good evening'],
+             lambda command, original: self.respond_greeting()),
+            ('identity', ['who are you', 'what are you', 'introduce yourself'],
+             lambda command, original: self.respond_identity()),
+            ('time', ['time'], lambda command, original: self.respond_time()),
+            ('date', ['date'], lambda command, original: self.respond_date()),
+            ('shutdown', ['shutdown', 'turn off', 'power down'],
+             None),
+            ('restart', ['restart', 'reboot', 'reset'],
+             None),
+            ('sleep', ['sleep', 'hibernate'], None),
+            ('lock', ['lock'], None),
+            ('open_app', ['open', 'launch'],
+             lambda command, original: self.advanced_open_application(
+                 self.extract_app_name(command, ['open', 'launch']))),
+            ('close_app', ['close', 'terminate'],
+             lambda command, original: self.advanced_close_application(
+                 self.extract_app_name(command, ['close', 'terminate']))),
+            ('web_search', ['search', 'google', 'find', 'look up'],
+             lambda command, original: self.advanced_web_search(self.extract_search_query(command))),
+            ('youtube', ['youtube'],
+             lambda command, original: self.advanced_youtube_search(
+                 self.extract_search_query(command, 'youtube'))),
+            ('study', ['study', 'homework', 'learn', 'explain', 'teach me'],
+             lambda command, original: self.advanced_study_assistant(command)),
+            ('calculate', ['calculate', 'math', 'compute', 'solve'],
+             lambda command, original: self.advanced_calculator(command)),
+            ('define', ['define', 'meaning', 'what is', 'explain'],
+             lambda command, original: self.advanced_dictionary(command)),
+            ('file_ops', ['file', 'folder', 'directory', 'create', 'delete', 'move', 'copy'],
+             lambda command, original: self.advanced_file_operations(command)),
+            ('system_status', ['system status', 'performance', 'resources', 'stats'],
+             lambda command, original: self.get_advanced_system_status()),
+            ('weather', ['weather'],
+             lambda command, original: self.get_advanced_weather(self.extract_location(command))),
+            ('joke', ['joke'], lambda command, original: self.tell_advanced_joke()),
+            ('music', ['music', 'song'], lambda command, original: self.advanced_music_control(command)),
+            ('remember', ['remember', 'save', 'note', 'remind me'],
+             None),
+            ('forget', ['forget', 'delete memory', 'clear'],
+             None),
+            ('recall', ['what do you remember', 'recall'],
+             None),
+            ('security_scan', ['security scan', 'check security', 'scan system'],
+             None),
+            ('privacy_mode', ['privacy mode'], None),
+            ('analyze', ['analyze'], None),
+            ('predict', ['predict', 'forecast'], None),
+            ('optimize', ['optimize'], None),
+            ('help', ['help', 'commands'], None),
+        ]
+        
+        # Intents with a None handler need the desktop interface to register one
+        self.intent_router = IntentRouter()
+        self.intent_handlers = {}
+        for name, phrases, handler in core_intents:
+            self.intent_router.add_intent(name, phrases)
+            self.intent_handlers[name] = handler
+        self.intent_router.compile()
+        self.last_intent_match = self.intent_router.last_match
+    
+    def register_handler(self, intent, handler):
+        """Attach a handler(command, original_command) to a core intent"""
+        if intent not in self.intent_handlers:
+            raise KeyError(f"Unknown intent: {intent}")
+        self.intent_handlers[intent] = handler
+    
+    def process_command(self, command):
+        """Advanced command processing with AI learning"""
+        with self.tracer.span('process_command'):
+            return self.run_pipeline(command)
+    
+    def run_pipeline(self, command):
+        """Run each pipeline stage inside its own tracing span"""
+        tracer = self.tracer
+        original_command = command
+        command = command.lower().strip()
+        self.last_intent = None
+        self.record_input_usage(command)
+        
+        # Check for wake words
+        with tracer.span('stage.wake_words'):
+            if any(wake in command for wake in ['tetris', 'friday', 'edith', 'ai']):
+                command = self.remove_wake_words(command)
+        
+        # Check custom commands first
+        with tracer.span('stage.custom_triggers'):
+            self.refresh_custom_commands()
+            custom_response = self.check_custom_commands(command)
+        if custom_response:
+            return custom_response
+        
+        # AI-powered response generation
+        if self.learning_mode:
+            with tracer.span('stage.learned_patterns'):
+                learned_response = self.generate_learned_response(command)
+            if learned_response:
+                return learned_response
+        
+        # Core command processing
+        with tracer.span('stage.core_handler'):
+            response = self.process_core_commands(command, original_command)
+        
+        # Learn from this interaction
+        if self.learning_mode:
+            with tracer.span('stage.learning_write'):
+                self.learn_from_interaction(command, response)
+        
+        return response
+    
+    def process_core_commands(self, command, original_command):
+        """Process core system commands"""
+        match = self.intent_router.match(command)
+        self.last_intent_match = match
+        self.last_intent = match.intent or "fallback"
+        self.tracer.record('stage.intent_match', match.elapsed_ms)
+        
+        # Fallback with AI learning
+        if match.intent is None:
+            with self.tracer.span('handler.fallback'):
+                return self.generate_intelligent_response(command)
+        
+        handler = self.intent_handlers[match.intent]
+        if handler is None:
+            return f"The '{match.intent}' capability requires the T.E.T.R.I.S desktop interface."
+        with self.tracer.span(f'handler.{match.intent}'):
+            return handler(command, original_command)
+    
+    def advanced_file_operations(self, command):
+        """Advanced file operations with AI assistance"""
+        if 'create' in command and 'folder' in command:
+            return self.create_folder(command)
+        elif 'delete' in command:
+            return "What file or folder would you like to delete? Please be specific for safety."
+        elif 'copy' in command:
+            return "What file would you like to copy and where?"
+        elif 'move' in command:
+            return "What file would you like to move and where?"
+        elif 'find' in command or 'search' in command:
+            return "What file are you looking for? I can help you search."
+        else:
+            return "I can help with file operations like create, delete, copy, move, or find files. What would you like to do?"
+    
+    def create_folder(self, command):
+        """Create a folder on the desktop, asking for its name if the command has none"""
+        if self.prompt_folder_name is not None:
+            folder_name = self.prompt_folder_name()
+        else:
+            folder_name = command.split('folder', 1)[1]
+            for word in ['named', 'called']:
+                folder_name = folder_name.replace(word, '')
+            folder_name = folder_name.strip()
+            if not folder_name:
+                return "What should the folder be called? Try 'create folder reports'."
+        
+        if folder_name:
+            try:
+                desktop = os.path.join(os.path.expanduser('~'), 'Desktop')
+                folder_path = os.path.join(desktop, folder_name)
+                os.makedirs(folder_path, exist_ok=True)
+                return f"Created folder '{folder_name}' on desktop."
+            except Exception as e:
+                return f"Failed to create folder: {str(e)}"
+        return "Folder creation cancelled."
+    
+    def setup_usage_counters(self):
+        """Count custom command uses in memory, replaying journals left by a crash"""
+        self.usage_counters = UsageCounters(self.db_path)
+        # Called with (trigger, usage_count, last_used) each time a custom command runs
+        self.on_command_used = None
+    
+    def setup_custom_commands(self):
+        """Load custom commands from database"""
+        self.custom_commands = {}
+        self.custom_commands_lock = threading.Lock()
+        self.custom_commands_version = 0
+        self.bulk_reload_threshold = 1000
+        # Called with (changed triggers, removed triggers) after another writer's changes are applied
+        self.on_custom_commands_changed = None
+        try:
+            self.persistence.submit("DELETE FROM custom_command_changes WHERE changed_at < datetime('now', '-7 days')")
+            # Read the log position first; anything logged during the load is replayed harmlessly
+            self.custom_commands_seq = self.conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM custom_command_changes"
+            ).fetchone()[0]
+            self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            rows = self.conn.execute(
+                "SELECT trigger, response, action_type, parameters, usage_count, last_used FROM custom_commands"
+            ).fetchall()
+            usage = []
+            for row in rows:
+                trigger, response, action_type, parameters, usage_count, last_used = row
+                self.custom_commands[trigger.lower()] = {
+                    'response': response,
+                    'action_type': action_type,
+                    'parameters': parameters
+                }
+                usage.append((trigger, usage_count, last_used))
+            self.usage_counters.load(usage)
+        except Exception as e:
+            print(f"Error loading custom commands: {e}")
+            self.custom_commands_seq = 0
+            self.data_version = None
+        
+        # Compiled in the background; triggers match by substring search until then
+        self.trigger_index = TriggerIndex(self.custom_commands.keys())
+    
+    def refresh_custom_commands(self, force=False):
+        """Apply custom command changes logged since the last refresh
+
+        PRAGMA data_version only moves when another connection commits, so the
+        common case costs one pragma. Returns the number of triggers applied.
+        """
+        if not self.custom_commands_lock.acquire(blocking=False):
+            return 0  # Another thread is already applying the same changes
+        try:
+            with self.db_lock:
+                data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+                if data_version == self.data_version and not force:
+                    return 0
+                self.data_version = data_version
+                
+                rows = self.conn.execute(
+                    "SELECT seq, trigger, operation FROM custom_command_changes WHERE seq > ? ORDER BY seq",
+                    (self.custom_commands_seq,)
+                ).fetchall()
+            if not rows:
+                return 0
+            if len(rows) <= self.bulk_reload_threshold:
+                return self.apply_custom_command_changes(rows)
+        except sqlite3.Error as e:
+            print(f"Custom command refresh error: {e}")
+            return 0
+        finally:
+            self.custom_commands_lock.release()
+        
+        # A bulk import elsewhere; rebuild once instead of applying row by row
+        added, removed = self.reload_custom_commands()
+        if self.on_custom_commands_changed:
+            self.on_custom_commands_changed(None, None)
+        return added + removed
+    
+    def apply_custom_command_changes(self, rows):
+        """Apply change log rows to the in-memory commands; the caller holds custom_commands_lock"""
+        if rows[0][0] > self.custom_commands_seq + 1 and self.custom_commands_seq:
+            # Log entries we never saw were pruned; reconcile against the full table once
+            with self.db_lock:
+                triggers = {row[0] for row in self.conn.execute("SELECT trigger FROM custom_commands")}
+            latest = {trigger.lower(): 'upsert' for trigger in triggers}
+            latest.update({trigger: 'delete' for trigger in set(self.custom_commands) - set(latest)})
+        else:
+            latest = {}
+            for _, trigger, operation in rows:
+                latest[trigger.lower()] = operation
+        self.custom_commands_seq = rows[-1][0]
+        
+        upserts = [trigger for trigger, operation in latest.items() if operation == 'upsert']
+        found = {}
+        for start in range(0, len(upserts), 500):
+            chunk = upserts[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            with self.db_lock:
+                rows = self.conn.execute(
+                    "SELECT trigger, response, action_type, parameters FROM custom_commands "
+                    f"WHERE lower(trigger) IN ({placeholders})", chunk
+                ).fetchall()
+            for trigger, response, action_type, parameters in rows:
+                found[trigger.lower()] = (trigger, response, action_type, parameters)
+        
+        changed, removed = [], []
+        for trigger in latest:
+            if trigger in found:
+                self.register_custom_command(*found[trigger])
+                changed.append(trigger)
+            elif trigger in self.custom_commands:
+                self.unregister_custom_command(trigger)
+                removed.append(trigger)
+        
+        if changed or removed:
+            self.custom_commands_version += 1
+            if self.on_custom_commands_changed:
+                self.on_custom_commands_changed(changed, removed)
+        return len(changed) + len(removed)
+    
+    def setup_learned_patterns(self):
+        """Load learned patterns into the in-memory lookup index"""
+        self.learned_index = LearnedPatternIndex()
+        try:
+            self.learned_index.load(self.conn.cursor())
+        except Exception as e:
+            print(f"Error loading learned patterns: {e}")
+    
+    def register_custom_command(self, trigger, response, action_type, parameters, old_trigger=None):
+        """Update the in-memory command table and trigger indexes after a save"""
+        if old_trigger and old_trigger.lower() != trigger.lower():
+            self.unregister_custom_command(old_trigger)
+        
+        self.usage_counters.track(trigger)
+        trigger = trigger.lower()
+        self.custom_commands[trigger] = {
+            'response': response,
+            'action_type': action_type,
+            'parameters': parameters
+        }
+        self.index_custom_trigger(trigger)
+    
+    def unregister_custom_command(self, trigger):
+        """Drop a command from the in-memory table and trigger indexes"""
+        trigger = trigger.lower()
+        self.custom_commands.pop(trigger, None)
+        self.usage_counters.forget(trigger)
+        self.unindex_custom_trigger(trigger)
+    
+    def save_custom_command(self, trigger, response, action_type, parameters, old_trigger=None):
+        """Add a command, or edit old_trigger's; usable at once, written behind
+
+        Raises ValueError for an empty trigger or one another command already
+        uses (triggers match case-insensitively).
+        """
+        trigger = trigger.strip()
+        if not trigger:
+            raise ValueError("The trigger phrase can't be empty")
+        if trigger.lower() in self.custom_commands and trigger.lower() != (old_trigger or '').lower():
+            raise ValueError(f"A command for '{trigger}' already exists")
+        
+        if old_trigger:
+            self.persistence.submit(
+                "UPDATE custom_commands SET trigger = ?, response = ?, action_type = ?, parameters = ? "
+                "WHERE lower(trigger) = ?",
+                (trigger, response, action_type, parameters, old_trigger.lower())
+            )
+        else:
+            self.persistence.submit(
+                "INSERT INTO custom_commands (trigger, response, action_type, parameters) VALUES (?, ?, ?, ?)",
+                (trigger, response, action_type, parameters)
+            )
+        self.register_custom_command(trigger, response, action_type, parameters, old_trigger)
+    
+    def delete_custom_command(self, trigger):
+        """Remove a command now and delete its row behind"""
+        self.persistence.submit("DELETE FROM custom_commands WHERE lower(trigger) = ?", (trigger.lower(),))
+        self.unregister_custom_command(trigger)
+    
+    def open_connection(self):
+        """A private connection for bulk work, so its transactions never mix with the shared one's"""
+        return tune_connection(sqlite3.connect(self.db_path, timeout=30))
+    
+    COMMAND_EXPORT_FIELDS = ('trigger', 'response', 'action_type', 'parameters', 'usage_count', 'created_date', 'last_used')
+    
+    @staticmethod
+    def open_command_pack(path, mode, compressed=None):
+        """Open a JSONL command pack, gzip-compressed when the name ends in .gz"""
+        if compressed if compressed is not None else str(path).endswith('.gz'):
+            return gzip.open(path, mode + 't', encoding='utf-8')
+        return open(path, mode, encoding='utf-8')
+    
+    def export_custom_commands(self, path, chunk_size=5000, progress=None):
+        """Stream every custom command to a JSONL file; returns the number exported"""
+        self.usage_counters.flush()
+        tmp_path = f"{path}.tmp"
+        exported = 0
+        conn = self.open_connection()
+        try:
+            cursor = conn.execute(f"SELECT {', '.join(self.COMMAND_EXPORT_FIELDS)} FROM custom_commands ORDER BY trigger")
+            with self.open_command_pack(tmp_path, 'w', compressed=str(path).endswith('.gz')) as f:
+                f.write(json.dumps({'format': 'tetris-commands', 'version': 1}) + "\n")
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    f.writelines(json.dumps(dict(zip(self.COMMAND_EXPORT_FIELDS, row))) + "\n" for row in rows)
+                    exported += len(rows)
+                    if progress:
+                        progress(exported)
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+        return exported
+    
+    def import_custom_commands(self, path, on_conflict='replace', chunk_size=5000, progress=None):
+        """Upsert commands from a JSONL pack, one transaction per chunk
+
+        on_conflict is 'replace' to overwrite a different definition of an
+        existing trigger or 'skip' to keep the local one; usage counts are
+        always kept. Triggers match case-insensitively, like lookups do, and
+        a replaced command keeps its stored spelling. progress receives the
+        running stats after each chunk. The in-memory command table and
+        indexes are rebuilt once at the end.
+        """
+        if on_conflict not in ('replace', 'skip'):
+            raise ValueError("on_conflict must be 'replace' or 'skip'")
+        stats = {'lines': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0,
+                 'errors': 0, 'conflicts': [], 'error_lines': [], 'bytes_read': 0,
+                 'bytes_total': os.path.getsize(path)}
+        
+        conn = self.open_connection()
+        try:
+            with open(path, 'rb') as raw:
+                stream = gzip.open(raw, 'rt', encoding='utf-8') if str(path).endswith('.gz') else \
+                    io.TextIOWrapper(raw, encoding='utf-8')
+                chunk = {}
+                for line_number, line in enumerate(stream, 1):
+                    stats['lines'] += 1
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                        if 'format' in record and 'trigger' not in record:
+                            continue  # Header
+                        trigger = record['trigger'].strip()
+                        if not trigger:
+                            raise ValueError("empty trigger")
+                        chunk[trigger.lower()] = (trigger, (record.get('response') or "",
+                                                            record.get('action_type') or "response",
+                                                            record.get('parameters') or ""))
+                    except (ValueError, KeyError, TypeError, AttributeError) as e:
+                        stats['errors'] += 1
+                        if len(stats['error_lines']) < 100:
+                            stats['error_lines'].append((line_number, str(e)))
+                        continue
+                    
+                    if len(chunk) >= chunk_size:
+                        self.import_command_chunk(conn, chunk, on_conflict, stats)
+                        stats['bytes_read'] = raw.tell()
+                        chunk = {}
+                        if progress:
+                            progress(stats)
+                if chunk:
+                    self.import_command_chunk(conn, chunk, on_conflict, stats)
+                stats['bytes_read'] = stats['bytes_total']
+                if progress:
+                    progress(stats)
+        finally:
+            conn.close()
+        
+        self.reload_custom_commands()
+        return stats
+    
+    def import_command_chunk(self, conn, chunk, on_conflict, stats):
+        # chunk and existing are keyed by lower-cased trigger, matching the in-memory table
+        existing = {}
+        keys = list(chunk)
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            for trigger, response, action_type, parameters in conn.execute(
+                "SELECT trigger, response, action_type, parameters FROM custom_commands "
+                f"WHERE lower(trigger) IN ({','.join('?' * len(part))})", part
+            ):
+                existing.setdefault(trigger.lower(), (trigger, (response, action_type, parameters)))
+        
+        inserts, updates = [], []
+        for key, (trigger, definition) in chunk.items():
+            stored_trigger, current = existing.get(key, (None, None))
+            if current is None:
+                inserts.append((trigger,) + definition)
+            elif current == definition:
+                stats['unchanged'] += 1
+            else:
+                if len(stats['conflicts']) < 100:
+                    stats['conflicts'].append(trigger)
+                if on_conflict == 'replace':
+                    updates.append(definition + (stored_trigger,))
+                else:
+                    stats['skipped'] += 1
+        
+        with conn:
+            conn.executemany(
+                "INSERT INTO custom_commands (trigger, response, action_type, parameters) VALUES (?, ?, ?, ?)",
+                inserts
+            )
+            conn.executemany(
+                "UPDATE custom_commands SET response = ?, action_type = ?, parameters = ? WHERE trigger = ?",
+                updates
+            )
+        stats['inserted'] += len(inserts)
+        stats['updated'] += len(updates)
+    
+    def reload_custom_commands(self):
+        """Reload the command table after a bulk change and rebuild its indexes in one pass
+
+        The new table and trigger index are built off to the side and swapped
+        in, so lookups running on other threads see either the old commands or
+        the new ones, never an empty or half-built index.
+        """
+        self.usage_counters.flush()
+        with self.custom_commands_lock:
+            with self.db_lock:
+                seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM custom_command_changes").fetchone()[0]
+                data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            
+            commands, usage = {}, []
+            conn = self.open_connection()
+            try:
+                for trigger, response, action_type, parameters, usage_count, last_used in conn.execute(
+                    "SELECT trigger, response, action_type, parameters, usage_count, last_used FROM custom_commands"
+                ):
+                    commands[trigger.lower()] = {'response': response, 'action_type': action_type, 'parameters': parameters}
+                    usage.append((trigger, usage_count, last_used))
+            finally:
+                conn.close()
+            trigger_index = TriggerIndex(commands)
+            trigger_index.automaton.build()
+            
+            added = set(commands) - set(self.custom_commands)
+            removed = set(self.custom_commands) - set(commands)
+            # check_custom_commands reads the index first, so publish the table it points into first
+            self.custom_commands = commands
+            self.trigger_index = trigger_index
+            self.custom_commands_seq = seq
+            self.data_version = data_version
+            self.usage_counters.load(usage)
+            
+            for trigger in removed:
+                self.usage_counters.forget(trigger)
+                self.unindex_custom_trigger(trigger)
+            for trigger in added:
+                self.fuzzy_matcher.add(trigger)
+            self.suggestion_trie.load((trigger.lower(), usage_count or 0) for trigger, usage_count, _ in usage
+                                      if trigger.lower() in added)
+            self.custom_commands_version += 1
+        return len(added), len(removed)
+    
+    def sync_trigger_index(self):
+        """Catch the trigger indexes up with edits made directly to custom_commands"""
+        indexed = set(self.trigger_index.automaton.values)
+        current = set(self.custom_commands)
+        for trigger in indexed - current:
+            self.unindex_custom_trigger(trigger)
+        for trigger in current - indexed:
+            self.index_custom_trigger(trigger)
+    
+    def index_custom_trigger(self, trigger):
+        self.trigger_index.add(trigger)
+        self.fuzzy_matcher.add(trigger)
+        if trigger not in self.suggestion_trie:
+            self.suggestion_trie.set(trigger, 0)
+    
+    def unindex_custom_trigger(self, trigger):
+        self.trigger_index.remove(trigger)
+        # Built-in phrases stay suggestible after a custom command shadowing them is removed
+        if trigger not in COMMON_COMMANDS and trigger not in self.intent_router.automaton:
+            self.fuzzy_matcher.remove(trigger)
+        if trigger not in COMMON_COMMANDS and self.input_counts.get(trigger, 0) < 2:
+            self.suggestion_trie.remove(trigger)
+    
+    def setup_fuzzy_matcher(self):
+        """Index built-in phrases for "did you mean" suggestions; custom triggers follow in the background"""
+        self.fuzzy_matcher = FuzzyMatcher()
+        for phrase in COMMON_COMMANDS:
+            self.fuzzy_matcher.add(phrase)
+        for phrase in self.intent_router.automaton.values:
+            if len(phrase) > 3:
+                self.fuzzy_matcher.add(phrase)
+    
+    def setup_suggestion_trie(self):
+        """Seed the autocomplete trie with built-ins; custom triggers and frequent inputs follow in the background"""
+        self.suggestion_trie = SuggestionTrie(k=5)
+        self.input_counts = {}
+        self.max_input_counts = 5000
+        self.suggestion_trie.load((phrase, 1) for phrase in COMMON_COMMANDS)
+    
+    def start_index_loader(self):
+        """Index custom triggers and past inputs on a background thread so startup isn't held up"""
+        self.indexes_ready = threading.Event()
+        self.index_loader = threading.Thread(target=self.load_indexes, name="tetris-indexer", daemon=True)
+        self.index_loader.start()
+    
+    def load_indexes(self):
+        try:
+            for trigger in list(self.custom_commands):
+                if trigger in self.custom_commands:  # Skip commands deleted meanwhile
+                    self.fuzzy_matcher.add(trigger)
+            
+            weights = {trigger.lower(): usage_count for trigger, usage_count, _ in self.usage_counters.snapshot()}
+            conn = self.open_connection()
+            try:
+                # Inputs seen at least twice are worth offering again
+                rows = conn.execute(
+                    "SELECT LOWER(user_input), COUNT(*) FROM conversation_memory WHERE user_input != '' "
+                    "GROUP BY LOWER(user_input) HAVING COUNT(*) > 1 ORDER BY COUNT(*) DESC LIMIT 1000"
+                ).fetchall()
+            finally:
+                conn.close()
+            for user_input, hits in rows:
+                # Inputs recorded since startup may already be part of the stored count
+                self.input_counts[user_input] = max(self.input_counts.get(user_input, 0), hits)
+                weights[user_input] = weights.get(user_input, 0) + hits
+            self.suggestion_trie.load(weights.items())
+        except Exception as e:
+            print(f"Error loading suggestions: {e}")
+        finally:
+            self.indexes_ready.set()
+    
+    def record_input_usage(self, command):
+        """Feed a processed input back into autocomplete ranking"""
+        command = command.lower().strip()
+        hits = self.input_counts.get(command, 0) + 1
+        self.input_counts[command] = hits
+        if command in self.suggestion_trie:
+            self.suggestion_trie.increment(command)
+        elif hits >= 2:
+            self.suggestion_trie.set(command, hits)
+        if len(self.input_counts) > self.max_input_counts:
+            self.prune_input_counts()
+    
+    def prune_input_counts(self):
+        """Keep the more frequent half of tracked inputs and drop the rest from autocomplete"""
+        ranked = sorted(self.input_counts.items(), key=lambda item: item[1], reverse=True)
+        keep = self.max_input_counts // 2
+        self.input_counts = dict(ranked[:keep])
+        for phrase, _ in ranked[keep:]:
+            if phrase not in self.custom_commands and phrase not in COMMON_COMMANDS:
+                self.suggestion_trie.remove(phrase)
+    
+    def respond_greeting(self):
+        """Advanced greetings with personality"""
+        greetings = [
+            "Good to see you again. T.E.T.R.I.S systems are fully operational.",
+            "Hello. All systems green and ready for your commands.",
+            "Greetings. I've been monitoring system status while you were away.",
+            "Welcome back. How may I assist you today?"
+        ]
+        return random.choice(greetings)
+    
+    def respond_identity(self):
+        """Personality queries"""
+        return ("I am T.E.T.R.I.S - Tactically Enhanced Technology Response Intelligence System. "
+               "I'm an advanced AI assistant designed to learn, adapt, and assist with complex tasks. "
+               "Think of me as your personal Friday or EDITH system.")
+    
+    def respond_time(self):
+        """Time and date with advanced formatting"""
+        now = datetime.datetime.now()
+        return f"Current time: {now.strftime('%I:%M %p')} on {now.strftime('%A, %B %d, %Y')}"
+    
+    def respond_date(self):
+        return f"Today is {datetime.datetime.now().strftime('%A, %B %d, %Y')}"
+    
+    def extract_app_name(self, command, remove_words):
+        """Extract application name from command"""
+        for word in remove_words:
+            command = command.replace(word, '')
+        return command.strip()
+    
+    def extract_search_query(self, command, platform=None):
+        """Extract search query from command"""
+        remove_words = ['search', 'google', 'find', 'look up', 'for', platform] if platform else ['search', 'google', 'find', 'look up', 'for']
+        query = command
+        for word in remove_words:
+            if word:
+                query = query.replace(word, '')
+        return query.strip()
+    
+    def extract_location(self, command):
+        """Extract location from weather command"""
+        location = command.replace('weather', '').replace('in', '').replace('for', '').strip()
+        return location if location else "current location"
+    
+    def advanced_open_application(self, app_name):
+        """Advanced application launcher with learning"""
+        # Enhanced application dictionary
+        apps = {
+            'notepad': 'notepad.exe',
+            'calculator': 'calc.exe',
+            'paint': 'mspaint.exe',
+            'chrome': 'chrome.exe',
+            'firefox': 'firefox.exe',
+            'edge': 'msedge.exe',
+            'explorer': 'explorer.exe',
+            'file explorer': 'explorer.exe',
+            'cmd': 'cmd.exe',
+            'command prompt': 'cmd.exe',
+            'powershell': 'powershell.exe',
+            'task manager': 'taskmgr.exe',
+            'control panel': 'control.exe',
+            'settings': 'ms-settings:',
+            'word': 'winword.exe',
+            'excel': 'excel.exe',
+            'powerpoint': 'powerpnt.exe',
+            'outlook': 'outlook.exe',
+            'teams': 'teams.exe',
+            'discord': 'discord.exe',
+            'spotify': 'spotify.exe',
+            'steam': 'steam.exe',
+            'vscode': 'code.exe',
+            'visual studio code': 'code.exe',
+            'photoshop': 'photoshop.exe',
+            'premiere': 'premiere.exe',
+            'after effects': 'afterfx.exe'
+        }
+        
+        app_lower = app_name.lower()
+        
+        if app_lower in apps:
+            try:
+                subprocess.Popen(apps[app_lower], shell=True)
+                return f"Launching {app_name}. Application should be starting now."
+            except Exception as e:
+                return f"Failed to launch {app_name}. Error: {str(e)}"
+        else:
+            # Try to find similar applications
+            similar_apps = [app for app in apps.keys() if app_lower in app or app in app_lower]
+            if similar_apps:
+                return f"Did you mean: {', '.join(similar_apps)}? Please specify which application you'd like to open."
+            
+            # Try to launch directly
+            try:
+                subprocess.Popen(app_name, shell=True)
+                return f"Attempting to launch {app_name}. If this fails, please check the application name."
+            except:
+                return f"Application '{app_name}' not found. Try saying 'help' for available applications."
+    
+    def advanced_close_application(self, app_name):
+        """Advanced application termination"""
+        try:
+            # Common process names
+            process_map = {
+                'chrome': 'chrome.exe',
+                'firefox': 'firefox.exe',
+                'notepad': 'notepad.exe',
+                'calculator': 'calc.exe',
+                'explorer': 'explorer.exe'
+            }
+            
+            process_name = process_map.get(app_name.lower(), f"{app_name}.exe")
+            
+            # Terminate process
+            subprocess.run(['taskkill', '/f', '/im', process_name], 
+                         capture_output=True, text=True, check=True)
+            return f"Successfully terminated {app_name}."
+        except subprocess.CalledProcessError:
+            return f"Could not terminate {app_name}. Process may not be running."
+        except Exception as e:
+            return f"Error terminating {app_name}: {str(e)}"
+    
+    def advanced_web_search(self, query):
+        """Advanced web search with multiple engines"""
+        if not query:
+            return "What would you like me to search for?"
+        
+        search_engines = {
+            'google': f"https://www.google.com/search?q={query.replace(' ', '+')}",
+            'bing': f"https://www.bing.com/search?q={query.replace(' ', '+')}",
+            'duckduckgo': f"https://duckduckgo.com/?q={query.replace(' ', '+')}"
+        }
+        
+        # Default to Google
+        webbrowser.open(search_engines['google'])
+        return f"Searching for '{query}' on Google. Results should appear in your browser."
+    
+    def advanced_youtube_search(self, query):
+        """Advanced YouTube search"""
+        if not query:
+            return "What would you like me to search for on YouTube?"
+        
+        url = f"https://www.youtube.com/results?search_query={query.replace(' ', '+')}"
+        webbrowser.open(url)
+        return f"Searching YouTube for '{query}'. Results should appear in your browser."
+    
+    def advanced_study_assistant(self, command):
+        """Advanced study assistance with subject detection"""
+        subjects = {
+            'math': "I can help with mathematics. Try asking me to calculate equations, explain formulas, or solve problems.",
+            'science': "I can assist with science topics including physics, chemistry, and biology. What specific area interests you?",
+            'history': "I can help with historical facts, dates, and events. What time period or topic are you studying?",
+            'english': "I can help with grammar, writing, literature analysis, and vocabulary. What do you need help with?",
+            'computer': "I can help with programming, computer science concepts, and technology. What programming language or topic?",
+            'physics': "I can help with physics concepts, formulas, and problem-solving. What physics topic are you working on?",
+            'chemistry': "I can assist with chemical equations, periodic table, and reactions. What chemistry topic do you need help with?",
+            'biology': "I can help with biological processes, anatomy, and life sciences. What biology topic interests you?"
+        }
+        
+        for subject, response in subjects.items():
+            if subject in command.lower():
+                return response
+        
+        return ("Study mode activated. I can help with various subjects including mathematics, science, history, English, and computer science. "
+                "What subject would you like to focus on?")
+    
+    def advanced_calculator(self, command):
+        """Advanced calculator with complex operations"""
+        # Extract mathematical expression
+        expression = re.sub(r'^\s*(?:(?:calculate|compute|solve|what is|math)\b\s*)+', '', command)
+        expression = expression.strip().rstrip('?').strip()
+        
+        if not expression:
+            return "Please provide a mathematical expression to calculate."
+        
+        try:
+            ranged = ExpressionEngine.RANGE.match(expression)
+            if ranged:
+                return self.calculate_range(ranged)
+            
+            result = self.calculator.evaluate(expression)
+            
+            # Format result appropriately
+            if isinstance(result, float):
+                if result.is_integer():
+                    result = int(result)
+                else:
+                    result = round(result, 6)
+            if isinstance(result, int):
+                result = ExpressionEngine.format_integer(result)
+            
+            return f"The result of '{expression}' is: {result}"
+            
+        except ImportError:
+            return "Range calculations need NumPy. Install it with 'pip install numpy'."
+        except Exception as e:
+            return f"I couldn't calculate that expression. Please check the syntax. Error: {str(e)}"
+    
+    def calculate_range(self, match):
+        """Evaluate an expression over 'for x from a to b step s' and summarize the curve"""
+        expression, variable = match.group('expr'), match.group('var')
+        grid, values, timings = self.calculator.evaluate_range(
+            expression, variable, match.group('start'), match.group('stop'), match.group('step')
+        )
+        numpy = self.calculator.numpy
+        self.tracer.record('calculator.range_eval', timings['eval_ms'])
+        
+        finite = numpy.isfinite(values)
+        if not finite.any():
+            return f"'{expression}' has no finite values for {variable} in that range."
+        low = int(numpy.nanargmin(numpy.where(finite, values, numpy.nan)))
+        high = int(numpy.nanargmax(numpy.where(finite, values, numpy.nan)))
+        preview = ', '.join(f"{value:.6g}" for value in values[:5])
+        
+        lines = [
+            f"Evaluated '{expression}' at {timings['points']:,} points of {variable} "
+            f"from {grid[0]:.6g} to {grid[-1]:.6g}",
+            f"  min {values[low]:.6g} at {variable}={grid[low]:.6g}",
+            f"  max {values[high]:.6g} at {variable}={grid[high]:.6g}",
+            f"  mean {values[finite].mean():.6g}",
+            f"  first values: {preview}{', ...' if len(values) > 5 else ''}",
+            f"  timings: compile {timings['compile_ms']:.3f} ms, evaluate {timings['eval_ms']:.3f} ms "
+            f"({timings['points'] / max(timings['eval_ms'], 1e-6) * 1000:,.0f} points/s)",
+        ]
+        if not finite.all():
+            lines.append(f"  {int((~finite).sum()):,} points were undefined and skipped")
+        return '\n'.join(lines)
+    
+    def advanced_dictionary(self, command):
+        """Advanced dictionary with AI-powered definitions"""
+        word = command
+        for phrase in ['define', 'meaning', 'what is', 'explain']:
+            word = word.replace(phrase, '')
+        word = word.strip()
+        
+        if not word:
+            return "What word would you like me to define?"
+        
+        # Try to get definition from online API (you can integrate with dictionary APIs)
+        try:
+            # Placeholder for dictionary API integration
+            return f"Looking up definition for '{word}'. For detailed definitions, I recommend checking online dictionaries or saying 'search define {word}'."
+        except:
+            return f"I'll search for the definition of '{word}' online."
+    
+    def get_advanced_system_status(self):
+        """Get comprehensive system status"""
+        try:
+            snapshot = self.metrics_sampler.latest()
+            if snapshot is None:
+                reason = self.metrics_sampler.unavailable_reason()
+                if reason:
+                    return f"System metrics unavailable ({reason})."
+                return "System metrics are still being collected. Please try again in a moment."
+            return self.format_system_status(snapshot)
+        except Exception as e:
+            return f"Error retrieving system status: {str(e)}"
+    
+    def format_system_status(self, snapshot):
+        """Render a metrics snapshot as the status report"""
+        boot_time = datetime.datetime.fromtimestamp(snapshot['boot_time'])
+        uptime = datetime.datetime.now() - boot_time
+        cpu_percent = snapshot['cpu_percent']
+        memory_percent = snapshot['memory_percent']
+        
+        return f"""T.E.T.R.I.S System Status Report:
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+🖥️  SYSTEM OVERVIEW:
+   Platform: {platform.system()} {platform.release()}
+   Architecture: {platform.architecture()[0]}
+   Processor: {platform.processor()}
+   Boot Time: {boot_time.strftime('%Y-%m-%d %H:%M:%S')}
+   Uptime: {str(uptime).split('.')[0]}
+
+⚡ CPU STATUS:
+   Usage: {cpu_percent}%
+   Cores: {snapshot['cpu_count']} ({snapshot['cpu_physical']} physical)
+   Frequency: {snapshot['cpu_freq']:.2f} MHz
+   Max Frequency: {snapshot['cpu_freq_max']:.2f} MHz
+
+💾 MEMORY STATUS:
+   Total RAM: {snapshot['memory_total'] // (1024**3)} GB
+   Available: {snapshot['memory_available'] // (1024**3)} GB
+   Used: {snapshot['memory_used'] // (1024**3)} GB
+   Usage: {memory_percent}%
+   
+   Swap Total: {snapshot['swap_total'] // (1024**3)} GB
+   Swap Used: {snapshot['swap_used'] // (1024**3)} GB
+
+💿 STORAGE STATUS:
+   Total Space: {snapshot['disk_total'] // (1024**3)} GB
+   Free Space: {snapshot['disk_free'] // (1024**3)} GB
+   Used Space: {snapshot['disk_used'] // (1024**3)} GB
+   Usage: {snapshot['disk_percent']}%
+   Read Rate: {snapshot['disk_read_rate'] / 1024:.1f} KB/s
+   Write Rate: {snapshot['disk_write_rate'] / 1024:.1f} KB/s
+
+🌐 NETWORK STATUS:
+   Bytes Sent: {snapshot['net_bytes_sent'] // (1024**2)} MB
+   Bytes Received: {snapshot['net_bytes_recv'] // (1024**2)} MB
+   Packets Sent: {snapshot['net_packets_sent']}
+   Packets Received: {snapshot['net_packets_recv']}
+   Upload Rate: {snapshot['net_send_rate'] / 1024:.1f} KB/s
+   Download Rate: {snapshot['net_recv_rate'] / 1024:.1f} KB/s
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+System Status: {'🟢 OPTIMAL' if cpu_percent < 80 and memory_percent < 80 else '🟡 MONITORING' if cpu_percent < 90 and memory_percent < 90 else '🔴 CRITICAL'}"""
+    
+    def get_advanced_weather(self, location):
+        """Get advanced weather information"""
+        try:
+            report, fetched_at, is_stale = self.weather_client.get(location)
+            if is_stale:
+                as_of = datetime.datetime.fromtimestamp(fetched_at).strftime('%H:%M')
+                return f"Weather for {location} (as of {as_of}, updating): {report}"
+            return f"Weather for {location}: {report}"
+        except RuntimeError:
+            return f"Unable to retrieve weather for {location}."
+        except Exception as e:
+            return f"Weather service unavailable: {str(e)}"
+    
+    def tell_advanced_joke(self):
+        """Tell advanced jokes with categories"""
+        joke_categories = {
+            'tech': [
+                "Why do programmers prefer dark mode? Because light attracts bugs!",
+                "How many programmers does it take to change a light bulb? None, that's a hardware problem!",
+                "Why did the AI break up with the database? It couldn't handle the relationship!",
+                "What's a computer's favorite snack? Microchips!"
+            ],
+            'science': [
+                "Why don't scientists trust atoms? Because they make up everything!",
+                "What do you call a sleeping bull at the particle accelerator? A bulldozer!",
+                "Why did the photon refuse to check a bag? Because it was traveling light!",
+                "What's the best thing about Switzerland? I don't know, but the flag is a big plus!"
+            ],
+            'ai': [
+                "Why did the neural network go to therapy? It had too many layers of issues!",
+                "What did the machine learning algorithm say to the data? You complete me!",
+                "Why don't AIs ever get lost? They always know their way around the neural pathways!",
+                "What's an AI's favorite type of music? Deep learning beats!"
+            ]
+        }
+        
+        category = random.choice(list(joke_categories.keys()))
+        joke = random.choice(joke_categories[category])
+        return f"Here's a {category} joke for you: {joke}"
+    
+    def advanced_music_control(self, command):
+        """Advanced music control system"""
+        if 'play' in command:
+            # Extract song/artist if mentioned
+            music_query = command.replace('play', '').replace('music', '').strip()
+            
+            # Try to open music applications
+            music_apps = ['spotify.exe', 'winamp.exe', 'vlc.exe', 'wmplayer.exe', 'itunes.exe']
+            
+            for app in music_apps:
+                try:
+                    subprocess.Popen(app, shell=True)
+                    if music_query:
+                        return f"Opening music player and searching for '{music_query}'."
+                    else:
+                        return "Opening music player."
+                except:
+                    continue
+            
+            # If no music app found, open music folder
+            music_folder = os.path.join(os.path.expanduser('~'), 'Music')
+            if os.path.exists(music_folder):
+                os.startfile(music_folder)
+                return "Opening music folder."
+            
+            return "No music player found. You can install Spotify, VLC, or other music applications."
+        
+        elif 'stop' in command or 'pause' in command:
+            return "You can control playback using your music player's controls or media keys."
+        
+        else:
+            return "I can help you play music, open music players, or manage your music library. What would you like to do?"
+    
+    def check_custom_commands(self, command):
+        """Check for custom user-defined commands"""
+        # Index before table: reload_custom_commands swaps them in the opposite order
+        trigger = self.trigger_index.best_match(command)
+        if trigger is not None:
+            cmd_data = self.custom_commands.get(trigger)
+            if cmd_data:
+                self.last_intent = f"custom:{trigger}"
+                # Update usage statistics; the counters flush to the database in batches
+                usage_count, last_used = self.usage_counters.hit(trigger)
+                self.suggestion_trie.increment(trigger)
+                if self.on_command_used:
+                    self.on_command_used(trigger, usage_count, last_used)
+                
+                # Execute custom action
+                if cmd_data['action_type'] == 'response':
+                    return cmd_data['response']
+                elif self.dry_run and cmd_data['action_type'] in ('command', 'web'):
+                    return f"dry run: custom {cmd_data['action_type']} '{trigger}' skipped"
+                elif cmd_data['action_type'] == 'command':
+                    try:
+                        subprocess.run(cmd_data['parameters'], shell=True)
+                        return cmd_data['response']
+                    except:
+                        return f"Failed to execute custom command: {trigger}"
+                elif cmd_data['action_type'] == 'web':
+                    webbrowser.open(cmd_data['parameters'])
+                    return cmd_data['response']
+        
+        return None
+    
+    def generate_learned_response(self, command):
+        """Generate response based on learned patterns"""
+        try:
+            result = self.learned_index.best_match(command)
+            
+            if result and result[2] > 0.7:  # Confidence threshold
+                self.last_intent = f"learned:{result[0]}"
+                return result[1]
+        except:
+            pass
+        
+        return None
+    
+    def generate_intelligent_response(self, command):
+        """Generate intelligent response for unknown commands"""
+        # Check for similar commands and built-in phrases in one lookup
+        similar_commands = self.fuzzy_matcher.suggest(command, k=3)
+        
+        if similar_commands:
+            return f"I'm not sure about that command. Did you mean: {', '.join(similar_commands[:3])}?"
+        
+        # Generic helpful response
+        responses = [
+            "I'm still learning that command. Can you teach me by saying 'teach mode' and showing me what you want?",
+            "That's a new one for me. You can add custom commands or try rephrasing your request.",
+            "I don't recognize that command yet. Try saying 'help' to see what I can do, or use 'teach mode' to show me.",
+            "Interesting request! I'm always learning. You can teach me new commands using the teach mode feature."
+        ]
+        
+        return random.choice(responses)
+    
+    def find_similar_commands(self, word):
+        """Find similar commands in the fuzzy index"""
+        try:
+            return self.fuzzy_matcher.suggest(word)
+        except:
+            return []
+    
+    def learn_from_interaction(self, command, response):
+        """Learn from user interactions"""
+        try:
+            # Store the interaction
+            self.persistence.submit(
+                "INSERT INTO conversation_memory (user_input, tetris_response, context, importance_score) VALUES (?, ?, ?, ?)",
+                (command, response, "normal", 1)
+            )
+            
+            # Extract patterns
+            words = command.split()
+            if len(words) > 2:
+                pattern = ' '.join(words[:2])  # First two words as pattern
+                
+                # Check if pattern exists
+                existing = self.learned_index.get(pattern)
+                
+                if existing:
+                    # Update existing pattern
+                    new_usage = existing[3] + 1
+                    new_success_rate = (existing[2] * existing[3] + 1) / new_usage
+                    
+                    self.persistence.submit(
+                        "UPDATE learned_patterns SET success_rate = ?, usage_count = ? WHERE pattern = ?",
+                        (new_success_rate, new_usage, pattern)
+                    )
+                    self.learned_index.update(pattern, success_rate=new_success_rate, usage_count=new_usage)
+                else:
+                    # Create new pattern
+                    self.persistence.submit(
+                        "INSERT OR IGNORE INTO learned_patterns (pattern, response_template, confidence_score, success_rate, usage_count) VALUES (?, ?, ?, ?, ?)",
+                        (pattern, response, 0.5, 1.0, 1)
+                    )
+                    self.learned_index.add(pattern, response, 0.5, 1.0, 1)
+        except Exception as e:
+            print(f"Learning error: {e}")
+    
+    def store_conversation(self, user_input, tetris_response):
+        """Store conversation in memory"""
+        try:
+            if user_input or tetris_response:
+                self.persistence.submit(
+                    "INSERT INTO conversation_memory (user_input, tetris_response, context) VALUES (?, ?, ?)",
+                    (user_input, tetris_response, "chat")
+                )
+        except Exception as e:
+            print(f"Memory storage error: {e}")
+
+    def load_conversation_page(self, offset, limit):
+        """Return up to limit chat rows, skipping the offset newest ones, oldest first
+
+        Waits for queued conversation writes so offsets count every message,
+        so interfaces call it from a worker thread.
+        """
+        self.persistence.flush()
+        with self.db_lock:
+            rows = self.conn.execute(
+                "SELECT user_input, tetris_response, timestamp FROM conversation_memory "
+                "WHERE context = 'chat' ORDER BY id DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return rows[::-1]
+
+    def load_user_preferences(self):
+        """Load user preferences from database"""
+        try:
+            return dict(self.conn.execute("SELECT key, value FROM user_preferences").fetchall())
+        except:
+            return {}
+    
+    def save_user_preference(self, key, value):
+        """Save user preference to database"""
+        try:
+            self.persistence.submit(
+                "INSERT OR REPLACE INTO user_preferences (key, value) VALUES (?, ?)",
+                (key, value)
+            )
+            self.user_preferences[key] = value
+        except Exception as e:
+            print(f"Preference save error: {e}")
+    
+    # Sort key expressions; each has a matching (expression, trigger) index
+    def command_filter_sql(self, prefix, action_type):
+        clauses, params = [], []
+        if prefix:
+            # A range on the lower(trigger) index instead of a LIKE scan
+            prefix = prefix.lower()
+            clauses.append("lower(trigger) >= ? AND lower(trigger) < ?")
+            params += [prefix, prefix + '\U0010ffff']
+        if action_type:
+            clauses.append("action_type = ?")
+            params.append(action_type)
+        return clauses, params
+    
+    def query_custom_commands(self, prefix='', action_type=None, sort='usage', descending=True, after=None, limit=200):
+        """One page of (trigger, action_type, usage_count, last_used) rows, keyset paginated
+
+        after is the key returned with the previous page; the result is
+        (rows, key for the next page or None when there are no more rows).
+        """
+        clauses, params = self.command_filter_sql(prefix, action_type)
+        sql = command_page_sql(sort, clauses, keyset=after is not None, descending=descending)
+        if after is not None:
+            params += [after[0], after[0], after[1]]
+        else:
+            # Start from exact counts so the usage ordering matches the live totals
+            self.usage_counters.flush()
+        
+        with self.db_lock:
+            rows = self.conn.execute(sql, params + [limit]).fetchall()
+        next_key = (rows[-1][4], rows[-1][0]) if len(rows) == limit else None
+        
+        page = []
+        for trigger, action, usage_count, last_used, _ in rows:
+            live_count, live_used = self.usage_counters.get(trigger)
+            page.append((trigger, action, max(usage_count or 0, live_count), live_used or last_used))
+        return page, next_key
+    
+    def count_custom_commands(self, prefix='', action_type=None):
+        clauses, params = self.command_filter_sql(prefix, action_type)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self.db_lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM custom_commands {where}", params).fetchone()[0]
+    
+    def custom_command_row(self, trigger):
+        """Current (trigger, action_type, usage_count, last_used) for one command, or None"""
+        command = self.custom_commands.get(trigger.lower())
+        if command is None:
+            return None
+        stored, usage_count, last_used = self.usage_counters.entry(trigger) or (trigger, 0, None)
+        return (stored, command['action_type'], usage_count, last_used)
+    
+    def custom_command_rows(self):
+        """(trigger, action_type, usage_count, last_used) for every command, with live usage"""
+        rows = []
+        for trigger, usage_count, last_used in self.usage_counters.snapshot():
+            command = self.custom_commands.get(trigger.lower())
+            if command is not None:
+                rows.append((trigger, command['action_type'], usage_count, last_used))
+        return rows
+    
+    def get_command_suggestions(self, partial_command):
+        """Get command suggestions based on partial input"""
+        return self.suggestion_trie.complete(partial_command, 5)  # Return top 5 suggestions
+    
+    def remove_wake_words(self, command):
+        """Remove wake words from command"""
+        wake_words = ['tetris', 'friday', 'edith', 'ai', 'hey', 'ok']
+        words = command.split()
+        filtered_words = [word for word in words if word.lower() not in wake_words]
+        return ' '.join(filtered_words)
+
+
+def main():
+    """Run commands from stdin or a file and print JSON-line responses"""
+    parser = argparse.ArgumentParser(description="Headless T.E.T.R.I.S command processor")
+    parser.add_argument('--file', help="read commands from this file instead of stdin")
+    parser.add_argument('--db', default="tetris_memory.db", help="database path")
+    parser.add_argument('--no-learning', action='store_true', help="disable learned responses and learning writes")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="print import and initialization time per component, then exit")
+    parser.add_argument('--startup-budget', type=float,
+                        help="exit with status 2 if engine startup takes longer than this many ms")
+    parser.add_argument('--metrics-out', help="export stage latencies on exit to a .json/.prom file, "
+                                              "tcp://host:port or unix:///socket")
+    parser.add_argument('--check-schema', action='store_true',
+                        help="apply pending migrations, then exit with status 1 if a hot query scans a table")
+    args = parser.parse_args()
+
+    if args.check_schema:
+        migrator = SchemaMigrator(args.db)
+        applied = migrator.migrate()
+        print(f"Schema version {migrator.latest_version()}"
+              + (f" (applied {', '.join(map(str, applied))})" if applied else ""))
+        scans = migrator.check_query_plans()
+        for name, detail in scans:
+            print(f"  scan in {name}: {detail}")
+        print(f"{len(migrator.HOT_QUERIES) - len({name for name, _ in scans})}/{len(migrator.HOT_QUERIES)} hot queries use an index")
+        return 1 if scans else 0
+
+    # Diagnostics go to stderr so stdout stays valid JSON lines
+    out = sys.stdout
+    sys.stdout = sys.stderr
+
+    engine = TetrisEngine(db_path=args.db)
+    engine.learning_mode = not args.no_learning
+    
+    startup_ms = STARTUP_PROFILER.total_ms()
+    if args.profile_startup:
+        print(STARTUP_PROFILER.report())
+    if args.startup_budget is not None and startup_ms > args.startup_budget:
+        print(f"Startup took {startup_ms:.1f} ms, over the {args.startup_budget:.1f} ms budget")
+        engine.close()
+        sys.stdout = out
+        return 2
+    if args.profile_startup:
+        engine.close()
+        sys.stdout = out
+        return 0
+    
+    source = open(args.file, encoding="utf-8") if args.file else sys.stdin
+    try:
+        for line in source:
+            command = line.strip()
+            if not command:
+                continue
+            start = time.perf_counter()
+            try:
+                response = engine.process_command(command)
+                error = None
+            except Exception as e:
+                response = None
+                error = str(e)
+            record = {
+                'input': command,
+                'response': response,
+                'intent': engine.last_intent,
+                'elapsed_ms': round((time.perf_counter() - start) * 1000, 3)
+            }
+            if error:
+                record['error'] = error
+            print(json.dumps(record), file=out, flush=True)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if args.metrics_out:
+            try:
+                engine.tracer.export(args.metrics_out)
+            except OSError as e:
+                print(f"Metrics export error: {e}")
+        engine.close()
+        sys.stdout = out
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,601 @@
+"""Streaming voice capture for T.E.T.R.I.S
+
+Audio is read continuously into a NumPy ring buffer and split into speech
+segments by an energy based voice activity detector. Segments are handed to
+a separate recognition stage, so capture never pauses while a recognizer is
+busy. Sources and recognizers are pluggable, which lets the whole path run
+against WAV fixtures with a local stand-in recognizer:
+
+    python tetris_voice.py segments fixtures/hello.wav
+    python tetris_voice.py batch fixtures/commands --recognizer sidecar --dry-run --report report.jsonl
+
+The fixtures are regenerated with fixtures/generate.py.
+"""
+import argparse
+import importlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import wave
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+
+SpeechSegment = namedtuple('SpeechSegment', ['samples', 'sample_rate', 'start', 'end'])
+
+
+def pcm_to_mono(data, sample_width, channels):
+    """Convert raw PCM bytes to a mono int16 array"""
+    if sample_width == 1:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.int16) - 128) << 8
+    elif sample_width == 2:
+        samples = np.frombuffer(data, dtype='<i2')
+    elif sample_width == 4:
+        samples = (np.frombuffer(data, dtype='<i4') >> 16).astype(np.int16)
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width} bytes")
+
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples
+
+
+class RingBuffer:
+    """Fixed-size sample buffer addressed by absolute stream position"""
+
+    def __init__(self, capacity, dtype=np.int16):
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=dtype)
+        self.written = 0
+
+    def write(self, samples):
+        count = len(samples)
+        if count > self.capacity:
+            # Only the newest capacity samples can survive anyway
+            self.written += count - self.capacity
+            samples = samples[-self.capacity:]
+            count = self.capacity
+
+        offset = self.written % self.capacity
+        first = min(count, self.capacity - offset)
+        self.data[offset:offset + first] = samples[:first]
+        self.data[:count - first] = samples[first:]
+        self.written += count
+
+    def read(self, start, end):
+        """Copy samples [start, end) out of the buffer; start must still be buffered"""
+        start = max(start, self.written - self.capacity)
+        end = min(end, self.written)
+        if end <= start:
+            return np.zeros(0, dtype=self.data.dtype)
+
+        first_offset = start % self.capacity
+        length = end - start
+        if first_offset + length <= self.capacity:
+            return self.data[first_offset:first_offset + length].copy()
+        head = self.data[first_offset:]
+        return np.concatenate((head, self.data[:length - len(head)]))
+
+
+class SpeechSegmenter:
+    """Energy based voice activity detector producing speech segments
+
+    The noise floor is measured once by calibrate() and then re-estimated
+    every recalibrate_interval seconds of audio from the most recent silent
+    frames, so ambient changes are tracked without ever pausing capture.
+    Times are measured in stream seconds, which keeps results identical
+    between a live microphone and a WAV fixture.
+    """
+
+    def __init__(self, sample_rate, frame_ms=30, threshold_ratio=3.0, min_threshold=300.0,
+                 start_frames=3, pause_ms=800, min_phrase_ms=300, max_phrase_ms=8000,
+                 pre_roll_ms=300, recalibrate_interval=60.0):
+        self.sample_rate = sample_rate
+        self.frame_size = max(1, sample_rate * frame_ms // 1000)
+        self.threshold_ratio = threshold_ratio
+        self.min_threshold = min_threshold
+        self.threshold = min_threshold
+        self.noise_floor = None
+        self.start_frames = start_frames
+        self.pause_frames = max(1, pause_ms // frame_ms)
+        self.min_phrase = sample_rate * min_phrase_ms // 1000
+        self.max_phrase = sample_rate * max_phrase_ms // 1000
+        self.pre_roll = sample_rate * pre_roll_ms // 1000
+        self.recalibrate_interval = recalibrate_interval
+        self.ring = RingBuffer(self.max_phrase + self.pre_roll + self.frame_size * (start_frames + 1))
+        self.pending = np.zeros(0, dtype=np.int16)
+        self.silent_energies = deque(maxlen=max(1, 1000 // frame_ms))
+        self.last_calibrated = 0.0
+        self.calibrations = 0
+        self.in_speech = False
+        self.voiced_run = 0
+        self.silence_run = 0
+        self.segment_onset = 0
+        self.segment_start = 0
+
+    def frame_energies(self, samples):
+        frames = samples[:len(samples) - len(samples) % self.frame_size].reshape(-1, self.frame_size)
+        return np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+
+    def set_noise_floor(self, floor):
+        self.noise_floor = float(floor)
+        self.threshold = max(self.min_threshold, self.noise_floor * self.threshold_ratio)
+        self.last_calibrated = self.ring.written / self.sample_rate
+        self.calibrations += 1
+
+    def calibrate(self, samples):
+        """Measure the ambient noise floor from audio known to contain no speech"""
+        samples = np.asarray(samples, dtype=np.int16)
+        self.ring.write(samples)
+        energies = self.frame_energies(samples)
+        if len(energies):
+            self.set_noise_floor(np.mean(energies))
+
+    def feed(self, samples):
+        """Consume audio and return any speech segments that ended inside it"""
+        samples = np.concatenate((self.pending, np.asarray(samples, dtype=np.int16)))
+        usable = len(samples) - len(samples) % self.frame_size
+        self.pending = samples[usable:]
+        if not usable:
+            return []
+
+        segments = []
+        energies = self.frame_energies(samples[:usable])
+        for index, energy in enumerate(energies):
+            frame = samples[index * self.frame_size:(index + 1) * self.frame_size]
+            self.ring.write(frame)
+            segment = self.step(energy)
+            if segment is not None:
+                segments.append(segment)
+        return segments
+
+    def step(self, energy):
+        frame_end = self.ring.written
+        voiced = energy > self.threshold
+
+        if not self.in_speech:
+            if voiced:
+                self.voiced_run += 1
+                if self.voiced_run >= self.start_frames:
+                    self.in_speech = True
+                    self.silence_run = 0
+                    self.segment_onset = frame_end - self.voiced_run * self.frame_size
+                    self.segment_start = max(0, self.segment_onset - self.pre_roll)
+            else:
+                self.voiced_run = 0
+                self.silent_energies.append(energy)
+                stream_time = frame_end / self.sample_rate
+                if (stream_time - self.last_calibrated >= self.recalibrate_interval
+                        and len(self.silent_energies) == self.silent_energies.maxlen):
+                    self.set_noise_floor(np.median(self.silent_energies))
+            return None
+
+        self.silence_run = 0 if voiced else self.silence_run + 1
+        if self.silence_run >= self.pause_frames or frame_end - self.segment_start >= self.max_phrase:
+            return self.close_segment(frame_end)
+        return None
+
+    def close_segment(self, end):
+        start = self.segment_start
+        voiced_length = end - self.segment_onset - self.silence_run * self.frame_size
+        self.in_speech = False
+        self.voiced_run = 0
+        self.silence_run = 0
+        if voiced_length < self.min_phrase:
+            return None
+        return SpeechSegment(self.ring.read(start, end), self.sample_rate,
+                             start / self.sample_rate, end / self.sample_rate)
+
+    def flush(self):
+        """End of stream: return the segment still in progress, if any"""
+        if not self.in_speech:
+            return None
+        return self.close_segment(self.ring.written)
+
+
+class WavSource:
+    """Read a WAV file in fixed-size chunks, optionally at real-time pace"""
+
+    def __init__(self, path, chunk_ms=100, realtime=False):
+        self.path = path
+        self.chunk_ms = chunk_ms
+        self.realtime = realtime
+        self.wav = None
+        self.sample_rate = None
+
+    def __enter__(self):
+        self.wav = wave.open(str(self.path), 'rb')
+        self.sample_rate = self.wav.getframerate()
+        self.chunk_frames = max(1, self.sample_rate * self.chunk_ms // 1000)
+        return self
+
+    def __exit__(self, *exc):
+        self.wav.close()
+
+    def read(self):
+        data = self.wav.readframes(self.chunk_frames)
+        if self.realtime and data:
+            time.sleep(self.chunk_ms / 1000)
+        return pcm_to_mono(data, self.wav.getsampwidth(), self.wav.getnchannels())
+
+
+class MicrophoneSource:
+    """Adapter reading raw chunks from an opened speech_recognition Microphone"""
+
+    def __init__(self, microphone):
+        self.microphone = microphone
+        self.sample_rate = None
+
+    def __enter__(self):
+        self.microphone.__enter__()
+        self.sample_rate = self.microphone.SAMPLE_RATE
+        return self
+
+    def __exit__(self, *exc):
+        self.microphone.__exit__(*exc)
+
+    def read(self):
+        data = self.microphone.stream.read(self.microphone.CHUNK)
+        return pcm_to_mono(data, self.microphone.SAMPLE_WIDTH, 1)
+
+
+class SpeechRecognitionBackend:
+    """Recognizer backed by a speech_recognition Recognizer method
+
+    method can be any recognize_* method, e.g. recognize_google for the
+    online service or recognize_sphinx for a fully local engine.
+    """
+
+    def __init__(self, recognizer=None, method="recognize_google", **options):
+        import speech_recognition as sr
+        self.sr = sr
+        self.recognizer = recognizer or sr.Recognizer()
+        self.method = method
+        self.options = options
+
+    def transcribe(self, samples, sample_rate):
+        audio = self.sr.AudioData(np.asarray(samples, dtype='<i2').tobytes(), sample_rate, 2)
+        try:
+            return getattr(self.recognizer, self.method)(audio, **self.options)
+        except self.sr.UnknownValueError:
+            return None
+
+
+class ScriptedRecognizer:
+    """Local stand-in recognizer returning canned transcripts in order"""
+
+    def __init__(self, transcripts=()):
+        self.transcripts = deque(transcripts)
+        self.calls = 0
+
+    def transcribe(self, samples, sample_rate):
+        self.calls += 1
+        return self.transcripts.popleft() if self.transcripts else None
+
+
+class VoicePipeline:
+    """Capture stage and recognition stage joined by a bounded queue
+
+    The capture thread only reads audio and runs the segmenter. Finished
+    segments are queued for the recognition thread; if recognition falls
+    behind, the oldest waiting segment is dropped rather than stalling capture.
+    """
+
+    STOP = object()
+
+    def __init__(self, source, recognizer, on_transcript, on_error=None, calibration_seconds=0.5,
+                 max_pending=4, **segmenter_options):
+        self.source = source
+        self.recognizer = recognizer
+        self.on_transcript = on_transcript
+        self.on_error = on_error
+        self.calibration_seconds = calibration_seconds
+        self.segmenter_options = segmenter_options
+        self.segments = queue.Queue(maxsize=max_pending)
+        self.stop_event = threading.Event()
+        self.segmenter = None
+        self.threads = []
+        self.stats_lock = threading.Lock()
+        self.captured = 0
+        self.dropped = 0
+        self.recognized = 0
+        self.unrecognized = 0
+        self.errors = 0
+        self.total_recognition_ms = 0.0
+
+    def start(self):
+        self.threads = [
+            threading.Thread(target=self.capture_loop, name="tetris-voice-capture", daemon=True),
+            threading.Thread(target=self.recognition_loop, name="tetris-voice-recognition", daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join(self, timeout=None):
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def stats(self):
+        with self.stats_lock:
+            attempts = self.recognized + self.unrecognized
+            return {
+                'segments': self.captured,
+                'dropped': self.dropped,
+                'recognized': self.recognized,
+                'unrecognized': self.unrecognized,
+                'errors': self.errors,
+                'queue_depth': self.segments.qsize(),
+                'avg_recognition_ms': self.total_recognition_ms / attempts if attempts else 0.0,
+                'noise_floor': self.segmenter.noise_floor if self.segmenter else None,
+                'calibrations': self.segmenter.calibrations if self.segmenter else 0,
+            }
+
+    def report_error(self, error):
+        with self.stats_lock:
+            self.errors += 1
+        if self.on_error:
+            self.on_error(error)
+
+    def enqueue(self, segment):
+        with self.stats_lock:
+            self.captured += 1
+        while True:
+            try:
+                self.segments.put_nowait(segment)
+                return
+            except queue.Full:
+                try:
+                    self.segments.get_nowait()
+                    with self.stats_lock:
+                        self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def capture_loop(self):
+        try:
+            with self.source as source:
+                self.segmenter = SpeechSegmenter(source.sample_rate, **self.segmenter_options)
+
+                # One calibration up front; the segmenter recalibrates itself from then on
+                needed = int(source.sample_rate * self.calibration_seconds)
+                calibration = []
+                while needed > 0 and not self.stop_event.is_set():
+                    chunk = source.read()
+                    if not len(chunk):
+                        break
+                    calibration.append(chunk)
+                    needed -= len(chunk)
+                if calibration:
+                    self.segmenter.calibrate(np.concatenate(calibration))
+
+                while not self.stop_event.is_set():
+                    chunk = source.read()
+                    if not len(chunk):
+                        break
+                    for segment in self.segmenter.feed(chunk):
+                        self.enqueue(segment)
+
+                tail = self.segmenter.flush()
+                if tail is not None:
+                    self.enqueue(tail)
+        except Exception as e:
+            self.report_error(e)
+        finally:
+            self.segments.put(self.STOP)
+
+    def recognition_loop(self):
+        while True:
+            segment = self.segments.get()
+            if segment is self.STOP:
+                return
+            if self.stop_event.is_set():
+                continue
+
+            start = time.perf_counter()
+            try:
+                text = self.recognizer.transcribe(segment.samples, segment.sample_rate)
+            except Exception as e:
+                self.report_error(e)
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000
+
+            with self.stats_lock:
+                self.total_recognition_ms += elapsed_ms
+                if text:
+                    self.recognized += 1
+                else:
+                    self.unrecognized += 1
+            if text:
+                self.on_transcript(text, {
+                    'start': segment.start,
+                    'end': segment.end,
+                    'recognition_ms': elapsed_ms,
+                })
+
+
+AUDIO_SUFFIXES = ('.wav', '.flac')
+
+
+def load_audio(path):
+    """Return (mono int16 samples, sample rate) for a WAV or FLAC file"""
+    path = Path(path)
+    if path.suffix.lower() == '.wav':
+        with wave.open(str(path), 'rb') as wav:
+            data = wav.readframes(wav.getnframes())
+            return pcm_to_mono(data, wav.getsampwidth(), wav.getnchannels()), wav.getframerate()
+
+    import speech_recognition as sr
+    with sr.AudioFile(str(path)) as source:
+        audio = sr.Recognizer().record(source)
+    return pcm_to_mono(audio.get_raw_data(convert_width=2), 2, 1), audio.sample_rate
+
+
+class SidecarRecognizer:
+    """Local stand-in recognizer reading the transcript from <audio>.txt
+
+    Useful for regression runs over recorded commands whose expected text
+    is stored next to the audio.
+    """
+
+    def transcribe_file(self, path):
+        transcript = Path(path).with_suffix('.txt')
+        if not transcript.exists():
+            return None
+        return transcript.read_text(encoding='utf-8').strip() or None
+
+
+def build_recognizer(spec):
+    """Create a recognizer from 'sidecar', 'sr:<recognize_method>' or 'module:factory'"""
+    if spec == 'sidecar':
+        return SidecarRecognizer()
+    if spec.startswith('sr:'):
+        return SpeechRecognitionBackend(method=spec[3:])
+    module_name, _, attribute = spec.partition(':')
+    if not attribute:
+        raise ValueError(f"Unknown recognizer '{spec}'")
+    return getattr(importlib.import_module(module_name), attribute)()
+
+
+_worker_recognizer = None
+
+
+def init_batch_worker(spec):
+    """Process pool initializer: build one recognizer per worker process"""
+    global _worker_recognizer
+    _worker_recognizer = build_recognizer(spec)
+
+
+def transcribe_file(path):
+    """Transcribe one file in a worker process; never raises"""
+    start = time.perf_counter()
+    try:
+        if hasattr(_worker_recognizer, 'transcribe_file'):
+            text = _worker_recognizer.transcribe_file(path)
+        else:
+            samples, sample_rate = load_audio(path)
+            text = _worker_recognizer.transcribe(samples, sample_rate)
+        error = None
+    except Exception as e:
+        text = None
+        error = f"{type(e).__name__}: {e}"
+    return path, text, (time.perf_counter() - start) * 1000, error
+
+
+def find_audio_files(directory):
+    return sorted(str(path) for path in Path(directory).rglob('*') if path.suffix.lower() in AUDIO_SUFFIXES)
+
+
+def run_batch(args):
+    """Transcribe a directory across a process pool and replay transcripts through the engine"""
+    from tetris_core import SIDE_EFFECT_INTENTS, TetrisEngine
+
+    files = find_audio_files(args.directory)
+    if not files:
+        print(f"No WAV/FLAC files found in {args.directory}", file=sys.stderr)
+        return 1
+
+    # Diagnostics go to stderr so the report stays valid JSON lines
+    out = open(args.report, 'w', encoding='utf-8') if args.report else sys.stdout
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+
+    engine = TetrisEngine(db_path=args.db, start_sampler=False)
+    engine.learning_mode = not args.no_learning
+    if args.dry_run:
+        engine.dry_run = True
+        for intent in SIDE_EFFECT_INTENTS:
+            engine.register_handler(intent, lambda command, original, intent=intent: f"dry run: {intent} skipped")
+
+    failures = 0
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_batch_worker,
+                                 initargs=(args.recognizer,)) as pool:
+            # Transcription runs in parallel; dispatch stays on this process's single engine
+            for path, text, recognition_ms, error in pool.map(transcribe_file, files, chunksize=args.chunksize):
+                record = {
+                    'file': os.path.relpath(path, args.directory),
+                    'transcript': text,
+                    'recognition_ms': round(recognition_ms, 3),
+                    'dispatch_ms': None,
+                    'intent': None,
+                    'response': None,
+                }
+                if text:
+                    start = time.perf_counter()
+                    try:
+                        record['response'] = engine.process_command(text)
+                        record['intent'] = engine.last_intent
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                    record['dispatch_ms'] = round((time.perf_counter() - start) * 1000, 3)
+                if error:
+                    record['error'] = error
+                if error or not text:
+                    failures += 1
+                print(json.dumps(record), file=out, flush=True)
+    finally:
+        engine.close()
+        sys.stdout = stdout
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"{len(files)} files, {failures} without a dispatched transcript", file=sys.stderr)
+    return 0
+
+
+def run_segments(args):
+    """Print the speech segments found in a WAV file as JSON lines"""
+    transcripts = []
+    pipeline = VoicePipeline(
+        WavSource(args.file),
+        ScriptedRecognizer([f"segment {i + 1}" for i in range(10000)]),
+        on_transcript=lambda text, info: transcripts.append(info),
+        on_error=lambda error: print(f"Voice pipeline error: {error}", file=sys.stderr),
+        calibration_seconds=args.calibration,
+        max_pending=10000,
+    ).start()
+    pipeline.join()
+    for info in transcripts:
+        print(json.dumps({'start': round(info['start'], 3), 'end': round(info['end'], 3)}))
+    print(json.dumps(pipeline.stats()), file=sys.stderr)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="T.E.T.R.I.S voice pipeline tools")
+    subparsers = parser.add_subparsers(dest='tool', required=True)
+
+    segments = subparsers.add_parser('segments', help="show where the VAD finds speech in a WAV file")
+    segments.add_argument('file')
+    segments.add_argument('--calibration', type=float, default=0.5, help="seconds of leading audio used as noise")
+
+    batch = subparsers.add_parser('batch', help="transcribe a directory of WAV/FLAC files and replay them as commands")
+    batch.add_argument('directory')
+    batch.add_argument('--recognizer', default='sr:recognize_sphinx',
+                       help="sidecar (read <file>.txt), sr:<recognize_method> or module:factory")
+    batch.add_argument('--workers', type=int, default=os.cpu_count(), help="transcription processes")
+    batch.add_argument('--chunksize', type=int, default=4, help="files handed to a worker at a time")
+    batch.add_argument('--report', help="write the JSONL report here instead of stdout")
+    batch.add_argument('--db', default="tetris_memory.db", help="database path")
+    batch.add_argument('--no-learning', action='store_true', help="disable learned responses and learning writes")
+    batch.add_argument('--dry-run', action='store_true',
+                       help="skip handlers and custom actions that launch programs, open the browser or touch the network")
+
+    args = parser.parse_args()
+    if args.tool == 'batch':
+        return run_batch(args)
+    return run_segments(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())